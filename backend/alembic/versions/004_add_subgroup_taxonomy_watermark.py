@@ -0,0 +1,24 @@
+"""Add taxonomy high-water mark columns to subgroups
+
+Revision ID: 004_add_subgroup_taxonomy_watermark
+Revises: 003_add_session_results_columns
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "004_add_subgroup_taxonomy_watermark"
+down_revision = "003_add_session_results_columns"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("subgroups", sa.Column("taxonomy_watermark_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("subgroups", sa.Column("taxonomy_watermark_id", UUID(as_uuid=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("subgroups", "taxonomy_watermark_id")
+    op.drop_column("subgroups", "taxonomy_watermark_at")
@@ -0,0 +1,24 @@
+"""Add composite (subgroup_id, created_at, id) index on messages
+
+Revision ID: 005_add_message_keyset_index
+Revises: 004_add_subgroup_taxonomy_watermark
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "005_add_message_keyset_index"
+down_revision = "004_add_subgroup_taxonomy_watermark"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_subgroup_created_id",
+        "messages",
+        ["subgroup_id", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_subgroup_created_id", table_name="messages")
@@ -0,0 +1,22 @@
+"""Add indexes for the ideas-by-session/subgroup and users-by-session lookups
+
+Revision ID: 006_add_hot_path_indexes
+Revises: 005_add_message_keyset_index
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "006_add_hot_path_indexes"
+down_revision = "005_add_message_keyset_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_ideas_session_subgroup", "ideas", ["session_id", "subgroup_id"])
+    op.create_index("ix_users_session_id", "users", ["session_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_session_id", table_name="users")
+    op.drop_index("ix_ideas_session_subgroup", table_name="ideas")
@@ -0,0 +1,35 @@
+"""Add convergence_points table for downsampled convergence history
+
+Revision ID: 007_add_convergence_points
+Revises: 006_add_hot_path_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = "007_add_convergence_points"
+down_revision = "006_add_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "convergence_points",
+        sa.Column("id", UUID(as_uuid=True), primary_key=True),
+        sa.Column("session_id", UUID(as_uuid=True), sa.ForeignKey("sessions.id"), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("score", sa.Float, nullable=False),
+        sa.Column("sentiments", sa.JSON, nullable=False),
+    )
+    op.create_index(
+        "ix_convergence_points_session_recorded",
+        "convergence_points",
+        ["session_id", "recorded_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_convergence_points_session_recorded", table_name="convergence_points")
+    op.drop_table("convergence_points")
@@ -1,15 +1,32 @@
 """Conversational Matching Engine (CME).
 
-Runs globally across all subgroups on a periodic timer.
-Identifies ideas/arguments that haven't been discussed in a subgroup
-but were raised elsewhere, prioritizing challenging content.
-
-Uses a Redis distributed lock so that only one worker runs the CME
-cycle at a time (safe with multi-worker deployments like Gunicorn).
+Event-driven: chat activity marks a subgroup dirty in Redis, and a short
+polling scheduler processes only dirty subgroups once they have been quiet
+for ``CME_DEBOUNCE_SECONDS`` (or have waited ``CME_INTERVAL_SECONDS``,
+whichever comes first). Identifies ideas/arguments that haven't been
+discussed in a subgroup but were raised elsewhere, prioritizing
+challenging content.
+
+Work is sharded by session across workers (see ``app.engine.sharding``),
+so CME throughput grows with the number of Gunicorn workers and hosts
+instead of serializing on a single lock holder.
+
+Agent turns are only spent on subgroups someone is watching. Subgroups with
+nobody online (per ``app.services.presence``) get no surrogate/contributor
+messages at all, and subgroups whose humans have stopped replying to the
+agents get agent turns at exponentially growing intervals, capped at
+``CME_IDLE_BACKOFF_MAX_SECONDS``. A human message resets the backoff. A
+subgroup skipped for having nobody online gets a backoff entry that does
+not delay it (level kept, due now), so that a human coming back online to
+a skipped or backed-off subgroup resets it and schedules the subgroup right
+away (``resume_subgroup``); someone merely reloading the page of an
+up-to-date subgroup triggers nothing.
 """
 import asyncio
 import logging
+import time
 import uuid
+from collections import defaultdict
 
 from sqlalchemy import select
 
@@ -17,70 +34,206 @@ from app.database import async_session
 from app.models.session import Session, SessionStatus
 from app.models.subgroup import Subgroup
 from app.engine.taxonomy import (
-    update_taxonomy_for_subgroup,
+    update_taxonomy_for_subgroups,
     get_ideas_not_in_subgroup,
-    compute_convergence,
 )
+from app.engine.convergence import (
+    convergence_score,
+    drop_session_series,
+    get_subgroup_sentiments,
+    record_convergence,
+    record_ideas,
+    series_session_ids,
+)
+from app.engine.crosspollination import load_cross_pollination_plan
 from app.engine.surrogate import deliver_surrogate_message
 from app.engine.contributor import deliver_contributor_message
-from app.models.message import Message
-from app.services.redis import get_redis, publish_to_session
+from app.engine.recent_messages import get_recent_messages, record_message
+from app.models.message import Message, MessageType
+from app.schemas.convergence import ConvergencePointOut
+from app.engine.sharding import ShardLeases
+from app.services.redis import (
+    publish_to_session,
+    mark_subgroup_dirty,
+    get_dirty_subgroups,
+    claim_dirty_subgroup,
+    get_subgroup_backoffs,
+    set_subgroup_backoff,
+    clear_subgroup_backoff,
+    get_relayed_ideas,
+    add_relayed_ideas,
+)
+from app.services.presence import get_subgroup_online_counts
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
 _running = False
 
-CME_LOCK_KEY = "cme:leader_lock"
-# Lock TTL should be longer than a single cycle could take, but short enough
-# that another worker picks up quickly if the leader dies.
-CME_LOCK_TTL_SECONDS = max(settings.CME_INTERVAL_SECONDS * 3, 60)
+# Foreign ideas a surrogate relays in one turn (its prompt weaves in all of them)
+SURROGATE_IDEAS_PER_TURN = 2
 
 
-async def acquire_cme_lock(worker_id: str) -> bool:
-    """Try to acquire the distributed CME lock. Returns True if acquired."""
-    r = await get_redis()
-    acquired = await r.set(CME_LOCK_KEY, worker_id, nx=True, ex=CME_LOCK_TTL_SECONDS)
-    return acquired is not None
+def select_ready_subgroups(
+    dirty: list[tuple[uuid.UUID, uuid.UUID, float, float | None]],
+    now: float,
+) -> list[tuple[uuid.UUID, uuid.UUID]]:
+    """Pick the dirty subgroups that are due for processing.
+
+    A subgroup is due once chat has been quiet for the debounce window, or
+    once it has been dirty for longer than the max-staleness bound (so a
+    subgroup that never stops talking still gets processed).
+    """
+    ready = []
+    for session_id, subgroup_id, dirty_since, last_activity in dirty:
+        quiet = last_activity is None or now - last_activity >= settings.CME_DEBOUNCE_SECONDS
+        stale = now - dirty_since >= settings.CME_INTERVAL_SECONDS
+        if quiet or stale:
+            ready.append((session_id, subgroup_id))
+    return ready
 
 
-async def renew_cme_lock(worker_id: str) -> bool:
-    """Renew the lock if we still own it. Returns True if renewed."""
-    r = await get_redis()
-    current = await r.get(CME_LOCK_KEY)
-    if current == worker_id:
-        await r.expire(CME_LOCK_KEY, CME_LOCK_TTL_SECONDS)
-        return True
-    return False
+def idle_backoff_seconds(level: int) -> float:
+    """Wait before the next agent turn after ``level`` unanswered ones."""
+    return min(settings.CME_IDLE_BACKOFF_MAX_SECONDS, settings.CME_INTERVAL_SECONDS * 2 ** level)
 
 
-async def release_cme_lock(worker_id: str):
-    """Release the lock if we still own it."""
-    r = await get_redis()
-    current = await r.get(CME_LOCK_KEY)
-    if current == worker_id:
-        await r.delete(CME_LOCK_KEY)
+def humans_idle(recent: list[Message]) -> bool:
+    """True when the newest message (``recent`` is newest first) is an agent's."""
+    return bool(recent) and recent[0].msg_type != MessageType.human
+
+
+async def _human_spoke_last(sg: Subgroup) -> bool:
+    """A human replied since the agents' last turn (their backoff no longer applies)."""
+    try:
+        async with async_session() as db:
+            recent = await get_recent_messages(db, sg.id, 1)
+    except Exception as e:
+        logger.error(f"Activity check failed for {sg.label}: {e}")
+        return False
+    return bool(recent) and not humans_idle(recent)
 
 
-async def run_cme_cycle():
-    """Run one CME cycle across all active sessions."""
+async def select_attended_subgroups(
+    session_id: uuid.UUID, targets: list[Subgroup], now: float
+) -> tuple[list[Subgroup], dict[uuid.UUID, tuple[int, float]]]:
+    """Drop subgroups nobody is online in, or still backing off with no human reply.
+
+    Returns the subgroups that may get agent turns now, plus the backoff
+    state of all targets. Presence or backoff lookups failing never blocks
+    delivery.
+    """
+    ids = [sg.id for sg in targets]
+    try:
+        online = await get_subgroup_online_counts(ids)
+    except Exception as e:
+        logger.error(f"Presence lookup failed for session {session_id}: {e}")
+        online = {sg_id: 1 for sg_id in ids}
+    try:
+        backoffs = await get_subgroup_backoffs(session_id, ids)
+    except Exception as e:
+        logger.error(f"Backoff lookup failed for session {session_id}: {e}")
+        backoffs = {}
+
+    attended = []
+    for sg in targets:
+        if not online.get(sg.id):
+            logger.debug(f"Skipping {sg.label}: nobody online")
+            if sg.id not in backoffs:
+                # Remember the skip, so the next human to arrive resumes it
+                try:
+                    await set_subgroup_backoff(session_id, sg.id, 0, 0.0)
+                except Exception as e:
+                    logger.error(f"Skip marker failed for {sg.label}: {e}")
+        elif backoffs.get(sg.id, (0, 0.0))[1] > now and not await _human_spoke_last(sg):
+            logger.debug(f"Skipping {sg.label}: idle backoff")
+        else:
+            attended.append(sg)
+    return attended, backoffs
+
+
+async def resume_subgroup(session_id: uuid.UUID, subgroup_id: uuid.UUID):
+    """A human is back in an empty subgroup: drop its backoff and schedule it.
+
+    Only subgroups that were skipped or are backing off have an entry to
+    drop; an up-to-date subgroup (e.g. someone reloaded the page) is left
+    alone.
+    """
+    if await clear_subgroup_backoff(session_id, subgroup_id):
+        await mark_subgroup_dirty(session_id, subgroup_id, activity=False)
+
+
+async def run_cme_cycle(leases: ShardLeases | None = None):
+    """Run one CME pass over the dirty subgroups that are due.
+
+    With ``leases``, only sessions on shards this worker holds are touched;
+    the rest are left dirty for their owners.
+    """
+    dirty = await get_dirty_subgroups()
+    if leases is not None:
+        dirty = [entry for entry in dirty if leases.owns_session(entry[0])]
+    if not dirty:
+        return
+
+    due: dict[uuid.UUID, set[uuid.UUID]] = defaultdict(set)
+    for session_id, subgroup_id in select_ready_subgroups(dirty, time.time()):
+        if await claim_dirty_subgroup(session_id, subgroup_id):
+            due[session_id].add(subgroup_id)
+    if not due:
+        return
+
     async with async_session() as db:
-        # Get all active sessions
+        # Claimed subgroups of sessions that are no longer active are dropped
         result = await db.execute(
-            select(Session).where(Session.status == SessionStatus.active)
+            select(Session)
+            .where(Session.id.in_(list(due)))
+            .where(Session.status == SessionStatus.active)
         )
         sessions = result.scalars().all()
 
     # Each session creates its own DB sessions internally
     for session in sessions:
-        await process_session(session)
+        # Leases are renewed concurrently; a shard lost mid-cycle is left to its new owner
+        if leases is not None and not leases.owns_session(session.id):
+            continue
+        await process_session(session, due[session.id])
+
+
+async def prune_convergence_series(leases: ShardLeases | None = None):
+    """Drop in-memory trajectories of sessions that ended or moved elsewhere.
+
+    A session stopped through another worker never comes back through this
+    worker's cycle, so its trajectory would otherwise linger here, stale.
+    """
+    session_ids = series_session_ids()
+    if leases is not None:
+        for session_id in session_ids:
+            if not leases.owns_session(session_id):
+                drop_session_series(session_id)
+        session_ids = [sid for sid in session_ids if leases.owns_session(sid)]
+    if not session_ids:
+        return
+
+    async with async_session() as db:
+        result = await db.execute(
+            select(Session.id)
+            .where(Session.id.in_(session_ids))
+            .where(Session.status == SessionStatus.active)
+        )
+        active = set(result.scalars().all())
+    for session_id in session_ids:
+        if session_id not in active:
+            drop_session_series(session_id)
 
 
-async def process_session(session: Session):
-    """Process one session: extract ideas and trigger surrogates concurrently.
+async def process_session(session: Session, subgroup_ids: set[uuid.UUID] | None = None):
+    """Process one session: extract ideas, then trigger surrogates concurrently.
 
-    Each subgroup gets its own DB session to avoid SQLAlchemy concurrency
-    issues with asyncio.gather().
+    Only the subgroups in ``subgroup_ids`` are processed (all of them when
+    None). Taxonomy extraction for all of them runs first, batched into as
+    few LLM calls as possible; then each attended subgroup (see
+    ``select_attended_subgroups``) gets its own DB session for agent
+    delivery to avoid SQLAlchemy concurrency issues with asyncio.gather().
     """
     # Fetch subgroups in a short-lived session
     async with async_session() as db:
@@ -92,98 +245,183 @@ async def process_session(session: Session):
     if len(subgroups) < 2:
         return  # Need at least 2 subgroups for cross-pollination
 
+    targets = [sg for sg in subgroups if subgroup_ids is None or sg.id in subgroup_ids]
+    if not targets:
+        return
+
+    producers: set[uuid.UUID] = set()
+    try:
+        async with async_session() as tax_db:
+            new_ideas = await update_taxonomy_for_subgroups(
+                tax_db, session.id, [sg.id for sg in targets]
+            )
+            await tax_db.commit()
+        producers = {sg_id for sg_id, ideas in new_ideas.items() if ideas}
+        await record_ideas(session.id, [idea for ideas in new_ideas.values() for idea in ideas])
+    except Exception as e:
+        logger.error(f"Taxonomy update failed for {session.title}: {e}")
+
+    now = time.time()
+    attended, backoffs = await select_attended_subgroups(session.id, targets, now)
+
+    # Rank every subgroup's cross-pollination candidates in one pass
+    plan = None
+    if attended:
+        try:
+            async with async_session() as plan_db:
+                plan = await load_cross_pollination_plan(plan_db, session.id)
+        except Exception as e:
+            logger.error(f"Cross-pollination planning failed for {session.title}: {e}")
     sem = asyncio.Semaphore(settings.CME_CONCURRENCY)
 
     async def process_subgroup(sg: Subgroup):
         async with sem:
             async with async_session() as sg_db:
                 try:
-                    await update_taxonomy_for_subgroup(sg_db, session.id, sg.id)
-                    await sg_db.commit()
+                    idle = humans_idle(await get_recent_messages(sg_db, sg.id, 1))
                 except Exception as e:
-                    logger.error(f"Taxonomy update failed for {sg.label}: {e}")
+                    logger.error(f"Activity check failed for {sg.label}: {e}")
+                    idle = False
 
                 try:
-                    foreign_ideas = await get_ideas_not_in_subgroup(sg_db, session.id, sg.id)
+                    relayed = await get_relayed_ideas(sg.id)
+                except Exception as e:
+                    logger.error(f"Delivery ledger read failed for {sg.label}: {e}")
+                    relayed = set()
+
+                try:
+                    foreign_ideas = await get_ideas_not_in_subgroup(
+                        sg_db, session.id, sg.id, plan=plan, exclude=relayed
+                    )
+                    # Nothing the subgroup hasn't heard yet: no surrogate turn
                     if foreign_ideas:
-                        insights = [idea.summary for idea in foreign_ideas[:3]]
+                        relaying = foreign_ideas[:SURROGATE_IDEAS_PER_TURN]
+                        insights = [idea.summary for idea in relaying]
                         session_obj = await sg_db.get(Session, session.id)
-                        await deliver_surrogate_message(sg_db, session_obj, sg, insights)
+                        message = await deliver_surrogate_message(
+                            sg_db, session_obj, sg, insights
+                        )
                         await sg_db.commit()
+                        # Only ideas that actually reached the subgroup count as relayed
+                        if message is not None:
+                            await record_message(message)
+                            await add_relayed_ideas(sg.id, [idea.id for idea in relaying])
                 except Exception as e:
                     logger.error(f"Surrogate delivery failed for {sg.label}: {e}")
 
                 # Contributor agent: generate novel contributions
                 try:
-                    recent_msgs = await sg_db.execute(
-                        select(Message)
-                        .where(Message.subgroup_id == sg.id)
-                        .order_by(Message.created_at.desc())
-                        .limit(10)
-                    )
-                    messages = list(recent_msgs.scalars().all())
+                    messages = await get_recent_messages(sg_db, sg.id, 10)
                     if messages:
                         context = "\n".join(
                             f"- {m.content}" for m in reversed(messages)
                         )
                         session_obj = await sg_db.get(Session, session.id)
-                        await deliver_contributor_message(sg_db, session_obj, sg, context)
+                        message = await deliver_contributor_message(
+                            sg_db, session_obj, sg, context
+                        )
                         await sg_db.commit()
+                        # Buffered only once committed: a rollback must not leave it there
+                        if message is not None:
+                            await record_message(message)
                 except Exception as e:
                     logger.error(f"Contributor delivery failed for {sg.label}: {e}")
 
-    await asyncio.gather(*[process_subgroup(sg) for sg in subgroups])
+        # Nobody answered the agents' last turn: space the next one out further
+        level = backoffs.get(sg.id, (0, 0.0))[0]
+        try:
+            if idle:
+                await set_subgroup_backoff(
+                    session.id, sg.id, level + 1, now + idle_backoff_seconds(level)
+                )
+            elif sg.id in backoffs:
+                await clear_subgroup_backoff(session.id, sg.id)
+        except Exception as e:
+            logger.error(f"Backoff update failed for {sg.label}: {e}")
+
+    await asyncio.gather(*[process_subgroup(sg) for sg in attended])
+
+    # New ideas are fresh cross-pollination material for every other subgroup
+    if producers:
+        try:
+            for sg in subgroups:
+                if producers - {sg.id}:
+                    await mark_subgroup_dirty(session.id, sg.id, activity=False)
+        except Exception as e:
+            logger.error(f"Dirty propagation failed for {session.title}: {e}")
 
     # Convergence tracking: compute and broadcast after each cycle
     try:
         async with async_session() as conv_db:
-            score = await compute_convergence(conv_db, session.id)
+            sentiments = await get_subgroup_sentiments(conv_db, session.id, fill=True)
+            score = convergence_score(list(sentiments.values()))
             logger.info(f"Session {session.title}: convergence={score:.3f}")
+            point = await record_convergence(conv_db, session.id, score, sentiments)
             await publish_to_session(
                 session.id,
                 "session:convergence",
-                {"convergence": score, "session_id": str(session.id)},
+                {
+                    **ConvergencePointOut(**point).model_dump(mode="json"),
+                    "session_id": str(session.id),
+                },
             )
     except Exception as e:
         logger.error(f"Convergence tracking failed for {session.title}: {e}")
 
 
+async def maintain_leases(leases: ShardLeases):
+    """Heartbeat and rebalance shard leases every ``CME_LEASE_TTL_SECONDS / 3``.
+
+    Runs as its own task so a long CME cycle cannot outlive the lease TTL.
+    """
+    while _running:
+        try:
+            before = set(leases.owned)
+            await leases.rebalance()
+            if leases.owned != before:
+                logger.info(
+                    f"CME worker {leases.worker_id[:8]} now holds {len(leases.owned)} shards"
+                )
+            await prune_convergence_series(leases)
+        except Exception as e:
+            logger.error(f"CME lease renewal error: {e}")
+        await asyncio.sleep(settings.CME_LEASE_TTL_SECONDS / 3)
+
+
 async def start_cme_loop():
-    """Start the background CME loop with distributed locking.
+    """Start the background CME scheduler for this worker's shards.
 
-    Each worker attempts to acquire a Redis lock before running the cycle.
-    Only the lock holder executes; others sleep and retry. If the leader
-    dies, the lock expires and another worker takes over.
+    Shard leases are kept by a ``maintain_leases`` task running alongside;
+    the loop itself polls the dirty set every ``CME_POLL_SECONDS`` and
+    processes the sessions it owns.
     """
     global _running
     _running = True
     worker_id = str(uuid.uuid4())
-    is_leader = False
+    leases = ShardLeases(worker_id)
+    renewer = asyncio.create_task(maintain_leases(leases))
     logger.info(f"CME loop started (worker {worker_id[:8]})")
 
-    while _running:
+    try:
+        while _running:
+            try:
+                if leases.owned:
+                    await run_cme_cycle(leases)
+            except Exception as e:
+                logger.error(f"CME cycle error: {e}")
+            await asyncio.sleep(settings.CME_POLL_SECONDS)
+    finally:
+        renewer.cancel()
         try:
-            if not is_leader:
-                is_leader = await acquire_cme_lock(worker_id)
-                if is_leader:
-                    logger.info(f"CME worker {worker_id[:8]} acquired leader lock")
-
-            if is_leader:
-                renewed = await renew_cme_lock(worker_id)
-                if not renewed:
-                    logger.warning(f"CME worker {worker_id[:8]} lost leader lock")
-                    is_leader = False
-                    continue
-
-                await run_cme_cycle()
+            await renewer
+        except asyncio.CancelledError:
+            pass
+        # Release leases on shutdown (or cancellation) so other workers take over
+        try:
+            await leases.release_all()
+            logger.info(f"CME worker {worker_id[:8]} released its shard leases")
         except Exception as e:
-            logger.error(f"CME cycle error: {e}")
-        await asyncio.sleep(settings.CME_INTERVAL_SECONDS)
-
-    # Release lock on shutdown
-    if is_leader:
-        await release_cme_lock(worker_id)
-        logger.info(f"CME worker {worker_id[:8]} released leader lock")
+            logger.error(f"CME shard release failed: {e}")
 
 
 def stop_cme_loop():
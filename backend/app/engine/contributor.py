@@ -11,8 +11,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.message import Message, MessageType
 from app.models.session import Session
 from app.models.subgroup import Subgroup
-from app.services.llm import generate_text
-from app.services.redis import publish_to_subgroup
+from app.engine.streaming import stream_agent_message
+from app.services.llm_governor import CallClass
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +22,11 @@ async def deliver_contributor_message(
     session: Session,
     subgroup: Subgroup,
     conversation_context: str,
-):
-    """Generate a novel contribution to the discussion."""
+) -> Message | None:
+    """Generate a novel contribution to the discussion.
+
+    Returns the stored message, or None if nothing was delivered.
+    """
     prompt = f"""You are a Contributor Agent in a group deliberation about: "{session.title}"
 
 Your job is to actively participate by asking thought-provoking questions or
@@ -39,35 +42,12 @@ Write a single conversational message (1-3 sentences) that either:
 
 Be concise and natural. Speak as a thoughtful peer."""
 
-    try:
-        content = await generate_text(prompt)
-    except Exception as e:
-        logger.error(f"Contributor agent failed for {subgroup.label}: {e}")
-        return
-
-    if not content or not content.strip():
-        return
-
-    message = Message(
-        subgroup_id=subgroup.id,
-        user_id=None,
-        content=content.strip(),
+    return await stream_agent_message(
+        db,
+        session,
+        subgroup,
+        prompt,
         msg_type=MessageType.contributor,
-    )
-    db.add(message)
-    await db.flush()
-
-    await publish_to_subgroup(
-        subgroup.id,
-        "chat:new_message",
-        {
-            "id": str(message.id),
-            "subgroup_id": str(message.subgroup_id),
-            "user_id": None,
-            "display_name": "Contributor Agent",
-            "content": message.content,
-            "msg_type": "contributor",
-            "source_subgroup_id": None,
-            "created_at": message.created_at.isoformat() if message.created_at else None,
-        },
+        display_name="Contributor Agent",
+        call_class=CallClass.contributor,
     )
@@ -0,0 +1,339 @@
+"""Session convergence from running per-subgroup sentiment aggregates.
+
+Convergence compares the average idea sentiment of each subgroup. Rather
+than averaging over the ``ideas`` table on every CME cycle and status poll,
+each session keeps a Redis hash ``convergence:stats:<session_id>`` with a
+running ``<subgroup_id>:sum`` and ``<subgroup_id>:count`` per subgroup, so
+scoring is O(subgroups).
+
+Ideas are only ever inserted by the CME shard owner of their session, which
+calls ``record_ideas`` once they are committed; paraphrase merges only bump
+``support_count`` and leave the (unweighted) averages alone. The owner is
+also the only one that fills a cold hash (``fill=True``): other readers
+(admin status, stop) answer a cold read with one GROUP BY query and leave
+the hash alone, so a fill can never race an increment and count ideas twice.
+A hash only answers reads once it carries the ``warm`` marker; increments
+to a cold hash are ignored until the next fill. Redis errors fall back to
+the database.
+
+Each cycle's score and per-subgroup sentiments are also appended to the
+session's ``ConvergenceSeries``, an array-backed in-memory trajectory kept
+on the shard owner, and at most once every
+``CONVERGENCE_HISTORY_INTERVAL_SECONDS`` to the ``convergence_points``
+table. ``get_convergence_points`` serves a ``since`` delta from both,
+merged by timestamp: the downsampled history, at full resolution for the
+stretch still held in memory when this worker owns the session. The owner
+drops a trajectory once the session is no longer active or on its shards.
+"""
+import bisect
+import logging
+import math
+import time
+import uuid
+from array import array
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.convergence import ConvergencePoint
+from app.models.idea import Idea
+from app.services.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY_PREFIX = "convergence:stats:"
+# Stats of a session nobody has touched for a day are dropped (and rebuilt on demand)
+_STATS_TTL_SECONDS = 24 * 3600
+
+# In-memory trajectories: points kept per session, and sessions kept (LRU)
+_MAX_SERIES_POINTS = 4096
+_MAX_SERIES = 1024
+
+_counters = {"hits": 0, "fills": 0, "db_reads": 0}
+
+
+def _stats_key(session_id: uuid.UUID) -> str:
+    return f"{STATS_KEY_PREFIX}{session_id}"
+
+
+def convergence_score(sentiments: list[float]) -> float:
+    """Convergence of subgroup average sentiments (0.0 = divergent, 1.0 = fully converged)."""
+    if len(sentiments) < 2:
+        return 0.0  # Need at least 2 subgroups to measure convergence
+
+    # Compute variance of subgroup sentiments
+    mean = sum(sentiments) / len(sentiments)
+    variance = sum((s - mean) ** 2 for s in sentiments) / len(sentiments)
+
+    # Map variance to 0-1 scale. Max possible variance for sentiment in [-1,1] is 1.0.
+    # Score = 1 - sqrt(variance) gives us a 0-1 convergence metric.
+    convergence = max(0.0, 1.0 - variance ** 0.5)
+    return round(convergence, 3)
+
+
+async def _query(db: AsyncSession, session_id: uuid.UUID) -> dict[uuid.UUID, tuple[float, int]]:
+    _counters["db_reads"] += 1
+    result = await db.execute(
+        select(Idea.subgroup_id, func.sum(Idea.sentiment), func.count(Idea.id))
+        .where(Idea.session_id == session_id)
+        .group_by(Idea.subgroup_id)
+    )
+    return {sg_id: (float(total), int(count)) for sg_id, total, count in result.all()}
+
+
+def _from_hash(raw: dict[str, str]) -> dict[uuid.UUID, tuple[float, int]]:
+    sums, counts = {}, {}
+    for field, value in raw.items():
+        sg_id, _, part = field.partition(":")
+        if part == "sum":
+            sums[uuid.UUID(sg_id)] = float(value)
+        elif part == "count":
+            counts[uuid.UUID(sg_id)] = int(value)
+    return {sg_id: (sums.get(sg_id, 0.0), count) for sg_id, count in counts.items()}
+
+
+async def record_ideas(session_id: uuid.UUID, ideas: list[Idea]):
+    """Add just-committed ideas to their session's running aggregates."""
+    if not ideas:
+        return
+    totals: dict[uuid.UUID, list] = defaultdict(lambda: [0.0, 0])
+    for idea in ideas:
+        totals[idea.subgroup_id][0] += idea.sentiment
+        totals[idea.subgroup_id][1] += 1
+
+    key = _stats_key(session_id)
+    try:
+        r = await get_redis()
+        if not await r.hexists(key, "warm"):
+            return  # the next fill reads these ideas from the database
+        async with r.pipeline(transaction=True) as pipe:
+            for sg_id, (total, count) in totals.items():
+                pipe.hincrbyfloat(key, f"{sg_id}:sum", total)
+                pipe.hincrby(key, f"{sg_id}:count", count)
+            pipe.expire(key, _STATS_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Convergence stats update failed for session {session_id}: {e}")
+        await drop_session_stats(session_id)
+
+
+async def get_subgroup_sentiments(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    fill: bool = False,
+) -> dict[uuid.UUID, float]:
+    """Average idea sentiment of each subgroup that has ideas.
+
+    Only the session's CME shard owner should pass ``fill=True``.
+    """
+    try:
+        r = await get_redis()
+        key = _stats_key(session_id)
+        raw = await r.hgetall(key)
+        if raw.get("warm"):
+            _counters["hits"] += 1
+            stats = _from_hash(raw)
+        else:
+            stats = await _query(db, session_id)
+            if fill:
+                mapping = {"warm": 1}
+                for sg_id, (total, count) in stats.items():
+                    mapping[f"{sg_id}:sum"] = total
+                    mapping[f"{sg_id}:count"] = count
+                async with r.pipeline(transaction=True) as pipe:
+                    pipe.delete(key)
+                    pipe.hset(key, mapping=mapping)
+                    pipe.expire(key, _STATS_TTL_SECONDS)
+                    await pipe.execute()
+                _counters["fills"] += 1
+    except Exception as e:
+        logger.error(f"Convergence stats read failed for session {session_id}: {e}")
+        stats = await _query(db, session_id)
+    return {sg_id: total / count for sg_id, (total, count) in stats.items() if count}
+
+
+async def compute_convergence(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    fill: bool = False,
+) -> float:
+    """Compute convergence score (0.0 = divergent, 1.0 = fully converged).
+
+    Measures how aligned subgroup sentiments are across the session.
+    When all subgroups share similar average sentiment, convergence is high.
+    """
+    sentiments = await get_subgroup_sentiments(db, session_id, fill=fill)
+    return convergence_score(list(sentiments.values()))
+
+
+async def drop_session_stats(session_id: uuid.UUID):
+    """Forget a session's aggregates (the next owner read rebuilds them)."""
+    try:
+        r = await get_redis()
+        await r.delete(_stats_key(session_id))
+    except Exception as e:
+        logger.error(f"Convergence stats drop failed for session {session_id}: {e}")
+
+
+class ConvergenceSeries:
+    """Convergence trajectory of one session, stored in flat arrays.
+
+    Subgroup columns are append-only (a late joiner's new subgroup adds
+    one). Point ``i`` has time ``times[i]`` (epoch seconds), score
+    ``scores[i]`` and one sentiment per column known at the time in
+    ``values[offsets[i]:offsets[i + 1]]``, NaN where the subgroup had no
+    ideas yet. Holds at most ``_MAX_SERIES_POINTS`` points; the oldest half
+    is dropped when full (it is in the database, downsampled).
+    """
+
+    def __init__(self):
+        self.times = array("d")
+        self.scores = array("d")
+        self.offsets = array("q", [0])
+        self.values = array("d")
+        self.columns: list[uuid.UUID] = []
+        self._column_of: dict[uuid.UUID, int] = {}
+        self.persisted_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def append(self, at: float, score: float, sentiments: dict[uuid.UUID, float]):
+        for sg_id in sentiments:
+            if sg_id not in self._column_of:
+                self._column_of[sg_id] = len(self.columns)
+                self.columns.append(sg_id)
+        row = [math.nan] * len(self.columns)
+        for sg_id, sentiment in sentiments.items():
+            row[self._column_of[sg_id]] = sentiment
+        self.times.append(at)
+        self.scores.append(score)
+        self.values.extend(row)
+        self.offsets.append(len(self.values))
+        if len(self.times) > _MAX_SERIES_POINTS:
+            self._drop_oldest(len(self.times) // 2)
+
+    def _drop_oldest(self, count: int):
+        cut = self.offsets[count]
+        del self.times[:count]
+        del self.scores[:count]
+        del self.values[:cut]
+        self.offsets = array("q", (offset - cut for offset in self.offsets[count:]))
+
+    def since(self, after: float) -> list[tuple[float, float, dict[uuid.UUID, float]]]:
+        """Points strictly after epoch ``after``, oldest first."""
+        start = bisect.bisect_right(self.times, after)
+        points = []
+        for i in range(start, len(self.times)):
+            row = self.values[self.offsets[i]:self.offsets[i + 1]]
+            sentiments = {
+                self.columns[col]: value for col, value in enumerate(row) if not math.isnan(value)
+            }
+            points.append((self.times[i], self.scores[i], sentiments))
+        return points
+
+
+# session_id -> trajectory, least recently updated first
+_series: OrderedDict[uuid.UUID, ConvergenceSeries] = OrderedDict()
+
+
+def _epoch(at: datetime) -> float:
+    # SQLite hands back naive datetimes; everything here is UTC
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+    return at.timestamp()
+
+
+def _point(at: float, score: float, sentiments: dict) -> dict:
+    return {
+        "recorded_at": datetime.fromtimestamp(at, timezone.utc),
+        "convergence": score,
+        "sentiments": {uuid.UUID(str(sg_id)): value for sg_id, value in sentiments.items()},
+    }
+
+
+async def record_convergence(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    score: float,
+    sentiments: dict[uuid.UUID, float],
+    persist: bool = False,
+    now: float | None = None,
+) -> dict:
+    """Append a point to the session's trajectory and return it.
+
+    The point is also written to ``convergence_points`` (and committed) if
+    ``persist`` is set or the last written point is at least
+    ``CONVERGENCE_HISTORY_INTERVAL_SECONDS`` old.
+    """
+    now = time.time() if now is None else now
+    series = _series.get(session_id)
+    if series is None:
+        series = _series[session_id] = ConvergenceSeries()
+        while len(_series) > _MAX_SERIES:
+            _series.popitem(last=False)
+    _series.move_to_end(session_id)
+    series.append(now, score, sentiments)
+
+    point = _point(now, score, sentiments)
+    if persist or now - series.persisted_at >= settings.CONVERGENCE_HISTORY_INTERVAL_SECONDS:
+        db.add(ConvergencePoint(
+            session_id=session_id,
+            recorded_at=point["recorded_at"],
+            score=score,
+            sentiments={str(sg_id): value for sg_id, value in sentiments.items()},
+        ))
+        await db.commit()
+        series.persisted_at = now
+    return point
+
+
+async def get_convergence_points(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    since: datetime | None = None,
+) -> list[dict]:
+    """A session's convergence points after ``since`` (all when None), oldest first."""
+    query = select(ConvergencePoint).where(ConvergencePoint.session_id == session_id)
+    if since is not None:
+        query = query.where(ConvergencePoint.recorded_at > since)
+    result = await db.execute(query.order_by(ConvergencePoint.recorded_at))
+    points = [
+        _point(_epoch(row.recorded_at), row.score, row.sentiments)
+        for row in result.scalars().all()
+    ]
+
+    # The shard owner also holds every point of the recent past. Merge by
+    # timestamp rather than letting it replace the history: a stale series
+    # (the session moved or was stopped elsewhere) lacks later points
+    series = _series.get(session_id)
+    if series is not None and len(series):
+        after = _epoch(since) if since is not None else -math.inf
+        merged = {p["recorded_at"]: p for p in points}
+        for at, score, sentiments in series.since(after):
+            point = _point(at, score, sentiments)
+            merged[point["recorded_at"]] = point
+        points = sorted(merged.values(), key=lambda p: p["recorded_at"])
+    return points
+
+
+def drop_session_series(session_id: uuid.UUID):
+    """Forget a session's in-memory trajectory (its history stays in the database)."""
+    _series.pop(session_id, None)
+
+
+def series_session_ids() -> list[uuid.UUID]:
+    """Sessions with an in-memory trajectory on this worker."""
+    return list(_series)
+
+
+def clear_local():
+    """Drop every in-memory trajectory."""
+    _series.clear()
+
+
+def convergence_stats() -> dict:
+    return {"series": len(_series), **_counters}
@@ -0,0 +1,92 @@
+"""Cross-pollination planning: which foreign ideas each subgroup hears next.
+
+The CME paper specifies that cross-pollinated content should prioritize
+ideas that CHALLENGE a subgroup's prevailing beliefs, not just any unheard
+idea. An idea's challenge to a subgroup is the distance between its
+sentiment and the subgroup's average sentiment (0.0 for a subgroup without
+ideas yet).
+
+A ``CrossPollinationPlan`` loads a session's ideas once per CME cycle into
+NumPy arrays (sentiment, owning subgroup, support) and ranks the foreign
+ideas of every subgroup in one vectorized pass: most challenging first,
+ties going to the better supported idea and then the older one. Every
+subgroup processed in the cycle reads its ranking from the same plan.
+"""
+import uuid
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.idea import Idea
+
+# Foreign ideas returned per subgroup unless asked otherwise
+DEFAULT_LIMIT = 10
+
+
+class CrossPollinationPlan:
+    """All subgroups' challenge rankings over one snapshot of a session's ideas."""
+
+    def __init__(self, ideas: list[Idea]):
+        self.ideas = ideas
+        self.subgroups = list(dict.fromkeys(idea.subgroup_id for idea in ideas))
+        self._row = {sg_id: row for row, sg_id in enumerate(self.subgroups)}
+
+        count = len(ideas)
+        rows = len(self.subgroups)
+        sentiment = np.fromiter((idea.sentiment for idea in ideas), np.float64, count)
+        support = np.fromiter((idea.support_count or 1 for idea in ideas), np.int64, count)
+        owner = np.fromiter((self._row[idea.subgroup_id] for idea in ideas), np.intp, count)
+
+        sizes = np.bincount(owner, minlength=rows)
+        means = np.bincount(owner, weights=sentiment, minlength=rows) / np.maximum(sizes, 1)
+        # One extra row, mean 0.0 and no own ideas, for subgroups without ideas
+        self.local_means = np.append(means, 0.0)
+        self._foreign = count - np.append(sizes, 0)
+
+        # (rows + 1) x ideas challenge matrix; a subgroup's own ideas sort last
+        challenge = np.abs(sentiment[np.newaxis, :] - self.local_means[:, np.newaxis])
+        challenge[owner, np.arange(count)] = -np.inf
+        age = np.broadcast_to(np.arange(count), challenge.shape)
+        self._order = np.lexsort(
+            (age, np.broadcast_to(-support, challenge.shape), -challenge), axis=-1
+        )
+
+    def local_mean(self, subgroup_id: uuid.UUID) -> float:
+        return float(self.local_means[self._row.get(subgroup_id, len(self.subgroups))])
+
+    def challenging(
+        self,
+        subgroup_id: uuid.UUID,
+        limit: int | None = DEFAULT_LIMIT,
+        exclude: set[uuid.UUID] | None = None,
+    ) -> list[Idea]:
+        """Foreign ideas for a subgroup, most challenging first.
+
+        All of them if ``limit`` is None; ideas in ``exclude`` (e.g. already
+        relayed) are skipped.
+        """
+        row = self._row.get(subgroup_id, len(self.subgroups))
+        ranked = self._order[row, :self._foreign[row]]
+        if not exclude:
+            return [self.ideas[i] for i in ranked[:limit]]
+        picked = []
+        for i in ranked:
+            if limit is not None and len(picked) >= limit:
+                break
+            if self.ideas[i].id not in exclude:
+                picked.append(self.ideas[i])
+        return picked
+
+
+async def load_cross_pollination_plan(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+) -> CrossPollinationPlan:
+    """Plan over the session's current ideas (one query)."""
+    result = await db.execute(
+        select(Idea)
+        .where(Idea.session_id == session_id)
+        .order_by(Idea.created_at, Idea.id)
+    )
+    return CrossPollinationPlan(list(result.scalars().all()))
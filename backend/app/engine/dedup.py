@@ -0,0 +1,78 @@
+"""Semantic idea deduplication.
+
+Keeps one in-memory embedding index per session: the ids of the session's
+ideas plus a matrix of their unit-length summary embeddings. A candidate
+idea whose cosine similarity to an existing one reaches
+``IDEA_DEDUP_THRESHOLD`` is treated as a paraphrase of it.
+
+Indexes are loaded lazily from the database and rebuilt whenever the
+session's idea count no longer matches (e.g. after a rollback, or when
+another worker inserted ideas while it owned the session's shard).
+"""
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.idea import Idea
+from app.services.embeddings import embed_texts
+
+_indexes: OrderedDict[uuid.UUID, "IdeaIndex"] = OrderedDict()
+
+
+class IdeaIndex:
+    """Embedding matrix of one session's ideas, searched with a single matmul."""
+
+    def __init__(self, ids: list[uuid.UUID], vectors: np.ndarray):
+        self.ids = ids
+        self.vectors = vectors
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, vector: np.ndarray) -> tuple[uuid.UUID | None, float]:
+        """Return the most similar idea id and its cosine similarity."""
+        if not self.ids:
+            return None, 0.0
+        scores = self.vectors @ vector
+        best = int(np.argmax(scores))
+        return self.ids[best], float(scores[best])
+
+    def add(self, idea_id: uuid.UUID, vector: np.ndarray):
+        self.ids.append(idea_id)
+        if self.vectors.size:
+            self.vectors = np.vstack([self.vectors, vector[np.newaxis, :]])
+        else:
+            self.vectors = vector[np.newaxis, :].copy()
+
+
+async def get_session_index(db: AsyncSession, session_id: uuid.UUID) -> IdeaIndex:
+    """Return the session's index, (re)building it if it is missing or stale."""
+    count = await db.scalar(
+        select(func.count(Idea.id)).where(Idea.session_id == session_id)
+    ) or 0
+
+    index = _indexes.get(session_id)
+    if index is None or index.size != count:
+        result = await db.execute(
+            select(Idea.id, Idea.summary)
+            .where(Idea.session_id == session_id)
+            .order_by(Idea.created_at)
+        )
+        rows = result.all()
+        vectors = await embed_texts([row.summary for row in rows])
+        index = IdeaIndex([row.id for row in rows], vectors)
+        _indexes[session_id] = index
+
+    _indexes.move_to_end(session_id)
+    while len(_indexes) > settings.IDEA_INDEX_MAX_SESSIONS:
+        _indexes.popitem(last=False)
+    return index
+
+
+def drop_session_index(session_id: uuid.UUID):
+    _indexes.pop(session_id, None)
@@ -0,0 +1,236 @@
+"""Ring buffer of each subgroup's most recent messages.
+
+The CME keeps asking for "the newest few messages" of a subgroup (surrogate
+and contributor context, taxonomy extraction, the idle check) right after
+those messages passed through ``handle_chat_message`` or an agent stream.
+Every stored message is pushed into a buffer holding the subgroup's newest
+``RECENT_MESSAGES_SIZE`` messages, and reads are served from it instead of
+the database.
+
+With ``RECENT_MESSAGES_REDIS`` (the default) the buffer is a Redis list
+``recent:messages:<subgroup_id>``, newest first, so the worker running a
+session's CME shard sees messages written through any other worker's
+sockets. Without it the buffer is an in-process deque, which is only
+complete when a single worker serves every socket.
+
+A buffer only answers reads once it is *warm*, i.e. it was filled from the
+database. A cold buffer (first read after a restart, expiry, or eviction)
+falls back to one query, and the result fills the buffer. In Redis the
+warmth is a separate ``:warm`` key, and the fill runs under WATCH so a
+message pushed while the query runs is never lost. Messages the database
+does not have yet (``CHAT_PERSISTENCE=fast`` rows still pending in the
+write-behind ``message_writer``) are merged into the fill: the entries
+already pushed to the Redis list, or this process's pending rows for the
+in-process buffer. Redis errors fall back to the database.
+"""
+import logging
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from redis.exceptions import WatchError
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.message import Message
+from app.schemas.message import MessageOut
+from app.services.redis import get_redis
+from app.websocket.write_behind import message_writer
+
+logger = logging.getLogger(__name__)
+
+RECENT_KEY_PREFIX = "recent:messages:"
+
+# subgroup_id -> newest-first messages (warm buffers only), least recently used first
+_local: OrderedDict[uuid.UUID, deque[Message]] = OrderedDict()
+
+_counters = {"hits": 0, "fills": 0, "db_reads": 0}
+
+
+def _list_key(subgroup_id: uuid.UUID) -> str:
+    return f"{RECENT_KEY_PREFIX}{subgroup_id}"
+
+
+def _warm_key(subgroup_id: uuid.UUID) -> str:
+    return f"{RECENT_KEY_PREFIX}{subgroup_id}:warm"
+
+
+def _snapshot(message: Message) -> Message:
+    """Detached copy of a message, safe to keep after its DB session is gone."""
+    return Message(
+        id=message.id,
+        subgroup_id=message.subgroup_id,
+        user_id=message.user_id,
+        content=message.content,
+        msg_type=message.msg_type,
+        source_subgroup_id=message.source_subgroup_id,
+        created_at=message.created_at,
+    )
+
+
+def _encode(message: Message) -> str:
+    return MessageOut.from_message(message).model_dump_json(exclude={"display_name"})
+
+
+def _decode(raw: str) -> Message:
+    out = MessageOut.model_validate_json(raw)
+    return Message(**out.model_dump(exclude={"display_name"}))
+
+
+def _utc(at: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything here is UTC
+    return at.replace(tzinfo=timezone.utc) if at.tzinfo is None else at
+
+
+def _key(message: Message) -> tuple[datetime, uuid.UUID]:
+    return _utc(message.created_at), message.id
+
+
+def _select(
+    messages: list[Message],
+    limit: int,
+    after: tuple[datetime, uuid.UUID] | None,
+) -> list[Message]:
+    # Push order is not key order (concurrent writers, clock skew), and
+    # callers such as the taxonomy watermark rely on messages[0] being newest
+    messages = sorted(messages, key=_key, reverse=True)
+    if after is not None:
+        after = (_utc(after[0]), after[1])
+        messages = [m for m in messages if _key(m) > after]
+    return messages[:limit]
+
+
+def _merge(messages: list[Message], unpersisted: list[Message]) -> list[Message]:
+    """A fill's database rows plus buffered messages not stored yet, newest first."""
+    known = {m.id for m in messages}
+    # Past a full window, older messages would not make it into the buffer anyway
+    oldest = _key(messages[-1]) if len(messages) >= settings.RECENT_MESSAGES_SIZE else None
+    extra = {
+        m.id: m for m in unpersisted
+        if m.id not in known and (oldest is None or _key(m) > oldest)
+    }
+    if not extra:
+        return messages
+    merged = sorted([*messages, *extra.values()], key=_key, reverse=True)
+    return merged[:settings.RECENT_MESSAGES_SIZE]
+
+
+async def _query(
+    db: AsyncSession,
+    subgroup_id: uuid.UUID,
+    limit: int,
+    after: tuple[datetime, uuid.UUID] | None = None,
+) -> list[Message]:
+    _counters["db_reads"] += 1
+    query = select(Message).where(Message.subgroup_id == subgroup_id)
+    if after is not None:
+        query = query.where(tuple_(Message.created_at, Message.id) > after)
+    result = await db.execute(
+        query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def record_message(message: Message):
+    """Push a just-stored message onto its subgroup's buffer."""
+    if settings.RECENT_MESSAGES_REDIS:
+        try:
+            r = await get_redis()
+            key = _list_key(message.subgroup_id)
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.lpush(key, _encode(message))
+                pipe.ltrim(key, 0, settings.RECENT_MESSAGES_SIZE - 1)
+                pipe.expire(key, settings.RECENT_MESSAGES_TTL_SECONDS)
+                pipe.expire(_warm_key(message.subgroup_id), settings.RECENT_MESSAGES_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Recent-message push failed for {message.subgroup_id}: {e}")
+        return
+
+    buffer = _local.get(message.subgroup_id)
+    if buffer is not None:
+        buffer.appendleft(_snapshot(message))
+        _local.move_to_end(message.subgroup_id)
+
+
+async def get_recent_messages(
+    db: AsyncSession,
+    subgroup_id: uuid.UUID,
+    limit: int,
+    after: tuple[datetime, uuid.UUID] | None = None,
+) -> list[Message]:
+    """Newest ``limit`` messages of a subgroup, newest first.
+
+    With ``after`` (a (created_at, id) key), only messages past it. The
+    returned messages are detached copies; don't modify them.
+    """
+    if limit > settings.RECENT_MESSAGES_SIZE:
+        return await _query(db, subgroup_id, limit, after)
+    if settings.RECENT_MESSAGES_REDIS:
+        try:
+            return await _get_redis(db, subgroup_id, limit, after)
+        except Exception as e:
+            logger.error(f"Recent-message read failed for {subgroup_id}: {e}")
+            return await _query(db, subgroup_id, limit, after)
+    return await _get_local(db, subgroup_id, limit, after)
+
+
+async def _get_redis(db, subgroup_id, limit, after) -> list[Message]:
+    r = await get_redis()
+    key, warm_key = _list_key(subgroup_id), _warm_key(subgroup_id)
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.exists(warm_key)
+        pipe.lrange(key, 0, -1)
+        warm, entries = await pipe.execute()
+    if warm:
+        _counters["hits"] += 1
+        return _select([_decode(raw) for raw in entries], limit, after)
+
+    # Cold: fill from the database, unless a push lands while we query
+    async with r.pipeline(transaction=True) as pipe:
+        await pipe.watch(key)
+        # Pushed entries may be write-behind rows not in the database yet
+        buffered = [_decode(raw) for raw in await pipe.lrange(key, 0, -1)]
+        messages = _merge(
+            await _query(db, subgroup_id, settings.RECENT_MESSAGES_SIZE), buffered
+        )
+        pipe.multi()
+        pipe.delete(key)
+        if messages:
+            pipe.rpush(key, *[_encode(m) for m in messages])
+            pipe.expire(key, settings.RECENT_MESSAGES_TTL_SECONDS)
+        pipe.set(warm_key, 1, ex=settings.RECENT_MESSAGES_TTL_SECONDS)
+        try:
+            await pipe.execute()
+            _counters["fills"] += 1
+        except WatchError:
+            pass  # someone pushed meanwhile; the next read fills it
+    return _select([_snapshot(m) for m in messages], limit, after)
+
+
+async def _get_local(db, subgroup_id, limit, after) -> list[Message]:
+    buffer = _local.get(subgroup_id)
+    if buffer is None:
+        pending = [
+            Message(**row) for row in message_writer.pending if row["subgroup_id"] == subgroup_id
+        ]
+        messages = _merge(await _query(db, subgroup_id, settings.RECENT_MESSAGES_SIZE), pending)
+        buffer = deque((_snapshot(m) for m in messages), maxlen=settings.RECENT_MESSAGES_SIZE)
+        _local[subgroup_id] = buffer
+        _counters["fills"] += 1
+        while len(_local) > settings.RECENT_MESSAGES_MAX_SUBGROUPS:
+            _local.popitem(last=False)
+    else:
+        _counters["hits"] += 1
+    _local.move_to_end(subgroup_id)
+    return _select(list(buffer), limit, after)
+
+
+def clear_local():
+    """Drop the in-process buffers (the Redis ones expire on their own)."""
+    _local.clear()
+
+
+def recent_messages_stats() -> dict:
+    return {"buffers": len(_local), **_counters}
@@ -0,0 +1,129 @@
+"""Shard leases for the CME.
+
+Sessions are hashed onto a fixed ring of ``CME_SHARDS`` shards. Every worker
+heartbeats into a Redis registry, and each shard is assigned to one live
+worker by rendezvous hashing, so a worker joining or leaving only moves the
+shards it gains or loses. A worker runs CME work only for sessions whose
+shard it holds a Redis lease on; if a worker dies, its heartbeat and leases
+expire and the surviving workers pick its shards up.
+"""
+import hashlib
+import logging
+import time
+import uuid
+
+from app.config import settings
+from app.services.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+CME_WORKERS_KEY = "cme:workers"
+CME_SHARD_KEY_PREFIX = "cme:shard:"
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+
+
+def session_shard(session_id: uuid.UUID) -> int:
+    """Map a session onto its shard."""
+    return _hash64(session_id.bytes) % settings.CME_SHARDS
+
+
+def shard_owner(shard: int, workers: list[str]) -> str | None:
+    """Pick the live worker responsible for a shard (highest random weight)."""
+    if not workers:
+        return None
+    return max(workers, key=lambda w: _hash64(f"{shard}:{w}".encode()))
+
+
+def shard_key(shard: int) -> str:
+    return f"{CME_SHARD_KEY_PREFIX}{shard}"
+
+
+async def heartbeat(worker_id: str) -> list[str]:
+    """Record this worker as alive, prune dead ones, and return the live set."""
+    r = await get_redis()
+    now = time.time()
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.zadd(CME_WORKERS_KEY, {worker_id: now})
+        pipe.zremrangebyscore(CME_WORKERS_KEY, "-inf", now - settings.CME_LEASE_TTL_SECONDS)
+        pipe.zrange(CME_WORKERS_KEY, 0, -1)
+        _, _, workers = await pipe.execute()
+    return list(workers)
+
+
+async def leave(worker_id: str):
+    """Remove this worker from the registry so its shards move immediately."""
+    r = await get_redis()
+    await r.zrem(CME_WORKERS_KEY, worker_id)
+
+
+async def acquire_shard_lease(shard: int, worker_id: str) -> bool:
+    """Try to acquire a shard lease. Returns True if acquired."""
+    r = await get_redis()
+    acquired = await r.set(
+        shard_key(shard), worker_id, nx=True, ex=settings.CME_LEASE_TTL_SECONDS
+    )
+    return acquired is not None
+
+
+async def renew_shard_lease(shard: int, worker_id: str) -> bool:
+    """Renew a shard lease if we still own it. Returns True if renewed."""
+    r = await get_redis()
+    current = await r.get(shard_key(shard))
+    if current == worker_id:
+        await r.expire(shard_key(shard), settings.CME_LEASE_TTL_SECONDS)
+        return True
+    return False
+
+
+async def release_shard_lease(shard: int, worker_id: str):
+    """Release a shard lease if we still own it."""
+    r = await get_redis()
+    current = await r.get(shard_key(shard))
+    if current == worker_id:
+        await r.delete(shard_key(shard))
+
+
+class ShardLeases:
+    """The set of shards this worker currently holds leases on."""
+
+    def __init__(self, worker_id: str):
+        self.worker_id = worker_id
+        self.owned: set[int] = set()
+
+    def owns_session(self, session_id: uuid.UUID) -> bool:
+        return session_shard(session_id) in self.owned
+
+    async def rebalance(self):
+        """Heartbeat, then converge our leases on the shards assigned to us.
+
+        Shards that now belong to another worker are released so it can take
+        them; shards assigned to us but still leased elsewhere are picked up
+        once the previous holder releases them or its lease expires.
+        """
+        workers = await heartbeat(self.worker_id)
+        desired = {
+            shard for shard in range(settings.CME_SHARDS)
+            if shard_owner(shard, workers) == self.worker_id
+        }
+
+        for shard in sorted(self.owned - desired):
+            await release_shard_lease(shard, self.worker_id)
+            self.owned.discard(shard)
+
+        for shard in sorted(self.owned & desired):
+            if not await renew_shard_lease(shard, self.worker_id):
+                logger.warning(f"CME worker {self.worker_id[:8]} lost shard {shard}")
+                self.owned.discard(shard)
+
+        for shard in sorted(desired - self.owned):
+            if await acquire_shard_lease(shard, self.worker_id):
+                self.owned.add(shard)
+
+    async def release_all(self):
+        for shard in sorted(self.owned):
+            await release_shard_lease(shard, self.worker_id)
+        self.owned.clear()
+        await leave(self.worker_id)
@@ -0,0 +1,89 @@
+"""Streamed delivery of agent messages.
+
+Agent replies reach the subgroup while they are being generated. The message
+id is assigned up front, every chunk is published as ``chat:message_delta``,
+and once the stream completes the ``Message`` row is written and
+``chat:message_done`` carries the final message. If generation fails or
+comes back empty, ``chat:message_done`` is sent with ``discarded: true`` so
+clients drop the partial bubble, and nothing is stored.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.message import Message, MessageType
+from app.models.session import Session
+from app.models.subgroup import Subgroup
+from app.schemas.message import MessageOut
+from app.services.llm import stream_text
+from app.services.llm_governor import CallClass
+from app.services.redis import publish_to_subgroup
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_agent_message(
+    db: AsyncSession,
+    session: Session,
+    subgroup: Subgroup,
+    prompt: str,
+    *,
+    msg_type: MessageType,
+    display_name: str,
+    call_class: CallClass,
+) -> Message | None:
+    """Stream an LLM-written agent message to a subgroup and store it.
+
+    The message is flushed, not committed; the caller commits it and then
+    pushes it into the recent-message buffer (``record_message``).
+    """
+    message_id = uuid.uuid4()
+    header = {"id": str(message_id), "subgroup_id": str(subgroup.id)}
+
+    parts: list[str] = []
+    try:
+        async for chunk in stream_text(prompt, call_class=call_class, session_id=session.id):
+            parts.append(chunk)
+            await publish_to_subgroup(
+                subgroup.id,
+                "chat:message_delta",
+                {
+                    **header,
+                    "display_name": display_name,
+                    "msg_type": msg_type.value,
+                    "delta": chunk,
+                },
+            )
+        content = "".join(parts).strip()
+    except Exception as e:
+        logger.error(f"{display_name} stream failed in {subgroup.label}: {e}")
+        content = ""
+
+    if not content:
+        if parts:
+            await publish_to_subgroup(
+                subgroup.id, "chat:message_done", {**header, "discarded": True}
+            )
+        return None
+
+    message = Message(
+        id=message_id,
+        subgroup_id=subgroup.id,
+        user_id=None,
+        content=content,
+        msg_type=msg_type,
+        # Stamped at completion: the column default is the (earlier)
+        # transaction start, which would sort it before messages sent meanwhile
+        created_at=datetime.now(timezone.utc),
+    )
+    db.add(message)
+    await db.flush()
+
+    await publish_to_subgroup(
+        subgroup.id,
+        "chat:message_done",
+        MessageOut.from_message(message, display_name).to_event(),
+    )
+    return message
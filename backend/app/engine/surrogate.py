@@ -1,14 +1,14 @@
-"""Surrogate Agent - crafts and delivers relay messages."""
+"""Surrogate Agent - crafts and streams relay messages."""
 import logging
-import uuid
 
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.message import Message, MessageType
 from app.models.session import Session
 from app.models.subgroup import Subgroup
-from app.services.llm import generate_text
+from app.engine.recent_messages import get_recent_messages
+from app.engine.streaming import stream_agent_message
+from app.services.llm_governor import CallClass
 from app.services.redis import publish_to_subgroup
 
 logger = logging.getLogger(__name__)
@@ -19,19 +19,16 @@ async def deliver_surrogate_message(
     session: Session,
     subgroup: Subgroup,
     insights: list[str],
-):
-    """Craft and deliver a surrogate message to a subgroup."""
+) -> Message | None:
+    """Craft and deliver a surrogate message relaying every given insight.
+
+    Returns the stored message, or None if nothing was delivered.
+    """
     if not insights:
-        return
+        return None
 
     # Get recent messages for context
-    result = await db.execute(
-        select(Message)
-        .where(Message.subgroup_id == subgroup.id)
-        .order_by(Message.created_at.desc())
-        .limit(10)
-    )
-    recent_messages = result.scalars().all()
+    recent_messages = await get_recent_messages(db, subgroup.id, 10)
 
     context = "\n".join(
         f"- {m.content}" for m in reversed(recent_messages)
@@ -60,41 +57,15 @@ Current conversation context in this group:
 Insights from other groups to introduce:
 {insights_text}
 
-Write a single conversational message (2-4 sentences) that naturally weaves in 1-2 of these insights.
-Be concise and conversational. Do NOT list all insights - pick the most relevant or challenging ones.
-Do NOT use bullet points. Write naturally as if you're chatting."""
-
-    try:
-        content = await generate_text(prompt)
-    except Exception as e:
-        logger.error(f"LLM call failed for surrogate in {subgroup.label}: {e}")
-        return
-
-    if not content or not content.strip():
-        return
+Write a single conversational message (2-4 sentences) that naturally weaves in these insights.
+Be concise and conversational. Do NOT use bullet points. Write naturally as if you're chatting."""
 
-    # Save to DB
-    message = Message(
-        subgroup_id=subgroup.id,
-        user_id=None,
-        content=content.strip(),
+    return await stream_agent_message(
+        db,
+        session,
+        subgroup,
+        prompt,
         msg_type=MessageType.surrogate,
-    )
-    db.add(message)
-    await db.flush()
-
-    # Broadcast via Redis
-    await publish_to_subgroup(
-        subgroup.id,
-        "chat:new_message",
-        {
-            "id": str(message.id),
-            "subgroup_id": str(message.subgroup_id),
-            "user_id": None,
-            "display_name": "Surrogate Agent",
-            "content": message.content,
-            "msg_type": "surrogate",
-            "source_subgroup_id": None,
-            "created_at": message.created_at.isoformat() if message.created_at else None,
-        },
+        display_name="Surrogate Agent",
+        call_class=CallClass.surrogate,
     )
@@ -1,12 +1,33 @@
+import asyncio
+import logging
 import uuid
+from dataclasses import dataclass
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.engine.crosspollination import CrossPollinationPlan, load_cross_pollination_plan
+from app.engine.dedup import get_session_index
+from app.engine.recent_messages import get_recent_messages
 from app.models.idea import Idea
-from app.models.message import Message
+from app.models.message import Message, MessageType
 from app.models.session import Session
+from app.models.subgroup import Subgroup
+from app.services.embeddings import embed_texts
 from app.services.llm import generate_json
+from app.services.llm_governor import CallClass
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingExtraction:
+    """A subgroup with unseen messages waiting for idea extraction."""
+
+    subgroup: Subgroup
+    messages: list[Message]  # newest first
+    known_ideas: list[str]
 
 
 async def update_taxonomy_for_subgroup(
@@ -14,65 +35,251 @@ async def update_taxonomy_for_subgroup(
     session_id: uuid.UUID,
     subgroup_id: uuid.UUID,
 ) -> list[Idea]:
-    """Extract ideas from recent messages and update the idea taxonomy."""
+    """Extract ideas from one subgroup's unseen messages and update the taxonomy."""
+    results = await update_taxonomy_for_subgroups(db, session_id, [subgroup_id])
+    return results.get(subgroup_id, [])
+
+
+async def update_taxonomy_for_subgroups(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    subgroup_ids: list[uuid.UUID],
+) -> dict[uuid.UUID, list[Idea]]:
+    """Extract ideas from messages not yet analyzed and update the idea taxonomy.
+
+    Each subgroup keeps a high-water mark of the newest message already sent
+    to the LLM, so every cycle only pays for what was said since the last
+    one. Extraction only runs when there is new human input; agent messages
+    are sent along as context but never trigger a call on their own.
+
+    Up to ``TAXONOMY_BATCH_SIZE`` subgroups are packed into a single LLM
+    call and the returned ideas demultiplexed back to their subgroup. If a
+    batched response cannot be parsed, the affected subgroups fall back to
+    one call each. Returns the newly created ideas per subgroup; subgroups
+    whose extraction failed keep their high-water mark and are retried on a
+    later cycle.
+    """
     # Get session topic
     session = await db.get(Session, session_id)
     if not session:
-        return []
+        return {}
 
-    # Get recent messages from this subgroup (last 20)
-    result = await db.execute(
-        select(Message)
-        .where(Message.subgroup_id == subgroup_id)
-        .order_by(Message.created_at.desc())
-        .limit(20)
+    pending = []
+    for subgroup_id in subgroup_ids:
+        subgroup = await db.get(Subgroup, subgroup_id)
+        if not subgroup:
+            continue
+        messages = await _load_unseen_messages(db, subgroup)
+        if messages:
+            known_ideas = await _load_known_ideas(db, session_id, subgroup_id)
+            pending.append(_PendingExtraction(subgroup, messages, known_ideas))
+    if not pending:
+        return {}
+
+    size = max(1, settings.TAXONOMY_BATCH_SIZE)
+    batches = [pending[i:i + size] for i in range(0, len(pending), size)]
+    sem = asyncio.Semaphore(settings.CME_CONCURRENCY)
+
+    async def extract(batch: list[_PendingExtraction]) -> dict[int, list[dict]]:
+        async with sem:
+            try:
+                return await _extract_batch(session, batch)
+            except Exception as e:
+                labels = ", ".join(item.subgroup.label for item in batch)
+                logger.error(f"Taxonomy extraction failed for {labels}: {e}")
+                return {}
+
+    extracted = await asyncio.gather(*[extract(batch) for batch in batches])
+
+    results: dict[uuid.UUID, list[Idea]] = {}
+    for batch, raw_by_position in zip(batches, extracted):
+        for position, item in enumerate(batch):
+            if position not in raw_by_position:
+                continue
+            # Advance the high-water mark past everything just analyzed
+            item.subgroup.taxonomy_watermark_at = item.messages[0].created_at
+            item.subgroup.taxonomy_watermark_id = item.messages[0].id
+            results[item.subgroup.id] = await store_ideas(
+                db, session_id, item.subgroup.id, raw_by_position[position]
+            )
+    return results
+
+
+async def _load_unseen_messages(db: AsyncSession, subgroup: Subgroup) -> list[Message]:
+    """Newest ``TAXONOMY_MAX_MESSAGES`` messages past the high-water mark.
+
+    Returns [] unless at least one of them is from a human.
+    """
+    watermark = None
+    if subgroup.taxonomy_watermark_at is not None:
+        watermark = (subgroup.taxonomy_watermark_at, subgroup.taxonomy_watermark_id)
+    messages = await get_recent_messages(
+        db, subgroup.id, settings.TAXONOMY_MAX_MESSAGES, after=watermark
     )
-    messages = result.scalars().all()
-    if not messages:
+    if not any(m.msg_type == MessageType.human for m in messages):
         return []
+    return messages
 
-    messages_text = "\n".join(
-        f"- {m.content}" for m in reversed(messages)
+
+async def _load_known_ideas(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    subgroup_id: uuid.UUID,
+) -> list[str]:
+    """A few ideas already captured in a subgroup, to keep the LLM from re-reporting them."""
+    result = await db.execute(
+        select(Idea.summary)
+        .where(Idea.session_id == session_id)
+        .where(Idea.subgroup_id == subgroup_id)
+        .order_by(Idea.created_at.desc())
+        .limit(settings.TAXONOMY_CONTEXT_IDEAS)
     )
+    return list(result.scalars().all())
+
+
+def _format_group(item: _PendingExtraction) -> str:
+    known_text = ""
+    if item.known_ideas:
+        known_text = "\nIdeas already captured from this group (do not repeat them):\n" + "\n".join(
+            f"- {summary}" for summary in item.known_ideas
+        ) + "\n"
+    messages_text = "\n".join(f"- {m.content}" for m in reversed(item.messages))
+    return f"""{known_text}
+Messages:
+{messages_text}"""
 
-    # Extract ideas via LLM
-    prompt = f"""Analyze the following discussion messages about the topic: "{session.title}"
+
+def _single_prompt(topic: str, item: _PendingExtraction) -> str:
+    group_text = _format_group(item)
+    return f"""Analyze the following new discussion messages about the topic: "{topic}"
 
 Extract distinct ideas, arguments, or proposals mentioned. For each idea, provide:
 - summary: A concise 1-2 sentence description
 - sentiment: A float from -1.0 (strongly against the topic) to 1.0 (strongly for)
 
 Return a JSON array of objects with "summary" and "sentiment" fields.
-If no clear ideas are present, return an empty array [].
+If no clear new ideas are present, return an empty array [].
+{group_text}
 
-Messages:
-{messages_text}
+Return ONLY valid JSON, no markdown formatting."""
+
+
+def _batch_prompt(topic: str, batch: list[_PendingExtraction]) -> str:
+    groups_text = "\n\n".join(
+        f"=== Group {number} ==={_format_group(item)}"
+        for number, item in enumerate(batch, start=1)
+    )
+    return f"""Analyze the following new messages from {len(batch)} separate discussion groups about the topic: "{topic}"
+
+Treat each group independently. For each group, extract the distinct ideas, arguments,
+or proposals its messages mention. For each idea, provide:
+- summary: A concise 1-2 sentence description
+- sentiment: A float from -1.0 (strongly against the topic) to 1.0 (strongly for)
+
+Return a JSON object of the form:
+{{"groups": [{{"group": <group number>, "ideas": [{{"summary": "...", "sentiment": 0.0}}]}}]}}
+Include every group number from 1 to {len(batch)}, with an empty "ideas" list when a group
+raised no clear new ideas.
+
+{groups_text}
 
 Return ONLY valid JSON, no markdown formatting."""
 
-    raw_ideas = await generate_json(prompt)
 
-    # Batch fetch all existing summaries for dedup (avoids N queries)
-    existing_result = await db.execute(
-        select(Idea.summary).where(Idea.session_id == session_id)
+def _as_idea_list(raw) -> list[dict]:
+    """Normalize an extraction response: a bare array, or an object wrapping one."""
+    if isinstance(raw, dict):
+        raw = raw.get("ideas", [])
+    if not isinstance(raw, list):
+        return []
+    return [item for item in raw if isinstance(item, dict)]
+
+
+def _demux_batch(raw, size: int) -> dict[int, list[dict]] | None:
+    """Map a batched response back to batch positions. None if it is unusable."""
+    if not isinstance(raw, dict) or not isinstance(raw.get("groups"), list):
+        return None
+    demuxed: dict[int, list[dict]] = {}
+    for entry in raw["groups"]:
+        if not isinstance(entry, dict):
+            return None
+        try:
+            position = int(entry.get("group")) - 1
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= position < size or not isinstance(entry.get("ideas", []), list):
+            return None
+        demuxed[position] = _as_idea_list(entry.get("ideas", []))
+    return demuxed
+
+
+async def _extract_batch(session: Session, batch: list[_PendingExtraction]) -> dict[int, list[dict]]:
+    """Run extraction for one batch; returns raw ideas keyed by batch position."""
+    async def extract(prompt: str):
+        return await generate_json(prompt, call_class=CallClass.taxonomy, session_id=session.id)
+
+    if len(batch) == 1:
+        return {0: _as_idea_list(await extract(_single_prompt(session.title, batch[0])))}
+
+    demuxed = _demux_batch(await extract(_batch_prompt(session.title, batch)), len(batch))
+    if demuxed is None:
+        logger.warning("Unparseable batched taxonomy response, falling back to per-subgroup calls")
+        demuxed = {}
+
+    missing = [position for position in range(len(batch)) if position not in demuxed]
+    singles = await asyncio.gather(
+        *[extract(_single_prompt(session.title, batch[position])) for position in missing],
+        return_exceptions=True,
     )
-    existing_summaries = set(existing_result.scalars().all())
+    for position, raw in zip(missing, singles):
+        if isinstance(raw, Exception):
+            logger.error(f"Taxonomy extraction failed for {batch[position].subgroup.label}: {raw}")
+            continue
+        demuxed[position] = _as_idea_list(raw)
+    return demuxed
 
-    new_ideas = []
+
+async def store_ideas(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    subgroup_id: uuid.UUID,
+    raw_ideas: list[dict],
+) -> list[Idea]:
+    """Insert extracted ideas, merging paraphrases of existing ones.
+
+    Each candidate is compared against the session's embedding index; a
+    near-duplicate bumps the matching idea's ``support_count`` instead of
+    adding a new row.
+    """
+    candidates = []
     for idea_data in raw_ideas:
         summary = idea_data.get("summary", "").strip()
-        sentiment = idea_data.get("sentiment", 0.0)
-        if not summary or summary in existing_summaries:
-            continue
+        if summary:
+            candidates.append((summary, float(idea_data.get("sentiment", 0.0))))
+    if not candidates:
+        return []
+
+    index = await get_session_index(db, session_id)
+    vectors = await embed_texts([summary for summary, _ in candidates])
+
+    new_ideas = []
+    for (summary, sentiment), vector in zip(candidates, vectors):
+        match_id, similarity = index.nearest(vector)
+        if match_id is not None and similarity >= settings.IDEA_DEDUP_THRESHOLD:
+            existing = await db.get(Idea, match_id)
+            if existing:
+                existing.support_count = (existing.support_count or 1) + 1
+                continue
 
-        existing_summaries.add(summary)  # prevent duplicates within batch
         idea = Idea(
+            id=uuid.uuid4(),
             session_id=session_id,
             subgroup_id=subgroup_id,
             summary=summary,
-            sentiment=float(sentiment),
+            sentiment=sentiment,
         )
         db.add(idea)
+        index.add(idea.id, vector)  # prevent duplicates within batch
         new_ideas.append(idea)
 
     await db.flush()
@@ -95,70 +302,15 @@ async def get_ideas_not_in_subgroup(
     db: AsyncSession,
     session_id: uuid.UUID,
     subgroup_id: uuid.UUID,
+    plan: CrossPollinationPlan | None = None,
+    exclude: set[uuid.UUID] | None = None,
 ) -> list[Idea]:
     """Get ideas from other subgroups, prioritizing those that challenge local consensus.
 
-    The CME paper specifies that cross-pollinated content should prioritize
-    ideas that CHALLENGE a subgroup's prevailing beliefs, not just any unheard
-    idea. We compute the subgroup's average sentiment and rank foreign ideas
-    by how far they diverge from it.
-    """
-    from sqlalchemy import func as sa_func
-
-    # Compute local subgroup's average sentiment
-    local_avg = await db.scalar(
-        select(sa_func.avg(Idea.sentiment))
-        .where(Idea.session_id == session_id)
-        .where(Idea.subgroup_id == subgroup_id)
-    )
-    local_sentiment: float = float(local_avg) if local_avg is not None else 0.0
-
-    # Fetch foreign ideas
-    result = await db.execute(
-        select(Idea)
-        .where(Idea.session_id == session_id)
-        .where(Idea.subgroup_id != subgroup_id)
-    )
-    foreign_ideas = list(result.scalars().all())
-
-    # Sort by sentiment distance from local consensus (most challenging first)
-    foreign_ideas.sort(key=lambda idea: abs(idea.sentiment - local_sentiment), reverse=True)
-
-    return foreign_ideas[:10]
-
-
-async def compute_convergence(
-    db: AsyncSession,
-    session_id: uuid.UUID,
-) -> float:
-    """Compute convergence score (0.0 = divergent, 1.0 = fully converged).
-
-    Measures how aligned subgroup sentiments are across the session.
-    When all subgroups share similar average sentiment, convergence is high.
+    Reads the ranking from ``plan`` (see ``app.engine.crosspollination``),
+    which the CME builds once per cycle for all subgroups; without one, a
+    plan is loaded for this call. Ideas in ``exclude`` are skipped.
     """
-    from sqlalchemy import func as sa_func
-
-    # Get average sentiment per subgroup
-    result = await db.execute(
-        select(
-            Idea.subgroup_id,
-            sa_func.avg(Idea.sentiment).label("avg_sentiment"),
-        )
-        .where(Idea.session_id == session_id)
-        .group_by(Idea.subgroup_id)
-    )
-    rows = result.all()
-
-    if len(rows) < 2:
-        return 0.0  # Need at least 2 subgroups to measure convergence
-
-    sentiments = [float(row.avg_sentiment) for row in rows]
-
-    # Compute variance of subgroup sentiments
-    mean = sum(sentiments) / len(sentiments)
-    variance = sum((s - mean) ** 2 for s in sentiments) / len(sentiments)
-
-    # Map variance to 0-1 scale. Max possible variance for sentiment in [-1,1] is 1.0.
-    # Score = 1 - sqrt(variance) gives us a 0-1 convergence metric.
-    convergence = max(0.0, 1.0 - variance ** 0.5)
-    return round(convergence, 3)
+    if plan is None:
+        plan = await load_cross_pollination_plan(db, session_id)
+    return plan.challenging(subgroup_id, exclude=exclude)
@@ -11,20 +11,27 @@ from app.database import engine
 from app.models.base import Base
 from app.routers import sessions, users, admin, auth, dashboard, invite_codes, mfa
 from app.websocket.routes import router as ws_router
-from app.engine.cme import start_cme_loop, stop_cme_loop
-from app.services.redis import close_redis, start_redis_subscriber
+from app.engine.cme import resume_subgroup, start_cme_loop, stop_cme_loop
+from app.engine.convergence import convergence_stats
+from app.engine.recent_messages import recent_messages_stats
+from app.services.llm import llm_stats
+from app.services.presence import presence
+from app.services.redis import close_redis, publish_stats, start_redis_subscriber, subscriber
 from app.websocket.manager import manager
+from app.websocket.write_behind import message_writer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 cme_task: asyncio.Task | None = None
 redis_sub_task: asyncio.Task | None = None
+presence_task: asyncio.Task | None = None
+writer_task: asyncio.Task | None = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global cme_task, redis_sub_task
+    global cme_task, redis_sub_task, presence_task, writer_task
     # Startup: create tables and start CME
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -33,22 +40,39 @@ async def lifespan(app: FastAPI):
     cme_task = asyncio.create_task(start_cme_loop())
     logger.info("CME background loop started")
 
+    manager.subscriber = subscriber
     redis_sub_task = asyncio.create_task(
         start_redis_subscriber(
-            on_subgroup_msg=manager.broadcast_to_subgroup,
-            on_session_msg=manager.broadcast_to_session,
+            on_subgroup_msg=manager.send_raw_to_subgroup,
+            on_session_msg=manager.send_raw_to_session,
+            on_user_msg=manager.apply_user_update,
         )
     )
     logger.info("Redis subscriber started")
 
+    manager.presence = presence
+    presence.on_subgroup_online = resume_subgroup
+    presence_task = asyncio.create_task(presence.run())
+
+    writer_task = asyncio.create_task(message_writer.run())
+
     yield
 
     # Shutdown
     stop_cme_loop()
     if cme_task:
         cme_task.cancel()
+        # Let the loop release its shard leases before Redis is closed
+        await asyncio.gather(cme_task, return_exceptions=True)
     if redis_sub_task:
         redis_sub_task.cancel()
+    if presence_task:
+        presence_task.cancel()
+    if writer_task:
+        writer_task.cancel()
+        await asyncio.gather(writer_task, return_exceptions=True)
+    # Persist write-behind chat messages before the engine goes away
+    await message_writer.drain()
     await close_redis()
     await engine.dispose()
     logger.info("Shutdown complete")
@@ -86,3 +110,16 @@ app.include_router(ws_router)
 @app.get("/api/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """Per-worker runtime counters (LLM queues, Redis publish batching, etc.)."""
+    return {
+        "llm": llm_stats(),
+        "recent_messages": recent_messages_stats(),
+        "convergence": convergence_stats(),
+        "redis": {"publish": publish_stats()},
+        "websocket": manager.stats(),
+        "chat_writes": message_writer.stats(),
+    }
@@ -5,5 +5,6 @@ from app.models.subgroup import Subgroup
 from app.models.message import Message
 from app.models.idea import Idea
 from app.models.invite_code import InviteCode
+from app.models.convergence import ConvergencePoint
 
-__all__ = ["Account", "User", "Session", "Subgroup", "Message", "Idea", "InviteCode"]
+__all__ = ["Account", "User", "Session", "Subgroup", "Message", "Idea", "InviteCode", "ConvergencePoint"]
@@ -0,0 +1,26 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Float, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base, UUIDPrimaryKey
+
+
+class ConvergencePoint(Base, UUIDPrimaryKey):
+    """One downsampled sample of a session's convergence trajectory."""
+
+    __tablename__ = "convergence_points"
+    __table_args__ = (
+        # A session's history in time order, optionally from a `since` cursor
+        Index("ix_convergence_points_session_recorded", "session_id", "recorded_at"),
+    )
+
+    session_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("sessions.id")
+    )
+    recorded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    score: Mapped[float] = mapped_column(Float)
+    # subgroup id (str) -> average idea sentiment, for subgroups with ideas
+    sentiments: Mapped[dict] = mapped_column(JSON, default=dict)
@@ -1,6 +1,6 @@
 import uuid
 
-from sqlalchemy import Text, Float, Integer, ForeignKey
+from sqlalchemy import Text, Float, Integer, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -9,6 +9,10 @@ from app.models.base import Base, UUIDPrimaryKey, TimestampMixin
 
 class Idea(Base, UUIDPrimaryKey, TimestampMixin):
     __tablename__ = "ideas"
+    __table_args__ = (
+        # Ideas of a session, optionally narrowed to (or excluding) one subgroup
+        Index("ix_ideas_session_subgroup", "session_id", "subgroup_id"),
+    )
 
     session_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("sessions.id")
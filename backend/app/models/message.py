@@ -1,7 +1,7 @@
 import enum
 import uuid
 
-from sqlalchemy import Text, Enum, ForeignKey
+from sqlalchemy import Text, Enum, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -16,6 +16,12 @@ class MessageType(str, enum.Enum):
 
 class Message(Base, UUIDPrimaryKey, TimestampMixin):
     __tablename__ = "messages"
+    __table_args__ = (
+        # A subgroup's history, newest or oldest first: keyset pagination
+        # (GET /api/users/{id}/messages) and the "last N messages" reads of
+        # taxonomy, surrogate and CME contributor context
+        Index("ix_messages_subgroup_created_id", "subgroup_id", "created_at", "id"),
+    )
 
     subgroup_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("subgroups.id")
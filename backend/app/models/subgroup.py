@@ -1,6 +1,7 @@
 import uuid
+from datetime import datetime
 
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import DateTime, String, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -14,6 +15,14 @@ class Subgroup(Base, UUIDPrimaryKey, TimestampMixin):
         UUID(as_uuid=True), ForeignKey("sessions.id")
     )
     label: Mapped[str] = mapped_column(String(20))
+    # Taxonomy high-water mark: (created_at, id) of the newest message already
+    # sent for idea extraction
+    taxonomy_watermark_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True, default=None
+    )
+    taxonomy_watermark_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), nullable=True, default=None
+    )
 
     session = relationship("Session", back_populates="subgroups")
     members = relationship("User", back_populates="subgroup")
@@ -12,7 +12,7 @@ class User(Base, UUIDPrimaryKey, TimestampMixin):
 
     display_name: Mapped[str] = mapped_column(String(50))
     session_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("sessions.id")
+        UUID(as_uuid=True), ForeignKey("sessions.id"), index=True
     )
     subgroup_id: Mapped[uuid.UUID | None] = mapped_column(
         UUID(as_uuid=True), ForeignKey("subgroups.id"), nullable=True
@@ -1,3 +1,4 @@
+import logging
 import uuid
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -10,8 +11,11 @@ from app.models.session import Session, SessionStatus
 from app.models.subgroup import Subgroup
 from app.models.idea import Idea
 from app.services.llm import generate_text
-from app.engine.taxonomy import compute_convergence
-from app.websocket.manager import manager
+from app.services.llm_governor import CallClass
+from app.engine.convergence import compute_convergence
+from app.services.presence import get_subgroup_online_counts
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -30,6 +34,12 @@ async def get_session_status(session_id: uuid.UUID, db: AsyncSession = Depends(g
     subgroups = result.scalars().all()
 
     convergence = await compute_convergence(db, session_id)
+    try:
+        online = await get_subgroup_online_counts([sg.id for sg in subgroups])
+    except Exception as e:
+        # Presence lives in Redis; without it the counts are unknown (null)
+        logger.error(f"Presence lookup failed for session {session_id}: {e}")
+        online = None
 
     return {
         "session_id": str(session.id),
@@ -45,7 +55,7 @@ async def get_session_status(session_id: uuid.UUID, db: AsyncSession = Depends(g
                     {"id": str(m.id), "display_name": m.display_name}
                     for m in sg.members
                 ],
-                "online_count": manager.get_subgroup_user_count(sg.id),
+                "online_count": online.get(sg.id, 0) if online is not None else None,
             }
             for sg in subgroups
         ],
@@ -53,7 +63,9 @@ async def get_session_status(session_id: uuid.UUID, db: AsyncSession = Depends(g
 
 
 @router.post("/{session_id}/summary")
-async def generate_summary(session_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
+async def generate_summary(
+    session_id: uuid.UUID, fresh: bool = False, db: AsyncSession = Depends(get_db)
+):
     session = await db.get(Session, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -101,7 +113,9 @@ Write a deliberative summary (3-5 paragraphs) structured as follows:
 Write in a clear, professional tone. Use "we" and "our" to reflect the collective voice.
 The summary should read as the group's own deliberative report, not an external analysis."""
 
-    summary = await generate_text(prompt)
+    summary = await generate_text(
+        prompt, call_class=CallClass.summary, session_id=session_id, fresh=fresh
+    )
 
     session.summary = summary
     await db.commit()
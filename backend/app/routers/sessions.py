@@ -1,4 +1,6 @@
+import asyncio
 import uuid
+from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy import select, func
@@ -13,12 +15,22 @@ from app.models.subgroup import Subgroup
 from app.models.user import User
 from app.schemas.session import SessionCreate, SessionOut, SessionDetail, SessionResults
 from app.schemas.subgroup import SubgroupOut
+from app.schemas.convergence import ConvergencePointOut
 from app.schemas.idea import IdeaOut
 from app.schemas.message import MessageOut
 from app.models.idea import Idea
 from app.models.message import Message
+from app.engine.dedup import drop_session_index
 from app.engine.partitioner import create_subgroups_for_session
-from app.engine.taxonomy import compute_convergence
+from app.engine.convergence import (
+    convergence_score,
+    drop_session_series,
+    drop_session_stats,
+    get_convergence_points,
+    get_subgroup_sentiments,
+    record_convergence,
+)
+from app.websocket.handlers import notify_user_changed
 from app.websocket.manager import manager
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
@@ -95,6 +107,9 @@ async def start_session(session_id: uuid.UUID, db: AsyncSession = Depends(get_db
     )
     subgroups = result.scalars().all()
 
+    # Refresh the sender identity cached on any chat socket of a moved user
+    await asyncio.gather(*(notify_user_changed(user) for user in users))
+
     # Notify all connected users about session start
     subgroup_data = []
     for sg in subgroups:
@@ -128,10 +143,15 @@ async def stop_session(session_id: uuid.UUID, db: AsyncSession = Depends(get_db)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    score = await compute_convergence(db, session_id)
+    sentiments = await get_subgroup_sentiments(db, session_id)
+    score = convergence_score(list(sentiments.values()))
     session.final_convergence = score
     session.status = SessionStatus.completed
-    await db.commit()
+    # Ends the trajectory on the final score (commits the session too)
+    await record_convergence(db, session_id, score, sentiments, persist=True)
+    drop_session_index(session_id)
+    drop_session_series(session_id)
+    await drop_session_stats(session_id)
 
     await manager.broadcast_to_session(
         session_id, "session:completed", {"session_id": str(session_id)}
@@ -139,6 +159,25 @@ async def stop_session(session_id: uuid.UUID, db: AsyncSession = Depends(get_db)
     return {"status": "completed"}
 
 
+@router.get("/{session_id}/convergence", response_model=list[ConvergencePointOut])
+async def get_convergence(
+    session_id: uuid.UUID,
+    since: datetime | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Convergence trajectory, oldest first; with ``since``, only later points.
+
+    Pass the last ``recorded_at`` received as ``since`` to fetch just the
+    delta. History is kept at ``CONVERGENCE_HISTORY_INTERVAL_SECONDS``
+    resolution, finer for the latest points when served by the worker
+    running the session's CME.
+    """
+    session = await db.get(Session, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await get_convergence_points(db, session_id, since)
+
+
 @router.get("/{session_id}/subgroups", response_model=list[SubgroupOut])
 async def get_subgroups(session_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
     result = await db.execute(
@@ -185,14 +224,15 @@ async def get_session_results(
 
     # All messages across all subgroups
     subgroup_ids = [sg.id for sg in subgroups]
-    messages: list[Message] = []
+    messages: list[MessageOut] = []
     if subgroup_ids:
         msg_result = await db.execute(
-            select(Message)
+            select(Message, User.display_name)
+            .outerjoin(User, Message.user_id == User.id)
             .where(Message.subgroup_id.in_(subgroup_ids))
-            .order_by(Message.created_at)
+            .order_by(Message.created_at, Message.id)
         )
-        messages = list(msg_result.scalars().all())
+        messages = [MessageOut.from_message(m, name) for m, name in msg_result.all()]
 
     return SessionResults(
         id=session.id,
@@ -203,5 +243,5 @@ async def get_session_results(
         final_convergence=session.final_convergence,
         subgroups=[SubgroupOut.model_validate(sg) for sg in subgroups],
         ideas=[IdeaOut.model_validate(i) for i in ideas],
-        messages=[MessageOut.model_validate(m) for m in messages],
+        messages=messages,
     )
@@ -1,7 +1,8 @@
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import get_optional_account
@@ -17,6 +18,10 @@ from app.websocket.manager import manager
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+# Page size for before/after paging when no limit is given
+MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 500
+
 
 @router.post("", response_model=UserOut)
 async def join_session(
@@ -78,39 +83,60 @@ async def get_user(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{user_id}/messages", response_model=list[MessageOut])
-async def get_user_messages(user_id: uuid.UUID, db: AsyncSession = Depends(get_db)):
-    """Get messages in the user's subgroup."""
+async def get_user_messages(
+    user_id: uuid.UUID,
+    before: uuid.UUID | None = None,
+    after: uuid.UUID | None = None,
+    since: uuid.UUID | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_MESSAGE_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get messages in the user's subgroup, oldest first.
+
+    Messages are keyset-ordered on (created_at, id), and cursors are message
+    ids. ``before`` / ``after`` page backwards / forwards from a cursor,
+    ``limit`` (default 50) at a time; ``since`` returns everything newer than
+    the client's last seen message, for catching up after a reconnect.
+    Without a cursor the full history is returned, or the newest ``limit``
+    messages.
+    """
     user = await db.get(User, user_id)
     if not user or not user.subgroup_id:
         raise HTTPException(status_code=404, detail="User not in a subgroup")
 
-    result = await db.execute(
-        select(Message)
+    cursors = [c for c in (before, after, since) if c is not None]
+    if len(cursors) > 1:
+        raise HTTPException(status_code=400, detail="Use only one of before, after, since")
+
+    key = tuple_(Message.created_at, Message.id)
+    # Author names come from the same query (outer join: agents have no user)
+    query = (
+        select(Message, User.display_name)
+        .outerjoin(User, Message.user_id == User.id)
         .where(Message.subgroup_id == user.subgroup_id)
-        .order_by(Message.created_at.asc())
     )
-    messages = result.scalars().all()
-
-    # Enrich with display names
-    out = []
-    for m in messages:
-        display_name = None
-        if m.user_id:
-            msg_user = await db.get(User, m.user_id)
-            display_name = msg_user.display_name if msg_user else None
-        elif m.msg_type.value == "surrogate":
-            display_name = "Surrogate Agent"
-        elif m.msg_type.value == "contributor":
-            display_name = "Contributor Agent"
-
-        out.append(MessageOut(
-            id=m.id,
-            subgroup_id=m.subgroup_id,
-            user_id=m.user_id,
-            display_name=display_name,
-            content=m.content,
-            msg_type=m.msg_type,
-            source_subgroup_id=m.source_subgroup_id,
-            created_at=m.created_at,
-        ))
-    return out
+    newest_first = before is not None or (not cursors and limit is not None)
+
+    if cursors:
+        cursor_id = cursors[0]
+        cursor_subgroup = await db.scalar(select(Message.subgroup_id).where(Message.id == cursor_id))
+        if cursor_subgroup != user.subgroup_id:
+            raise HTTPException(status_code=400, detail="Unknown message cursor")
+        c = aliased(Message)
+        cursor_key = select(c.created_at, c.id).where(c.id == cursor_id).scalar_subquery()
+        query = query.where(key < cursor_key if before is not None else key > cursor_key)
+        if since is None:
+            limit = limit or MESSAGE_PAGE_SIZE
+
+    if newest_first:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+    else:
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+    if limit is not None:
+        query = query.limit(limit)
+
+    result = await db.execute(query)
+    rows = list(result.all())
+    if newest_first:
+        rows.reverse()
+    return [MessageOut.from_message(m, display_name) for m, display_name in rows]
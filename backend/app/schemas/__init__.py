@@ -3,6 +3,7 @@ from app.schemas.user import UserCreate, UserOut
 from app.schemas.message import MessageOut
 from app.schemas.subgroup import SubgroupOut
 from app.schemas.idea import IdeaOut
+from app.schemas.convergence import ConvergencePointOut
 
 __all__ = [
     "SessionCreate", "SessionOut", "SessionDetail",
@@ -10,4 +11,5 @@ __all__ = [
     "MessageOut",
     "SubgroupOut",
     "IdeaOut",
+    "ConvergencePointOut",
 ]
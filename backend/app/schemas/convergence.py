@@ -0,0 +1,11 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class ConvergencePointOut(BaseModel):
+    recorded_at: datetime
+    convergence: float
+    # subgroup id -> average idea sentiment (subgroups with ideas only)
+    sentiments: dict[uuid.UUID, float] = {}
@@ -1,9 +1,15 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 from pydantic import BaseModel
 
-from app.models.message import MessageType
+from app.models.message import Message, MessageType
+
+# Agent messages have no user; this is the name they are shown under
+AGENT_DISPLAY_NAMES = {
+    MessageType.surrogate: "Surrogate Agent",
+    MessageType.contributor: "Contributor Agent",
+}
 
 
 class MessageOut(BaseModel):
@@ -17,3 +23,25 @@ class MessageOut(BaseModel):
     created_at: datetime
 
     model_config = {"from_attributes": True}
+
+    @classmethod
+    def from_message(cls, message: Message, display_name: str | None = None) -> "MessageOut":
+        """Build the single message shape used by REST history and WebSocket events.
+
+        ``display_name`` is the author's name (load it in bulk with the
+        messages); agent messages fall back to their agent name.
+        """
+        return cls(
+            id=message.id,
+            subgroup_id=message.subgroup_id,
+            user_id=message.user_id,
+            display_name=display_name or AGENT_DISPLAY_NAMES.get(message.msg_type),
+            content=message.content,
+            msg_type=message.msg_type,
+            source_subgroup_id=message.source_subgroup_id,
+            created_at=message.created_at or datetime.now(timezone.utc),
+        )
+
+    def to_event(self) -> dict:
+        """JSON-ready payload for chat:new_message / chat:message_done."""
+        return self.model_dump(mode="json")
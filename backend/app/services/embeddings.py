@@ -0,0 +1,105 @@
+"""Text embeddings for near-duplicate detection.
+
+Supports two embedders via the IDEA_EMBEDDER env var:
+- "hashing" (default): Deterministic feature-hashing of word unigrams and
+  bigrams. CPU-only, no model download, stable across processes.
+- "sentence-transformers": Local sentence-transformers model
+  (IDEA_EMBEDDING_MODEL). Requires the optional `sentence-transformers` package.
+
+Other embedders can be plugged in with ``set_embedder``. Every embedder
+returns an (n, dim) float32 matrix of L2-normalized rows, so cosine
+similarity is a plain dot product.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_embedder = None
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+class HashingEmbedder:
+    """Feature-hashing bag of unigrams and bigrams with signed buckets."""
+
+    blocking = False
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "big") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                matrix[row, bucket] += sign
+        # Sublinear term frequency, then unit length
+        np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+        return _normalize(matrix)
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model, loaded lazily on first use."""
+
+    blocking = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        vectors = self._model.encode(texts, convert_to_numpy=True)
+        return _normalize(vectors.astype(np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        match settings.IDEA_EMBEDDER:
+            case "hashing":
+                _embedder = HashingEmbedder()
+            case "sentence-transformers":
+                _embedder = SentenceTransformerEmbedder(settings.IDEA_EMBEDDING_MODEL)
+            case _:
+                raise ValueError(f"Unknown IDEA_EMBEDDER: {settings.IDEA_EMBEDDER}")
+    return _embedder
+
+
+def set_embedder(embedder):
+    """Install a custom embedder (any object with ``embed(texts) -> ndarray``)."""
+    global _embedder
+    _embedder = embedder
+
+
+async def embed_texts(texts: list[str]) -> np.ndarray:
+    """Embed texts, off the event loop for embedders that do heavy work."""
+    embedder = get_embedder()
+    if not texts:
+        return np.zeros((0, getattr(embedder, "dim", 0)), dtype=np.float32)
+    if getattr(embedder, "blocking", False):
+        return await asyncio.to_thread(embedder.embed, texts)
+    return embedder.embed(texts)
@@ -6,12 +6,21 @@ Supports five provider modes via LLM_PROVIDER env var:
 - "anthropic": Native Anthropic SDK for Claude models.
 - "mistral": Native Mistral SDK.
 - "openai-compatible": OpenAI SDK with custom base_url (DeepSeek, Ollama, vLLM, etc.)
+
+Every call is admitted by the provider's governor (see
+``app.services.llm_governor``), identical requests that are already in
+flight are coalesced into a single provider call, and responses of
+cacheable call classes are reused from ``app.services.llm_cache``.
 """
 
+import asyncio
 import json
 import logging
+from collections.abc import AsyncIterator
 
 from app.config import settings
+from app.services.llm_cache import cache_key, cache_stats, get_cached, record_bypass, store, ttl_for
+from app.services.llm_governor import CallClass, admit_cluster, estimate_tokens, get_governor
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +30,10 @@ _openai_compat_client = None
 _anthropic_client = None
 _mistral_client = None
 
+# request key -> future of the provider call currently serving it
+_inflight: dict[tuple, asyncio.Future] = {}
+_coalesced_count = 0
+
 
 # --- Client singletons ---
 
@@ -76,8 +89,136 @@ def _get_mistral_client():
 # --- Public API ---
 
 
-async def generate_text(prompt: str, system_instruction: str = "") -> str:
-    """Generate free-form text from a prompt."""
+async def generate_text(
+    prompt: str,
+    system_instruction: str = "",
+    *,
+    call_class: CallClass = CallClass.default,
+    session_id=None,
+    fresh: bool = False,
+) -> str:
+    """Generate free-form text from a prompt.
+
+    ``call_class`` sets the request's priority with the governor, how long
+    its response may be served from cache, and ``session_id`` the fairness
+    bucket it queues in. ``fresh`` skips the cache lookup (the new response
+    still replaces the cached one).
+    """
+    return await _generate("text", prompt, system_instruction, call_class, session_id, fresh, _dispatch_text)
+
+
+async def generate_json(
+    prompt: str,
+    system_instruction: str = "",
+    *,
+    call_class: CallClass = CallClass.default,
+    session_id=None,
+    fresh: bool = False,
+) -> list | dict:
+    """Generate structured JSON output from a prompt.
+
+    Uses native JSON mode where supported, falls back to prompt-based parsing.
+    Returns parsed dict or list. Returns [] on failure.
+    """
+    raw = await _generate("json", prompt, system_instruction, call_class, session_id, fresh, _dispatch_json)
+    return _parse_json(raw)
+
+
+async def stream_text(
+    prompt: str,
+    system_instruction: str = "",
+    *,
+    call_class: CallClass = CallClass.default,
+    session_id=None,
+) -> AsyncIterator[str]:
+    """Generate free-form text, yielding chunks as the provider produces them.
+
+    The governor slot is held until the stream is exhausted or closed.
+    Streams are neither cached nor coalesced.
+    """
+    provider = settings.LLM_PROVIDER
+    tokens = estimate_tokens(prompt, system_instruction)
+    await admit_cluster(provider, tokens)
+    async with get_governor(provider).slot(call_class, str(session_id or ""), tokens):
+        async for chunk in _dispatch_stream(prompt, system_instruction):
+            if chunk:
+                yield chunk
+
+
+def llm_stats() -> dict:
+    from app.services.llm_governor import governor_stats
+
+    return {
+        "cache": cache_stats(),
+        "governors": governor_stats(),
+        "in_flight_requests": len(_inflight),
+        "coalesced": _coalesced_count,
+    }
+
+
+# --- Caching, admission and coalescing ---
+
+
+async def _generate(mode, prompt, system_instruction, call_class, session_id, fresh, dispatch) -> str:
+    ttl = ttl_for(call_class)
+    digest = cache_key(mode, system_instruction, prompt)
+    if ttl > 0 and not fresh:
+        cached = await get_cached(digest)
+        if cached is not None:
+            return cached
+    elif fresh:
+        record_bypass()
+
+    async def call():
+        result = await _governed(call_class, session_id, prompt, system_instruction, dispatch)
+        # Never cache a malformed JSON response for the whole TTL
+        if mode != "json" or _is_valid_json(result):
+            await store(digest, result, ttl)
+        return result
+
+    # Fresh requests must not piggyback on a call that started before them
+    key = (digest, fresh)
+    return await _coalesce(key, call)
+
+
+async def _governed(call_class, session_id, prompt, system_instruction, dispatch):
+    provider = settings.LLM_PROVIDER
+    tokens = estimate_tokens(prompt, system_instruction)
+    # Wait for the cluster-wide budget before queueing locally: a call held
+    # until the next minute must not sit on a slot higher priorities need
+    await admit_cluster(provider, tokens)
+    async with get_governor(provider).slot(call_class, str(session_id or ""), tokens):
+        return await dispatch(prompt, system_instruction)
+
+
+async def _coalesce(key: tuple, call):
+    """Share one provider call between identical concurrent requests."""
+    global _coalesced_count
+    pending = _inflight.get(key)
+    if pending is not None:
+        _coalesced_count += 1
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    # Nobody may be waiting on it; don't warn about an unretrieved exception
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight[key] = future
+    try:
+        result = await call()
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(key, None)
+
+
+async def _dispatch_text(prompt: str, system_instruction: str) -> str:
     match settings.LLM_PROVIDER:
         case "gemini":
             return await _generate_text_gemini(prompt, system_instruction)
@@ -93,26 +234,36 @@ async def generate_text(prompt: str, system_instruction: str = "") -> str:
             raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
 
 
-async def generate_json(prompt: str, system_instruction: str = "") -> list | dict:
-    """Generate structured JSON output from a prompt.
+async def _dispatch_json(prompt: str, system_instruction: str) -> str:
+    match settings.LLM_PROVIDER:
+        case "gemini":
+            return await _generate_json_gemini(prompt, system_instruction)
+        case "openai":
+            return await _generate_json_openai(prompt, system_instruction)
+        case "anthropic":
+            return await _generate_text_anthropic(prompt, system_instruction)
+        case "mistral":
+            return await _generate_json_mistral(prompt, system_instruction)
+        case "openai-compatible":
+            return await _generate_json_openai_compat(prompt, system_instruction)
+        case _:
+            raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
 
-    Uses native JSON mode where supported, falls back to prompt-based parsing.
-    Returns parsed dict or list. Returns [] on failure.
-    """
+
+def _dispatch_stream(prompt: str, system_instruction: str) -> AsyncIterator[str]:
     match settings.LLM_PROVIDER:
         case "gemini":
-            raw = await _generate_json_gemini(prompt, system_instruction)
+            return _stream_text_gemini(prompt, system_instruction)
         case "openai":
-            raw = await _generate_json_openai(prompt, system_instruction)
+            return _stream_text_openai(prompt, system_instruction)
         case "anthropic":
-            raw = await _generate_text_anthropic(prompt, system_instruction)
+            return _stream_text_anthropic(prompt, system_instruction)
         case "mistral":
-            raw = await _generate_json_mistral(prompt, system_instruction)
+            return _stream_text_mistral(prompt, system_instruction)
         case "openai-compatible":
-            raw = await _generate_json_openai_compat(prompt, system_instruction)
+            return _stream_text_openai_compat(prompt, system_instruction)
         case _:
             raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
-    return _parse_json(raw)
 
 
 # --- Gemini backend ---
@@ -147,6 +298,20 @@ async def _generate_json_gemini(prompt: str, system_instruction: str = "") -> st
     return response.text or ""
 
 
+async def _stream_text_gemini(prompt: str, system_instruction: str = "") -> AsyncIterator[str]:
+    from google.genai.types import GenerateContentConfig
+
+    client = _get_gemini_client()
+    config = GenerateContentConfig(system_instruction=system_instruction) if system_instruction else None
+    stream = await client.aio.models.generate_content_stream(
+        model=settings.LLM_MODEL,
+        contents=prompt,
+        config=config,
+    )
+    async for chunk in stream:
+        yield chunk.text or ""
+
+
 # --- OpenAI backend ---
 
 
@@ -179,6 +344,28 @@ async def _generate_json_openai(prompt: str, system_instruction: str = "") -> st
     return response.choices[0].message.content or ""
 
 
+async def _stream_text_openai(prompt: str, system_instruction: str = "") -> AsyncIterator[str]:
+    async for chunk in _stream_chat_completions(_get_openai_client(), prompt, system_instruction):
+        yield chunk
+
+
+async def _stream_chat_completions(client, prompt: str, system_instruction: str) -> AsyncIterator[str]:
+    """Stream from any OpenAI-style chat completions endpoint."""
+    messages = []
+    if system_instruction:
+        messages.append({"role": "system", "content": system_instruction})
+    messages.append({"role": "user", "content": prompt})
+
+    stream = await client.chat.completions.create(
+        model=settings.LLM_MODEL,
+        messages=messages,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+
 # --- Anthropic backend ---
 
 
@@ -195,6 +382,20 @@ async def _generate_text_anthropic(prompt: str, system_instruction: str = "") ->
     return response.content[0].text
 
 
+async def _stream_text_anthropic(prompt: str, system_instruction: str = "") -> AsyncIterator[str]:
+    client = _get_anthropic_client()
+    kwargs = {
+        "model": settings.LLM_MODEL,
+        "max_tokens": 4096,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+    if system_instruction:
+        kwargs["system"] = system_instruction
+    async with client.messages.stream(**kwargs) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
 # --- Mistral backend ---
 
 
@@ -227,6 +428,22 @@ async def _generate_json_mistral(prompt: str, system_instruction: str = "") -> s
     return response.choices[0].message.content or ""
 
 
+async def _stream_text_mistral(prompt: str, system_instruction: str = "") -> AsyncIterator[str]:
+    client = _get_mistral_client()
+    messages = []
+    if system_instruction:
+        messages.append({"role": "system", "content": system_instruction})
+    messages.append({"role": "user", "content": prompt})
+
+    stream = await client.chat.stream_async(
+        model=settings.LLM_MODEL,
+        messages=messages,
+    )
+    async for event in stream:
+        if event.data.choices:
+            yield event.data.choices[0].delta.content or ""
+
+
 # --- OpenAI-compatible backend ---
 
 
@@ -263,14 +480,32 @@ async def _generate_json_openai_compat(prompt: str, system_instruction: str = ""
         return await _generate_text_openai_compat(prompt, system_instruction)
 
 
+async def _stream_text_openai_compat(prompt: str, system_instruction: str = "") -> AsyncIterator[str]:
+    async for chunk in _stream_chat_completions(_get_openai_compat_client(), prompt, system_instruction):
+        yield chunk
+
+
 # --- JSON parsing helper ---
 
 
-def _parse_json(raw: str) -> list | dict:
-    """Robustly parse JSON from LLM output, stripping markdown fences."""
+def _strip_fences(raw: str) -> str:
     cleaned = raw.strip()
     if cleaned.startswith("```"):
         cleaned = cleaned.split("\n", 1)[1].rsplit("```", 1)[0].strip()
+    return cleaned
+
+
+def _is_valid_json(raw: str) -> bool:
+    try:
+        json.loads(_strip_fences(raw))
+    except (json.JSONDecodeError, IndexError):
+        return False
+    return True
+
+
+def _parse_json(raw: str) -> list | dict:
+    """Robustly parse JSON from LLM output, stripping markdown fences."""
+    cleaned = _strip_fences(raw)
     try:
         return json.loads(cleaned)
     except json.JSONDecodeError:
@@ -0,0 +1,121 @@
+"""Content-addressed cache for LLM responses.
+
+Responses are keyed by a SHA-256 digest of (mode, provider, model,
+system_instruction, prompt), so a cached answer is only reused for exactly
+the same request against exactly the same model. Two tiers:
+
+- an in-process LRU (LLM_CACHE_MAX_ENTRIES entries, 0 disables it),
+- an optional Redis tier shared by every worker (LLM_CACHE_REDIS).
+
+How long a response may be reused depends on its call class. Deterministic
+derivations of the session state (summaries, taxonomy) are cached for
+LLM_CACHE_TTL_SECONDS; calls whose output is meant to vary from one turn to
+the next (surrogate relays, contributor nudges, bot chatter) are never
+cached.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.services.llm_governor import CallClass
+from app.services.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_KEY_PREFIX = "llm:cache:"
+
+# Call classes whose responses must never be reused
+UNCACHED_CLASSES = {CallClass.surrogate, CallClass.contributor, CallClass.bots}
+
+# digest -> (expires_at, response), least recently used first
+_entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+_counters = {"hits": 0, "redis_hits": 0, "misses": 0, "stores": 0, "bypassed": 0}
+
+
+def cache_key(mode: str, system_instruction: str, prompt: str) -> str:
+    """Digest identifying a request against the configured provider and model."""
+    h = hashlib.sha256()
+    for part in (mode, settings.LLM_PROVIDER, settings.LLM_MODEL, system_instruction, prompt):
+        h.update(part.encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def ttl_for(call_class: CallClass) -> int:
+    """Seconds a response of this call class may be reused (0 = never)."""
+    if call_class in UNCACHED_CLASSES:
+        return 0
+    return settings.LLM_CACHE_TTL_SECONDS
+
+
+async def get_cached(digest: str) -> str | None:
+    """Return a live cached response, checking the local tier before Redis."""
+    entry = _entries.get(digest)
+    if entry is not None:
+        expires_at, value = entry
+        if expires_at > time.monotonic():
+            _entries.move_to_end(digest)
+            _counters["hits"] += 1
+            return value
+        del _entries[digest]
+
+    if settings.LLM_CACHE_REDIS:
+        try:
+            r = await get_redis()
+            key = LLM_CACHE_KEY_PREFIX + digest
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                value, remaining = await pipe.execute()
+        except Exception as e:
+            logger.error(f"LLM cache lookup failed: {e}")
+        else:
+            if value is not None:
+                if remaining and remaining > 0:
+                    _store_local(digest, value, remaining)
+                _counters["redis_hits"] += 1
+                return value
+
+    _counters["misses"] += 1
+    return None
+
+
+async def store(digest: str, value: str, ttl: int):
+    """Cache a response in both tiers for ``ttl`` seconds."""
+    if ttl <= 0 or not value:
+        return
+    _store_local(digest, value, ttl)
+    _counters["stores"] += 1
+
+    if settings.LLM_CACHE_REDIS:
+        try:
+            r = await get_redis()
+            await r.set(LLM_CACHE_KEY_PREFIX + digest, value, ex=ttl)
+        except Exception as e:
+            logger.error(f"LLM cache store failed: {e}")
+
+
+def record_bypass():
+    _counters["bypassed"] += 1
+
+
+def _store_local(digest: str, value: str, ttl: int):
+    if settings.LLM_CACHE_MAX_ENTRIES <= 0:
+        return
+    _entries[digest] = (time.monotonic() + ttl, value)
+    _entries.move_to_end(digest)
+    while len(_entries) > settings.LLM_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+
+def clear_cache():
+    """Drop the local tier (the Redis tier expires on its own)."""
+    _entries.clear()
+
+
+def cache_stats() -> dict:
+    return {"entries": len(_entries), **_counters}
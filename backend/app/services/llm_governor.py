@@ -0,0 +1,252 @@
+"""LLM concurrency and rate governor.
+
+Every provider call made through ``app.services.llm`` first takes a slot from
+the governor of the configured provider. A governor enforces:
+
+- a process-wide cap on in-flight calls (LLM_MAX_CONCURRENCY),
+- token buckets for requests and tokens per minute (LLM_RPM / LLM_TPM,
+  0 = unlimited), optionally shared across workers through Redis
+  (LLM_GOVERNOR_REDIS),
+- strict priority between call classes, so an admin waiting on a summary or
+  a surrogate relay is never stuck behind bot chatter,
+- round-robin between sessions within a call class, so one huge session
+  cannot starve the rest.
+"""
+
+import asyncio
+import enum
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from app.config import settings
+from app.services.redis import get_redis
+
+
+class CallClass(str, enum.Enum):
+    summary = "summary"
+    surrogate = "surrogate"
+    taxonomy = "taxonomy"
+    contributor = "contributor"
+    bots = "bots"
+    default = "default"
+
+
+# Lower value is served first
+CALL_PRIORITY = {
+    CallClass.summary: 0,
+    CallClass.surrogate: 1,
+    CallClass.taxonomy: 2,
+    CallClass.default: 2,
+    CallClass.contributor: 3,
+    CallClass.bots: 4,
+}
+
+# Rough output allowance added to the prompt when budgeting tokens
+_EST_OUTPUT_TOKENS = 512
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Cheap token estimate (~4 characters per token) plus an output allowance."""
+    return sum(len(t) for t in texts) // 4 + _EST_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute of budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (0 if it is available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "call_class", "session_key", "enqueued")
+
+    def __init__(self, future: asyncio.Future, tokens: int, call_class: CallClass, session_key: str):
+        self.future = future
+        self.tokens = tokens
+        self.call_class = call_class
+        self.session_key = session_key
+        self.enqueued = time.monotonic()
+
+
+class LLMGovernor:
+    """Priority- and fairness-aware admission control for one provider."""
+
+    def __init__(self, provider: str, max_concurrency: int, rpm: int = 0, tpm: int = 0):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.in_flight = 0
+        # call class -> session key -> FIFO of waiters (round-robin over sessions)
+        self._queues: dict[CallClass, OrderedDict[str, deque[_Waiter]]] = {
+            call_class: OrderedDict()
+            for call_class in sorted(CallClass, key=CALL_PRIORITY.__getitem__)
+        }
+        self._timer: asyncio.TimerHandle | None = None
+        self.granted: dict[str, int] = {c.value: 0 for c in CallClass}
+        self.wait_seconds: dict[str, float] = {c.value: 0.0 for c in CallClass}
+
+    @asynccontextmanager
+    async def slot(self, call_class: CallClass, session_key: str, tokens: int):
+        """Hold one admission slot for the duration of the block."""
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, call_class, session_key)
+        self._queues[call_class].setdefault(session_key, deque()).append(waiter)
+        self._pump()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _next_waiter(self) -> _Waiter | None:
+        for sessions in self._queues.values():
+            if sessions:
+                return sessions[next(iter(sessions))][0]
+        return None
+
+    def _pop(self, waiter: _Waiter):
+        sessions = self._queues[waiter.call_class]
+        queue = sessions[waiter.session_key]
+        queue.popleft()
+        if queue:
+            sessions.move_to_end(waiter.session_key)
+        else:
+            del sessions[waiter.session_key]
+
+    def _discard(self, waiter: _Waiter):
+        sessions = self._queues[waiter.call_class]
+        queue = sessions.get(waiter.session_key)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del sessions[waiter.session_key]
+        self._pump()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._pump()
+
+    def _pump(self):
+        """Grant slots to queued waiters while concurrency and budget allow."""
+        while self.in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            wait = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(waiter.tokens) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(waiter.tokens)
+            self._pop(waiter)
+            self.in_flight += 1
+            self.granted[waiter.call_class.value] += 1
+            self.wait_seconds[waiter.call_class.value] += time.monotonic() - waiter.enqueued
+            waiter.future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queued": {
+                call_class.value: sum(len(q) for q in sessions.values())
+                for call_class, sessions in self._queues.items()
+            },
+            "granted": dict(self.granted),
+            "wait_seconds": {k: round(v, 3) for k, v in self.wait_seconds.items()},
+        }
+
+
+_governors: dict[str, LLMGovernor] = {}
+
+
+def get_governor(provider: str) -> LLMGovernor:
+    governor = _governors.get(provider)
+    if governor is None:
+        governor = LLMGovernor(
+            provider,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            rpm=settings.LLM_RPM,
+            tpm=settings.LLM_TPM,
+        )
+        _governors[provider] = governor
+    return governor
+
+
+# Admit one call into the current window only if it fits in both budgets;
+# a rejected attempt leaves the counters untouched
+_ADMIT_SCRIPT = """
+local requests = tonumber(redis.call('HGET', KEYS[1], 'requests') or '0')
+local used = tonumber(redis.call('HGET', KEYS[1], 'tokens') or '0')
+local rpm, tpm, tokens = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+if (rpm > 0 and requests + 1 > rpm) or (tpm > 0 and used + tokens > tpm) then
+    return 0
+end
+redis.call('HINCRBY', KEYS[1], 'requests', 1)
+redis.call('HINCRBY', KEYS[1], 'tokens', tokens)
+redis.call('EXPIRE', KEYS[1], 120)
+return 1
+"""
+
+
+async def admit_cluster(provider: str, tokens: int):
+    """Wait until the shared per-minute budget in Redis admits this call.
+
+    Uses a fixed one-minute window per provider, so the RPM/TPM limits hold
+    across every worker and host rather than per process. Callers wait here
+    before taking a local ``slot``, never while holding one.
+    """
+    if not settings.LLM_GOVERNOR_REDIS or not (settings.LLM_RPM or settings.LLM_TPM):
+        return
+    if settings.LLM_TPM:
+        # A call larger than a whole minute's budget takes a full window
+        tokens = min(tokens, settings.LLM_TPM)
+    r = await get_redis()
+    while True:
+        window = int(time.time() // 60)
+        key = f"llm:budget:{provider}:{window}"
+        if await r.eval(_ADMIT_SCRIPT, 1, key, settings.LLM_RPM, settings.LLM_TPM, tokens):
+            return
+        await asyncio.sleep(60 - time.time() % 60)
+
+
+def governor_stats() -> dict:
+    return {provider: governor.stats() for provider, governor in _governors.items()}
@@ -0,0 +1,169 @@
+"""Cluster-wide presence.
+
+Who is online is kept in Redis so every worker gives the same answer. Each
+subgroup and session has a sorted set ``presence:<kind>:<id>`` whose members
+are ``<worker_id>:<user_id>`` scored by when they were last seen. A worker
+adds its member for a user when their first local socket in that
+subgroup/session connects and removes it when the last one closes, and
+re-scores all of its members every PRESENCE_HEARTBEAT_SECONDS; a user with
+sockets on two workers has two members, so one worker's leave never hides
+the other's socket. Entries not refreshed within PRESENCE_TTL_SECONDS (their
+worker died) are pruned whenever a set is read or written, so an online
+count is a ZREMRANGEBYSCORE + ZRANGE per set, all pipelined, counting
+distinct users.
+
+Joins and leaves that bring a user online or offline publish
+``presence:changed`` on the session channel with the new count. When a join brings an empty subgroup
+back to one user, ``on_subgroup_online`` is called so the CME can resume
+work it skipped while nobody was there.
+"""
+import asyncio
+import logging
+import time
+import uuid
+
+from app.config import settings
+from app.services.redis import get_redis, publish_to_session
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_KEY_PREFIX = "presence:"
+
+
+def presence_key(kind: str, key: uuid.UUID) -> str:
+    return f"{PRESENCE_KEY_PREFIX}{kind}:{key}"
+
+
+def _users(members: list[str]) -> set[str]:
+    """Distinct user ids among ``<worker_id>:<user_id>`` members."""
+    return {member.partition(":")[2] for member in members}
+
+
+class PresenceTracker:
+    """This worker's share of presence: the users it holds sockets for."""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        # (kind, key) -> user_id -> number of local sockets
+        self.local: dict[tuple[str, uuid.UUID], dict[uuid.UUID, int]] = {}
+        # (kind, key) -> session the presence:changed events go to
+        self.sessions: dict[tuple[str, uuid.UUID], uuid.UUID | None] = {}
+        self._tasks: set[asyncio.Task] = set()
+        # Awaited with (session_id, subgroup_id) when a subgroup goes from
+        # nobody to somebody online (set at startup; see app.engine.cme)
+        self.on_subgroup_online = None
+
+    async def join(self, kind: str, key: uuid.UUID, user_id: uuid.UUID, session_id: uuid.UUID | None):
+        users = self.local.setdefault((kind, key), {})
+        users[user_id] = users.get(user_id, 0) + 1
+        self.sessions[(kind, key)] = session_id
+        if users[user_id] > 1:
+            return
+        try:
+            await self._update(kind, key, user_id, session_id, online=True)
+        except Exception as e:
+            logger.error(f"Presence join failed for {kind} {key}: {e}")
+
+    def leave(self, kind: str, key: uuid.UUID, user_id: uuid.UUID):
+        users = self.local.get((kind, key))
+        if not users or user_id not in users:
+            return
+        users[user_id] -= 1
+        if users[user_id] > 0:
+            return
+        del users[user_id]
+        session_id = self.sessions.get((kind, key))
+        if not users:
+            del self.local[(kind, key)]
+            self.sessions.pop((kind, key), None)
+
+        task = asyncio.create_task(self._leave(kind, key, user_id, session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _leave(self, kind, key, user_id, session_id):
+        try:
+            await self._update(kind, key, user_id, session_id, online=False)
+        except Exception as e:
+            logger.error(f"Presence leave failed for {kind} {key}: {e}")
+
+    async def _update(self, kind, key, user_id, session_id, online: bool):
+        r = await get_redis()
+        zkey = presence_key(kind, key)
+        now = time.time()
+        member = self._member(user_id)
+        async with r.pipeline(transaction=True) as pipe:
+            if online:
+                pipe.zadd(zkey, {member: now})
+                pipe.expire(zkey, settings.PRESENCE_TTL_SECONDS)
+            else:
+                pipe.zrem(zkey, member)
+            pipe.zremrangebyscore(zkey, "-inf", now - settings.PRESENCE_TTL_SECONDS)
+            pipe.zrange(zkey, 0, -1)
+            results = await pipe.execute()
+        members = results[-1]
+        online_count = len(_users(members))
+        # Only our member changed; it changes the user's presence unless
+        # another worker also holds a socket for them
+        elsewhere = any(
+            m != member and m.partition(":")[2] == str(user_id) for m in members
+        )
+        if not results[0] or elsewhere or session_id is None:
+            return
+        await publish_to_session(
+            session_id,
+            "presence:changed",
+            {
+                "session_id": str(session_id),
+                "subgroup_id": str(key) if kind == "subgroup" else None,
+                "online": online_count,
+            },
+        )
+        if online and kind == "subgroup" and online_count == 1 and self.on_subgroup_online:
+            await self.on_subgroup_online(session_id, key)
+
+    def _member(self, user_id: uuid.UUID) -> str:
+        return f"{self.worker_id}:{user_id}"
+
+    async def heartbeat(self):
+        """Refresh every local user's score so other workers keep counting them."""
+        if not self.local:
+            return
+        r = await get_redis()
+        now = time.time()
+        async with r.pipeline(transaction=False) as pipe:
+            for (kind, key), users in self.local.items():
+                zkey = presence_key(kind, key)
+                pipe.zadd(zkey, {self._member(user_id): now for user_id in users})
+                pipe.expire(zkey, settings.PRESENCE_TTL_SECONDS)
+            await pipe.execute()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_SECONDS)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Presence heartbeat failed: {e}")
+
+
+presence = PresenceTracker()
+
+
+async def get_online_counts(kind: str, keys: list[uuid.UUID]) -> dict[uuid.UUID, int]:
+    """Number of users online in each subgroup/session, across all workers."""
+    if not keys:
+        return {}
+    r = await get_redis()
+    cutoff = time.time() - settings.PRESENCE_TTL_SECONDS
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            zkey = presence_key(kind, key)
+            pipe.zremrangebyscore(zkey, "-inf", cutoff)
+            pipe.zrange(zkey, 0, -1)
+        results = await pipe.execute()
+    return {key: len(_users(members)) for key, members in zip(keys, results[1::2])}
+
+
+async def get_subgroup_online_counts(subgroup_ids: list[uuid.UUID]) -> dict[uuid.UUID, int]:
+    return await get_online_counts("subgroup", subgroup_ids)
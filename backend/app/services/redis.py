@@ -1,10 +1,12 @@
-import json
+import asyncio
+import time
 import uuid
 from typing import Any
 
 import redis.asyncio as aioredis
 
 from app.config import settings
+from app.services.wire import encode_event
 
 _redis: aioredis.Redis | None = None
 
@@ -18,67 +20,321 @@ async def get_redis() -> aioredis.Redis:
 
 async def close_redis():
     global _redis
+    await _batcher.drain()
     if _redis:
         await _redis.close()
         _redis = None
 
 
-class UUIDEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-        return super().default(obj)
+class PublishBatcher:
+    """Coalesces publishes issued within one short window into a single pipeline.
+
+    Callers still await their own publish: the await returns once the batch
+    containing it has been sent (or raises if sending it failed). Batches are
+    flushed one at a time and keep arrival order, so events on any one
+    channel are delivered in the order they were published.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: list[tuple[str, str, asyncio.Future]] = []
+        self._flusher: asyncio.Task | None = None
+        self.batches = 0
+        self.published = 0
+
+    async def publish(self, channel: str, payload: str):
+        future = asyncio.get_running_loop().create_future()
+        # The publisher may be cancelled before the batch is sent
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.append((channel, payload, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        await asyncio.shield(future)
+
+    async def _flush_loop(self):
+        while self._pending:
+            # Let every publisher that is ready this tick join the batch
+            await asyncio.sleep(self.window)
+            batch, self._pending = self._pending, []
+            try:
+                r = await get_redis()
+                async with r.pipeline(transaction=False) as pipe:
+                    for channel, payload, _ in batch:
+                        pipe.publish(channel, payload)
+                    await pipe.execute()
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            except BaseException:
+                # Shutting down: nothing queued will be sent
+                for _, _, future in batch + self._pending:
+                    if not future.done():
+                        future.set_exception(ConnectionError("Redis publisher stopped"))
+                self._pending = []
+                raise
+            else:
+                self.batches += 1
+                self.published += len(batch)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+
+    async def drain(self):
+        """Wait for any queued publishes to be sent."""
+        if self._flusher is not None and not self._flusher.done():
+            await asyncio.gather(self._flusher, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "published": self.published, "queued": len(self._pending)}
+
+
+_batcher = PublishBatcher(settings.REDIS_PUBLISH_WINDOW_MS / 1000)
 
 
 async def publish_to_subgroup(subgroup_id: uuid.UUID, event: str, data: dict[str, Any]):
-    r = await get_redis()
-    payload = json.dumps({"event": event, "data": data}, cls=UUIDEncoder)
-    await r.publish(f"subgroup:{subgroup_id}", payload)
+    await _batcher.publish(f"subgroup:{subgroup_id}", encode_event(event, data))
 
 
 async def publish_to_session(session_id: uuid.UUID, event: str, data: dict[str, Any]):
+    await _batcher.publish(f"session:{session_id}", encode_event(event, data))
+
+
+async def publish_to_user(user_id: uuid.UUID, event: str, data: dict[str, Any]):
+    """Notify the workers holding this user's chat sockets (not forwarded to clients)."""
+    await _batcher.publish(f"user:{user_id}", encode_event(event, data))
+
+
+def publish_stats() -> dict:
+    return _batcher.stats()
+
+
+# --- CME dirty tracking ---
+#
+# A subgroup is "dirty" when something happened that the CME has not yet
+# processed. The sorted set holds the time the subgroup first became dirty
+# (used for the max-staleness bound); the hash holds the time of the most
+# recent human activity (used for debouncing bursts of chat).
+
+CME_DIRTY_KEY = "cme:dirty"
+CME_ACTIVITY_KEY = "cme:dirty:activity"
+
+
+def _dirty_member(session_id: uuid.UUID, subgroup_id: uuid.UUID) -> str:
+    return f"{session_id}:{subgroup_id}"
+
+
+async def mark_subgroup_dirty(
+    session_id: uuid.UUID,
+    subgroup_id: uuid.UUID,
+    activity: bool = True,
+):
+    """Flag a subgroup for the next CME pass.
+
+    ``activity`` records the mark as fresh chat activity, which restarts the
+    subgroup's debounce window. Engine-generated marks pass ``False`` so they
+    are picked up as soon as the scheduler next runs.
+    """
+    r = await get_redis()
+    member = _dirty_member(session_id, subgroup_id)
+    now = time.time()
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.zadd(CME_DIRTY_KEY, {member: now}, nx=True)
+        if activity:
+            pipe.hset(CME_ACTIVITY_KEY, member, now)
+        await pipe.execute()
+
+
+async def get_dirty_subgroups() -> list[tuple[uuid.UUID, uuid.UUID, float, float | None]]:
+    """Return (session_id, subgroup_id, dirty_since, last_activity) for every dirty subgroup."""
+    r = await get_redis()
+    entries = await r.zrange(CME_DIRTY_KEY, 0, -1, withscores=True)
+    if not entries:
+        return []
+    members = [member for member, _ in entries]
+    activity = await r.hmget(CME_ACTIVITY_KEY, members)
+
+    dirty = []
+    for (member, since), last in zip(entries, activity):
+        session_part, subgroup_part = member.split(":", 1)
+        dirty.append((
+            uuid.UUID(session_part),
+            uuid.UUID(subgroup_part),
+            float(since),
+            float(last) if last is not None else None,
+        ))
+    return dirty
+
+
+async def claim_dirty_subgroup(session_id: uuid.UUID, subgroup_id: uuid.UUID) -> bool:
+    """Atomically clear a subgroup's dirty flag. Returns True if this caller cleared it."""
     r = await get_redis()
-    payload = json.dumps({"event": event, "data": data}, cls=UUIDEncoder)
-    await r.publish(f"session:{session_id}", payload)
+    member = _dirty_member(session_id, subgroup_id)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.zrem(CME_DIRTY_KEY, member)
+        pipe.hdel(CME_ACTIVITY_KEY, member)
+        removed, _ = await pipe.execute()
+    return bool(removed)
 
 
-async def enqueue_cme_task(session_id: uuid.UUID, subgroup_id: uuid.UUID):
+# --- CME idle backoff ---
+#
+# Subgroups whose humans have stopped replying to the agents get agent turns
+# at exponentially growing intervals. One hash per session maps subgroup id
+# to "level:until"; it expires on its own once a session goes quiet.
+
+CME_BACKOFF_KEY_PREFIX = "cme:backoff:"
+
+
+async def get_subgroup_backoffs(
+    session_id: uuid.UUID, subgroup_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, tuple[int, float]]:
+    """Return {subgroup_id: (level, until)} for the subgroups that are backed off."""
+    if not subgroup_ids:
+        return {}
+    r = await get_redis()
+    values = await r.hmget(f"{CME_BACKOFF_KEY_PREFIX}{session_id}", [str(i) for i in subgroup_ids])
+    backoffs = {}
+    for subgroup_id, value in zip(subgroup_ids, values):
+        if value:
+            level, until = value.split(":", 1)
+            backoffs[subgroup_id] = (int(level), float(until))
+    return backoffs
+
+
+async def set_subgroup_backoff(session_id: uuid.UUID, subgroup_id: uuid.UUID, level: int, until: float):
+    r = await get_redis()
+    key = f"{CME_BACKOFF_KEY_PREFIX}{session_id}"
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.hset(key, str(subgroup_id), f"{level}:{until}")
+        pipe.expire(key, 2 * settings.CME_IDLE_BACKOFF_MAX_SECONDS)
+        await pipe.execute()
+
+
+async def clear_subgroup_backoff(session_id: uuid.UUID, subgroup_id: uuid.UUID) -> bool:
+    """Drop a subgroup's backoff entry. Returns False if it had none."""
+    r = await get_redis()
+    return bool(await r.hdel(f"{CME_BACKOFF_KEY_PREFIX}{session_id}", str(subgroup_id)))
+
+
+# --- CME delivery ledger ---
+#
+# One set per subgroup of the ideas (hex ids) its surrogate has already
+# relayed, so cross-pollination never repeats itself.
+
+CME_RELAYED_KEY_PREFIX = "cme:relayed:"
+# A subgroup's ledger outlives any session that is still being deliberated
+CME_RELAYED_TTL_SECONDS = 7 * 24 * 3600
+
+
+async def get_relayed_ideas(subgroup_id: uuid.UUID) -> set[uuid.UUID]:
+    r = await get_redis()
+    members = await r.smembers(f"{CME_RELAYED_KEY_PREFIX}{subgroup_id}")
+    return {uuid.UUID(hex=m) for m in members}
+
+
+async def add_relayed_ideas(subgroup_id: uuid.UUID, idea_ids: list[uuid.UUID]):
+    if not idea_ids:
+        return
     r = await get_redis()
-    await r.lpush(
-        "cme:queue",
-        json.dumps({"session_id": str(session_id), "subgroup_id": str(subgroup_id)}),
-    )
+    key = f"{CME_RELAYED_KEY_PREFIX}{subgroup_id}"
+    async with r.pipeline(transaction=False) as pipe:
+        pipe.sadd(key, *[i.hex for i in idea_ids])
+        pipe.expire(key, CME_RELAYED_TTL_SECONDS)
+        await pipe.execute()
+
+
+class RedisSubscriber:
+    """Per-worker Redis subscription limited to the channels local sockets need.
+
+    The ConnectionManager calls ``add`` when a channel (``subgroup:<id>``,
+    ``session:<id>``, or ``user:<id>`` for a user with a chat socket) gains
+    a local socket and ``discard`` when it loses the last one, so a worker
+    only receives and decodes traffic for the subgroups, sessions and users
+    it actually serves.
+    """
+
+    def __init__(self):
+        self.wanted: set[str] = set()
+        self.subscribed: set[str] = set()
+        self._pubsub = None
+        self._lock = asyncio.Lock()
+        self._connected = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def add(self, channel: str):
+        """Ensure this worker receives ``channel``; returns once subscribed."""
+        self.wanted.add(channel)
+        await self._sync()
 
+    def discard(self, channel: str):
+        """Stop receiving ``channel`` (the unsubscribe happens in the background)."""
+        self.wanted.discard(channel)
+        task = asyncio.create_task(self._sync())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
-async def start_redis_subscriber(on_subgroup_msg, on_session_msg):
-    """Subscribe to subgroup:* and session:* channels, call handlers on messages.
+    async def _sync(self):
+        if self._pubsub is None:
+            # Not running yet; run() subscribes to everything wanted on start
+            return
+        async with self._lock:
+            to_add = sorted(self.wanted - self.subscribed)
+            to_remove = sorted(self.subscribed - self.wanted)
+            if to_add:
+                await self._pubsub.subscribe(*to_add)
+                self.subscribed.update(to_add)
+                self._connected.set()
+            if to_remove:
+                await self._pubsub.unsubscribe(*to_remove)
+                self.subscribed.difference_update(to_remove)
+
+    async def run(self, on_subgroup_msg, on_session_msg, on_user_msg=None):
+        """Forward each received payload to ``on_*_msg(target_id, payload)``."""
+        import logging
+
+        logger = logging.getLogger(__name__)
+        r = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        self._pubsub = r.pubsub()
+        self.subscribed.clear()
+        self._connected.clear()
+        logger.info("Redis subscriber started")
+        try:
+            await self._sync()
+            # get_message needs a connection, which the first subscribe opens
+            await self._connected.wait()
+            while True:
+                raw_msg = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if raw_msg is None or raw_msg["type"] != "message":
+                    continue
+                # Payloads are already in wire format; forward them undecoded
+                kind, _, target = raw_msg["channel"].partition(":")
+                try:
+                    if kind == "subgroup":
+                        await on_subgroup_msg(uuid.UUID(target), raw_msg["data"])
+                    elif kind == "session":
+                        await on_session_msg(uuid.UUID(target), raw_msg["data"])
+                    elif kind == "user" and on_user_msg is not None:
+                        await on_user_msg(uuid.UUID(target), raw_msg["data"])
+                except Exception as e:
+                    logger.error(f"Redis subscriber handler error: {e}")
+        finally:
+            pubsub, self._pubsub = self._pubsub, None
+            self.subscribed.clear()
+            await pubsub.aclose()
+            await r.close()
+
+
+subscriber = RedisSubscriber()
+
+
+async def start_redis_subscriber(on_subgroup_msg, on_session_msg, on_user_msg=None):
+    """Receive messages for the channels local sockets are joined to.
 
     Runs as a long-lived background task. Each Gunicorn worker starts one
-    subscriber so that Redis-published messages are delivered to the local
-    WebSocket connections managed by that worker.
+    subscriber; the ConnectionManager adds and removes channels as sockets
+    come and go, so Redis only delivers messages this worker will forward.
     """
-    import logging
-
-    logger = logging.getLogger(__name__)
-    r = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
-    pubsub = r.pubsub()
-    await pubsub.psubscribe("subgroup:*", "session:*")
-    logger.info("Redis subscriber started (subgroup:*, session:*)")
-    try:
-        async for raw_msg in pubsub.listen():
-            if raw_msg["type"] != "pmessage":
-                continue
-            channel = raw_msg["channel"]
-            payload = json.loads(raw_msg["data"])
-            try:
-                if channel.startswith("subgroup:"):
-                    sg_id = uuid.UUID(channel.split(":", 1)[1])
-                    await on_subgroup_msg(sg_id, payload["event"], payload["data"])
-                elif channel.startswith("session:"):
-                    sess_id = uuid.UUID(channel.split(":", 1)[1])
-                    await on_session_msg(sess_id, payload["event"], payload["data"])
-            except Exception as e:
-                logger.error(f"Redis subscriber handler error: {e}")
-    finally:
-        await pubsub.punsubscribe("subgroup:*", "session:*")
-        await r.close()
+    await subscriber.run(on_subgroup_msg, on_session_msg, on_user_msg)
@@ -0,0 +1,32 @@
+"""WebSocket wire format.
+
+Every event travels as ``{"event": ..., "data": ...}`` JSON text. It is
+encoded exactly once, where it is published; Redis subscribers and the
+ConnectionManager forward that text to sockets untouched.
+
+Uses orjson when it is installed (optional, several times faster), and the
+standard library otherwise. Both render UUIDs as strings and fall back to
+``str()`` for other unknown types.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def encode_event(event: str, data: Any) -> str:
+    """Encode an event envelope as wire-format JSON text."""
+    envelope = {"event": event, "data": data}
+    if orjson is not None:
+        return orjson.dumps(envelope, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(envelope, default=str)
+
+
+def decode_event(message: str | bytes) -> tuple[str, Any]:
+    """Split wire-format JSON back into ``(event, data)``."""
+    envelope = orjson.loads(message) if orjson is not None else json.loads(message)
+    return envelope["event"], envelope["data"]
@@ -1,55 +1,79 @@
-import json
 import logging
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-
+from app.config import settings
+from app.database import async_session
+from app.engine.recent_messages import record_message
 from app.models.message import Message, MessageType
 from app.models.user import User
-from app.services.redis import publish_to_subgroup
+from app.schemas.message import MessageOut
+from app.websocket.manager import ChatContext
+from app.websocket.write_behind import message_row, message_writer
+from app.services.redis import publish_to_subgroup, publish_to_user, mark_subgroup_dirty
 
 logger = logging.getLogger(__name__)
 
 
-async def handle_chat_message(
-    db: AsyncSession,
-    user_id: uuid.UUID,
-    subgroup_id: uuid.UUID,
-    data: dict,
-):
-    """Handle an incoming chat message from a user."""
+async def resolve_chat_context(
+    user_id: uuid.UUID, subgroup_id: uuid.UUID
+) -> ChatContext | None:
+    """Load the sender identity for a new chat socket.
+
+    Returns None unless the user exists and belongs to ``subgroup_id``.
+    """
+    async with async_session() as db:
+        user = await db.get(User, user_id)
+    if user is None or user.subgroup_id != subgroup_id:
+        return None
+    return ChatContext(user.id, user.session_id, subgroup_id, user.display_name)
+
+
+async def notify_user_changed(user: User):
+    """Tell the workers holding the user's chat sockets about a rename or reassignment.
+
+    Call after the change is committed.
+    """
+    await publish_to_user(
+        user.id,
+        "user:updated",
+        {"display_name": user.display_name, "subgroup_id": user.subgroup_id},
+    )
+
+
+async def handle_chat_message(context: ChatContext, data: dict):
+    """Handle an incoming chat message on a connected chat socket.
+
+    The sender comes from the socket's ``context``, so the only database
+    work is the message insert. In ``strict`` persistence mode the message
+    is committed before it is published; in ``fast`` mode it is published
+    first and persisted by the write-behind ``message_writer``.
+    """
     content = data.get("content", "").strip()
     if not content:
         return
 
-    # Get user display name
-    user = await db.get(User, user_id)
-    if not user:
-        return
-
-    # Save message to DB
     message = Message(
-        subgroup_id=subgroup_id,
-        user_id=user_id,
+        subgroup_id=context.subgroup_id,
+        user_id=context.user_id,
         content=content,
         msg_type=MessageType.human,
     )
-    db.add(message)
-    await db.commit()
-    await db.refresh(message)
+    if settings.CHAT_PERSISTENCE == "fast":
+        # Id and timestamp assigned here; the row is inserted write-behind
+        message.id = uuid.uuid4()
+        message.source_subgroup_id = None
+        message.created_at = datetime.now(timezone.utc)
+        await message_writer.enqueue(message_row(message))
+    else:
+        # Save message to DB
+        async with async_session() as db:
+            db.add(message)
+            await db.commit()
+            await db.refresh(message)
+    await record_message(message)
 
     # Broadcast to subgroup
-    msg_data = {
-        "id": str(message.id),
-        "subgroup_id": str(subgroup_id),
-        "user_id": str(user_id),
-        "display_name": user.display_name,
-        "content": content,
-        "msg_type": "human",
-        "source_subgroup_id": None,
-        "created_at": message.created_at.isoformat() if message.created_at else datetime.now(timezone.utc).isoformat(),
-    }
-
-    await publish_to_subgroup(subgroup_id, "chat:new_message", msg_data)
+    msg_data = MessageOut.from_message(message, context.display_name).to_event()
+    await publish_to_subgroup(context.subgroup_id, "chat:new_message", msg_data)
+    await mark_subgroup_dirty(context.session_id, context.subgroup_id)
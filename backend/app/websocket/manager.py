@@ -1,85 +1,306 @@
 import asyncio
-import json
 import logging
 import uuid
-from collections import defaultdict
 
 from fastapi import WebSocket
 
+from app.config import settings
+from app.services.wire import decode_event, encode_event
+
 logger = logging.getLogger(__name__)
 
+# Sent in place of the backlog when a slow client overflows under the "resync" policy
+RESYNC_MESSAGE = encode_event("sync:resync", {})
+
+
+class ChatContext:
+    """Sender identity of a chat socket, resolved once when it connects.
+
+    Kept current by ``ConnectionManager.apply_user_update`` when the user is
+    renamed; a reassignment to another subgroup closes the socket instead.
+    """
+
+    __slots__ = ("user_id", "session_id", "subgroup_id", "display_name")
+
+    def __init__(
+        self,
+        user_id: uuid.UUID,
+        session_id: uuid.UUID,
+        subgroup_id: uuid.UUID,
+        display_name: str,
+    ):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.subgroup_id = subgroup_id
+        self.display_name = display_name
+
+
+class _Connection:
+    """One accepted socket: where it is registered, plus its outbound queue and writer."""
+
+    __slots__ = ("user_id", "kind", "key", "queue", "writer", "context")
+
+    def __init__(self, user_id: uuid.UUID, kind: str, key: uuid.UUID, maxsize: int):
+        self.user_id = user_id
+        self.kind = kind  # "subgroup" | "session"
+        self.key = key
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self.writer: asyncio.Task | None = None
+        self.context: ChatContext | None = None
+
+    def clear(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
 
 class ConnectionManager:
-    """Manages WebSocket connections grouped by subgroup and session."""
+    """Manages WebSocket connections grouped by subgroup and session.
+
+    Every socket is registered once under its (user_id, websocket) pair and
+    indexed by subgroup or session and by user, so connects and disconnects
+    are O(1) and a user may hold several sockets at once (chat and session,
+    or several tabs). Buckets are removed as soon as they empty. Joins and
+    leaves are reported to the cluster-wide presence tracker.
+
+    Broadcasts never await a socket: each message is put on every target
+    connection's bounded outbox and written by that connection's writer task,
+    so one slow client cannot hold up the rest. A client whose outbox is full
+    is handled per WS_OVERFLOW_POLICY: "resync" discards its backlog and asks
+    it to refetch state, "drop" disconnects it.
+
+    Chat sockets carry a ``ChatContext``. While a user holds one, this worker
+    subscribes to ``user:<id>`` so renames and reassignments published from
+    any worker reach it.
+    """
 
     def __init__(self):
         # subgroup_id -> set of (user_id, websocket)
-        self.subgroup_connections: dict[uuid.UUID, set[tuple[uuid.UUID, WebSocket]]] = defaultdict(set)
+        self.subgroup_connections: dict[uuid.UUID, set[tuple[uuid.UUID, WebSocket]]] = {}
         # session_id -> set of (user_id, websocket) for visualizer/admin
-        self.session_connections: dict[uuid.UUID, set[tuple[uuid.UUID, WebSocket]]] = defaultdict(set)
-        # user_id -> websocket for direct messaging
-        self.user_connections: dict[uuid.UUID, WebSocket] = {}
+        self.session_connections: dict[uuid.UUID, set[tuple[uuid.UUID, WebSocket]]] = {}
+        # user_id -> that user's sockets, for direct messaging
+        self.user_connections: dict[uuid.UUID, set[WebSocket]] = {}
+        # websocket -> its registration and outbox
+        self.connections: dict[WebSocket, _Connection] = {}
+        # Redis subscriber to keep in step with the channels we hold sockets for
+        # (set at startup; None means no subscription management, e.g. in tests)
+        self.subscriber = None
+        # Cluster-wide presence tracker told about every join and leave (also set at startup)
+        self.presence = None
+        self.dropped = 0
+        self.resyncs = 0
 
     async def connect_to_subgroup(
-        self, websocket: WebSocket, user_id: uuid.UUID, subgroup_id: uuid.UUID
+        self,
+        websocket: WebSocket,
+        user_id: uuid.UUID,
+        subgroup_id: uuid.UUID,
+        session_id: uuid.UUID | None = None,
+        context: ChatContext | None = None,
     ):
         await websocket.accept()
-        self.subgroup_connections[subgroup_id].add((user_id, websocket))
-        self.user_connections[user_id] = websocket
+        self._register(websocket, user_id, "subgroup", subgroup_id)
+        try:
+            await self._subscribe(f"subgroup:{subgroup_id}")
+            if context is not None:
+                self.connections[websocket].context = context
+                await self._subscribe(f"user:{user_id}")
+            if self.presence is not None:
+                await self.presence.join("subgroup", subgroup_id, user_id, session_id)
+        except BaseException:
+            # Don't leak the registration (and its writer) of a socket that never got going
+            self._unregister(websocket)
+            raise
 
     async def connect_to_session(
         self, websocket: WebSocket, user_id: uuid.UUID, session_id: uuid.UUID
     ):
         await websocket.accept()
-        self.session_connections[session_id].add((user_id, websocket))
-        self.user_connections[user_id] = websocket
-
-    def disconnect(self, user_id: uuid.UUID, subgroup_id: uuid.UUID | None = None, session_id: uuid.UUID | None = None):
-        self.user_connections.pop(user_id, None)
-        if subgroup_id:
-            self.subgroup_connections[subgroup_id] = {
-                (uid, ws) for uid, ws in self.subgroup_connections[subgroup_id]
-                if uid != user_id
-            }
-        if session_id:
-            self.session_connections[session_id] = {
-                (uid, ws) for uid, ws in self.session_connections[session_id]
-                if uid != user_id
-            }
+        self._register(websocket, user_id, "session", session_id)
+        try:
+            await self._subscribe(f"session:{session_id}")
+            if self.presence is not None:
+                await self.presence.join("session", session_id, user_id, session_id)
+        except BaseException:
+            self._unregister(websocket)
+            raise
 
-    async def broadcast_to_subgroup(self, subgroup_id: uuid.UUID, event: str, data: dict):
-        message = json.dumps({"event": event, "data": data}, default=str)
-        dead = []
-        for user_id, ws in self.subgroup_connections.get(subgroup_id, set()):
+    def disconnect(
+        self,
+        user_id: uuid.UUID,
+        subgroup_id: uuid.UUID | None = None,
+        session_id: uuid.UUID | None = None,
+        websocket: WebSocket | None = None,
+    ):
+        """Remove a socket, or all of the user's sockets in the given subgroup/session."""
+        if websocket is not None:
+            self._unregister(websocket)
+            return
+        for ws in list(self.user_connections.get(user_id, ())):
+            conn = self.connections[ws]
+            if (conn.kind, conn.key) in (("subgroup", subgroup_id), ("session", session_id)):
+                self._unregister(ws)
+
+    def _buckets(self, kind: str) -> dict[uuid.UUID, set[tuple[uuid.UUID, WebSocket]]]:
+        return self.subgroup_connections if kind == "subgroup" else self.session_connections
+
+    def _register(self, websocket: WebSocket, user_id: uuid.UUID, kind: str, key: uuid.UUID):
+        conn = _Connection(user_id, kind, key, settings.WS_SEND_QUEUE_SIZE)
+        conn.writer = asyncio.create_task(self._write(websocket, conn))
+        self.connections[websocket] = conn
+        self._buckets(kind).setdefault(key, set()).add((user_id, websocket))
+        self.user_connections.setdefault(user_id, set()).add(websocket)
+
+    def _unregister(self, websocket: WebSocket):
+        """Forget a socket everywhere and stop its writer."""
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
+            return
+
+        buckets = self._buckets(conn.kind)
+        members = buckets.get(conn.key)
+        if members is not None:
+            members.discard((conn.user_id, websocket))
+            if not members:
+                del buckets[conn.key]
+                if self.subscriber is not None:
+                    self.subscriber.discard(f"{conn.kind}:{conn.key}")
+
+        sockets = self.user_connections.get(conn.user_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.user_connections[conn.user_id]
+        if conn.context is not None and self.subscriber is not None and not any(
+            self.connections[ws].context is not None for ws in sockets or ()
+        ):
+            self.subscriber.discard(f"user:{conn.user_id}")
+
+        if self.presence is not None:
+            self.presence.leave(conn.kind, conn.key, conn.user_id)
+
+        conn.clear()
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    async def _write(self, websocket: WebSocket, conn: _Connection):
+        while True:
+            message = await conn.queue.get()
             try:
-                await ws.send_text(message)
+                await websocket.send_text(message)
             except Exception:
-                dead.append((user_id, ws))
-        for item in dead:
-            self.subgroup_connections[subgroup_id].discard(item)
+                self._unregister(websocket)
+                return
+            finally:
+                conn.queue.task_done()
+
+    def _enqueue(self, websocket: WebSocket, message: str):
+        conn = self.connections.get(websocket)
+        if conn is None:
+            return
+        try:
+            conn.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if settings.WS_OVERFLOW_POLICY == "drop":
+            self.dropped += 1
+            logger.warning(f"Dropping WebSocket client {conn.user_id} with a full send queue")
+            self._unregister(websocket)
+            asyncio.create_task(self._close_quietly(websocket))
+        else:
+            self.resyncs += 1
+            conn.clear()
+            conn.queue.put_nowait(RESYNC_MESSAGE)
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int = 1013):
+        try:
+            await websocket.close(code=code)  # default: try again later
+        except Exception:
+            pass
+
+    def chat_context(self, websocket: WebSocket) -> ChatContext | None:
+        """The sender identity of a connected chat socket, if it still has one."""
+        conn = self.connections.get(websocket)
+        return conn.context if conn is not None else None
+
+    def update_user(self, user_id: uuid.UUID, display_name: str, subgroup_id: uuid.UUID | None):
+        """Apply a rename or reassignment to the user's chat sockets on this worker.
+
+        Sockets of the user's current subgroup get the new display name;
+        sockets of any other subgroup are closed (policy violation), since
+        the user may no longer post there.
+        """
+        for ws in list(self.user_connections.get(user_id, ())):
+            conn = self.connections[ws]
+            if conn.context is None:
+                continue
+            if conn.key == subgroup_id:
+                conn.context.display_name = display_name
+            else:
+                self._unregister(ws)
+                asyncio.create_task(self._close_quietly(ws, code=1008))
+
+    async def apply_user_update(self, user_id: uuid.UUID, message: str):
+        """Redis ``user:<id>`` handler: decode a ``user:updated`` event and apply it."""
+        event, data = decode_event(message)
+        if event != "user:updated":
+            return
+        subgroup_id = data.get("subgroup_id")
+        self.update_user(
+            user_id, data["display_name"], uuid.UUID(subgroup_id) if subgroup_id else None
+        )
+
+    async def _subscribe(self, channel: str):
+        if self.subscriber is not None:
+            await self.subscriber.add(channel)
+
+    async def broadcast_to_subgroup(self, subgroup_id: uuid.UUID, event: str, data: dict):
+        await self.send_raw_to_subgroup(subgroup_id, encode_event(event, data))
 
     async def broadcast_to_session(self, session_id: uuid.UUID, event: str, data: dict):
-        message = json.dumps({"event": event, "data": data}, default=str)
-        dead = []
-        for user_id, ws in self.session_connections.get(session_id, set()):
-            try:
-                await ws.send_text(message)
-            except Exception:
-                dead.append((user_id, ws))
-        for item in dead:
-            self.session_connections[session_id].discard(item)
+        await self.send_raw_to_session(session_id, encode_event(event, data))
+
+    async def send_raw_to_subgroup(self, subgroup_id: uuid.UUID, message: str):
+        """Forward an already-encoded wire message to every socket in a subgroup."""
+        for _, ws in list(self.subgroup_connections.get(subgroup_id, ())):
+            self._enqueue(ws, message)
+
+    async def send_raw_to_session(self, session_id: uuid.UUID, message: str):
+        """Forward an already-encoded wire message to every socket in a session."""
+        for _, ws in list(self.session_connections.get(session_id, ())):
+            self._enqueue(ws, message)
 
     async def send_to_user(self, user_id: uuid.UUID, event: str, data: dict):
-        ws = self.user_connections.get(user_id)
-        if ws:
-            try:
-                message = json.dumps({"event": event, "data": data}, default=str)
-                await ws.send_text(message)
-            except Exception:
-                self.user_connections.pop(user_id, None)
+        sockets = self.user_connections.get(user_id)
+        if sockets:
+            message = encode_event(event, data)
+            for ws in list(sockets):
+                self._enqueue(ws, message)
+
+    async def flush(self):
+        """Wait until every queued message has been written (or its socket dropped)."""
+        await asyncio.gather(*(conn.queue.join() for conn in list(self.connections.values())))
+
+    def stats(self) -> dict:
+        depths = [conn.queue.qsize() for conn in self.connections.values()]
+        return {
+            "connections": len(self.connections),
+            "users": len(self.user_connections),
+            "subgroups": len(self.subgroup_connections),
+            "sessions": len(self.session_connections),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+        }
 
     def get_subgroup_user_count(self, subgroup_id: uuid.UUID) -> int:
-        return len(self.subgroup_connections.get(subgroup_id, set()))
+        """Users connected to this subgroup on this worker only (see app.services.presence)."""
+        return len({uid for uid, _ in self.subgroup_connections.get(subgroup_id, ())})
 
 
 manager = ConnectionManager()
@@ -2,12 +2,10 @@ import json
 import logging
 import uuid
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from app.database import get_db, async_session
 from app.websocket.manager import manager
-from app.websocket.handlers import handle_chat_message
+from app.websocket.handlers import handle_chat_message, resolve_chat_context
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -22,7 +20,15 @@ async def websocket_chat(
     uid = uuid.UUID(user_id)
     sgid = uuid.UUID(subgroup_id)
 
-    await manager.connect_to_subgroup(websocket, uid, sgid)
+    # Sender identity and membership are checked once, here; chat frames
+    # then reuse the connection's context
+    context = await resolve_chat_context(uid, sgid)
+    if context is None:
+        await websocket.close(code=1008)
+        logger.info(f"Rejected chat socket: user {uid} is not in subgroup {sgid}")
+        return
+
+    await manager.connect_to_subgroup(websocket, uid, sgid, context.session_id, context)
     logger.info(f"User {uid} connected to subgroup {sgid}")
 
     try:
@@ -32,14 +38,16 @@ async def websocket_chat(
             event = data.get("event", "")
 
             if event == "chat:message":
-                async with async_session() as db:
-                    await handle_chat_message(db, uid, sgid, data.get("data", {}))
+                context = manager.chat_context(websocket)
+                if context is None:
+                    break  # closed by a reassignment
+                await handle_chat_message(context, data.get("data", {}))
     except WebSocketDisconnect:
-        manager.disconnect(uid, subgroup_id=sgid)
+        manager.disconnect(uid, subgroup_id=sgid, websocket=websocket)
         logger.info(f"User {uid} disconnected from subgroup {sgid}")
     except Exception as e:
         logger.error(f"WebSocket error for user {uid}: {e}")
-        manager.disconnect(uid, subgroup_id=sgid)
+        manager.disconnect(uid, subgroup_id=sgid, websocket=websocket)
 
 
 @router.websocket("/ws/session/{user_id}/{session_id}")
@@ -59,8 +67,8 @@ async def websocket_session(
         while True:
             await websocket.receive_text()  # Keep alive
     except WebSocketDisconnect:
-        manager.disconnect(uid, session_id=sid)
+        manager.disconnect(uid, session_id=sid, websocket=websocket)
         logger.info(f"User {uid} disconnected from session {sid}")
     except Exception as e:
         logger.error(f"Session WS error for user {uid}: {e}")
-        manager.disconnect(uid, session_id=sid)
+        manager.disconnect(uid, session_id=sid, websocket=websocket)
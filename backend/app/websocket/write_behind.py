@@ -0,0 +1,179 @@
+"""Write-behind persistence for human chat messages.
+
+In ``CHAT_PERSISTENCE=fast`` mode ``handle_chat_message`` assigns the
+message id and timestamp itself, publishes straight away and hands the row
+to the ``MessageWriter``, which bulk-inserts pending rows in micro-batches:
+every ``CHAT_WRITE_BEHIND_MS`` or as soon as ``CHAT_WRITE_BATCH_SIZE`` rows
+are waiting. Guarantees:
+
+- bounded loss window: a row is normally in the database within one
+  window of being published; only rows still pending when the process is
+  killed outright are lost,
+- retry: a batch that failed on a database outage goes back to the front
+  of the queue and is retried with exponential backoff, never dropped
+  while the process lives,
+- idempotence: rows are inserted with ON CONFLICT DO NOTHING, so retrying
+  a batch whose commit went through (e.g. cancelled while committing) is
+  harmless,
+- no poison batches: a batch the database rejects outright (integrity or
+  data errors) is retried row by row, and only the rows rejected on their
+  own are dropped (and counted as lost),
+- bounded memory: once ``CHAT_WRITE_MAX_PENDING`` rows are waiting,
+  ``enqueue`` blocks until the flusher catches up, so senders slow down
+  instead of piling up unpersisted messages,
+- shutdown: ``drain`` flushes everything still pending before the database
+  engine is disposed.
+
+``strict`` mode (the default) keeps the insert and commit in the request
+path.
+"""
+import asyncio
+import logging
+from collections import deque
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Longest pause between retries of a failing batch
+_MAX_RETRY_DELAY = 5.0
+# Consecutive failed attempts while draining at shutdown (no one will retry later)
+_DRAIN_ATTEMPTS = 3
+# The database rejects these no matter how often a row is retried
+_REJECTED = (IntegrityError, DataError)
+
+
+def message_row(message: Message) -> dict:
+    """Column values of a fully populated (id and created_at set) message."""
+    return {column.key: getattr(message, column.key) for column in Message.__table__.columns}
+
+
+def _insert_new_rows(db: AsyncSession):
+    """INSERT into ``messages`` that skips rows already stored (same id)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(Message).on_conflict_do_nothing(index_elements=["id"])
+    if dialect == "sqlite":
+        return sqlite_insert(Message).on_conflict_do_nothing(index_elements=["id"])
+    return insert(Message)
+
+
+class MessageWriter:
+    """Collects message rows and inserts them in batches off the request path."""
+
+    def __init__(self):
+        self.pending: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._failures = 0
+        # Rows at the front of the queue to insert one at a time (after a rejected batch)
+        self._isolate = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.lost = 0
+
+    async def enqueue(self, row: dict):
+        """Queue one ``messages`` row; waits while too many rows are pending."""
+        while len(self.pending) >= settings.CHAT_WRITE_MAX_PENDING:
+            self._space.clear()
+            self._wakeup.set()
+            await self._space.wait()
+        self.pending.append(row)
+        if len(self.pending) >= settings.CHAT_WRITE_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """Insert one batch of pending rows. Returns False if the insert failed."""
+        if not self.pending:
+            return True
+        size = 1 if self._isolate else min(len(self.pending), settings.CHAT_WRITE_BATCH_SIZE)
+        batch = [self.pending.popleft() for _ in range(size)]
+        try:
+            async with async_session() as db:
+                await db.execute(_insert_new_rows(db), batch)
+                await db.commit()
+        except _REJECTED as e:
+            if len(batch) > 1:
+                # One bad row fails the whole batch: find it row by row
+                self.pending.extendleft(reversed(batch))
+                self._isolate = len(batch)
+                logger.error(f"Chat message batch rejected, retrying {len(batch)} rows one by one: {e}")
+            else:
+                self._isolate = max(0, self._isolate - 1)
+                self.lost += 1
+                logger.error(f"Dropping chat message {batch[0]['id']} rejected by the database: {e}")
+            self._space_freed()
+            return True
+        except Exception as e:
+            # Back to the front, in order, for the next attempt
+            self.pending.extendleft(reversed(batch))
+            self.retries += 1
+            logger.error(f"Chat message write-behind failed ({len(batch)} rows pending retry): {e}")
+            return False
+        except BaseException:
+            # Cancelled mid-insert (shutdown): leave the rows for drain()
+            self.pending.extendleft(reversed(batch))
+            raise
+        self._isolate = max(0, self._isolate - len(batch))
+        self.written += len(batch)
+        self.batches += 1
+        self._space_freed()
+        return True
+
+    def _space_freed(self):
+        if len(self.pending) < settings.CHAT_WRITE_MAX_PENDING:
+            self._space.set()
+
+    async def run(self):
+        """Flush every CHAT_WRITE_BEHIND_MS (sooner when a batch fills up)."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.CHAT_WRITE_BEHIND_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self.pending:
+                if await self.flush():
+                    self._failures = 0
+                    continue
+                self._failures += 1
+                await asyncio.sleep(min(_MAX_RETRY_DELAY, 0.1 * 2 ** self._failures))
+                break
+
+    async def drain(self):
+        """Flush everything still pending (at shutdown)."""
+        attempts = 0
+        while self.pending and attempts < _DRAIN_ATTEMPTS:
+            if await self.flush():
+                attempts = 0
+            else:
+                attempts += 1
+                await asyncio.sleep(0.1 * 2 ** attempts)
+        if self.pending:
+            self.lost += len(self.pending)
+            logger.error(f"Shutting down with {len(self.pending)} chat messages not persisted")
+            self.pending.clear()
+        self._space.set()
+
+    def stats(self) -> dict:
+        return {
+            "mode": settings.CHAT_PERSISTENCE,
+            "pending": len(self.pending),
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "lost": self.lost,
+        }
+
+
+message_writer = MessageWriter()
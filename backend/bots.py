@@ -21,6 +21,7 @@ import httpx
 import websockets
 
 from app.services.llm import generate_text
+from app.services.llm_governor import CallClass
 
 BASE = "http://localhost:8000"
 WS_BASE = "ws://localhost:8000"
@@ -84,7 +85,7 @@ async def _generate_message(
         )
 
     try:
-        response = await generate_text(prompt, system)
+        response = await generate_text(prompt, system, call_class=CallClass.bots)
         # Clean up: strip quotes the LLM might wrap around the response
         response = response.strip().strip('"').strip("'")
         if len(response) > 500:
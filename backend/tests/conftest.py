@@ -80,16 +80,26 @@ async def _override_get_db():
 @pytest.fixture(autouse=True)
 def mock_llm(monkeypatch):
     """Patch generate_text and generate_json everywhere they're imported."""
+    from app.services.llm_cache import clear_cache
+
+    # Responses cached by one test must not leak into the next
+    clear_cache()
     mock_text = AsyncMock(return_value="Mocked LLM response text.")
     mock_json = AsyncMock(return_value=[{"summary": "Test idea", "sentiment": 0.5}])
 
+    async def mock_stream(prompt, system_instruction="", **kwargs):
+        # Streams yield whatever generate_text is configured to return, in one chunk
+        text = await mock_text(prompt, system_instruction, **kwargs)
+        if text:
+            yield text
+
     # Definition site
     monkeypatch.setattr("app.services.llm.generate_text", mock_text)
     monkeypatch.setattr("app.services.llm.generate_json", mock_json)
+    monkeypatch.setattr("app.services.llm.stream_text", mock_stream)
 
     # All import sites (modules that do `from app.services.llm import ...`)
-    monkeypatch.setattr("app.engine.surrogate.generate_text", mock_text)
-    monkeypatch.setattr("app.engine.contributor.generate_text", mock_text)
+    monkeypatch.setattr("app.engine.streaming.stream_text", mock_stream)
     monkeypatch.setattr("app.engine.taxonomy.generate_json", mock_json)
     monkeypatch.setattr("app.routers.admin.generate_text", mock_text)
 
@@ -102,41 +112,107 @@ def mock_llm(monkeypatch):
 
 @pytest.fixture(autouse=True)
 def mock_redis(monkeypatch):
-    """Patch Redis publish/enqueue functions everywhere they're imported."""
+    """Patch Redis publish/dirty-tracking functions everywhere they're imported."""
     mock_pub_subgroup = AsyncMock()
     mock_pub_session = AsyncMock()
-    mock_enqueue = AsyncMock()
+    mock_pub_user = AsyncMock()
+    mock_mark_dirty = AsyncMock()
+    mock_get_dirty = AsyncMock(return_value=[])
+    mock_claim_dirty = AsyncMock(return_value=True)
 
     # Definition site
     monkeypatch.setattr("app.services.redis.publish_to_subgroup", mock_pub_subgroup)
     monkeypatch.setattr("app.services.redis.publish_to_session", mock_pub_session)
-    monkeypatch.setattr("app.services.redis.enqueue_cme_task", mock_enqueue)
+    monkeypatch.setattr("app.services.redis.publish_to_user", mock_pub_user)
+    monkeypatch.setattr("app.services.redis.mark_subgroup_dirty", mock_mark_dirty)
+    monkeypatch.setattr("app.services.redis.get_dirty_subgroups", mock_get_dirty)
+    monkeypatch.setattr("app.services.redis.claim_dirty_subgroup", mock_claim_dirty)
 
     # Import sites in engine modules
     monkeypatch.setattr("app.engine.surrogate.publish_to_subgroup", mock_pub_subgroup)
-    monkeypatch.setattr("app.engine.contributor.publish_to_subgroup", mock_pub_subgroup)
+    monkeypatch.setattr("app.engine.streaming.publish_to_subgroup", mock_pub_subgroup)
 
     # Import site in websocket handlers (human chat messages now go through Redis)
     monkeypatch.setattr("app.websocket.handlers.publish_to_subgroup", mock_pub_subgroup)
+    monkeypatch.setattr("app.websocket.handlers.mark_subgroup_dirty", mock_mark_dirty)
+    monkeypatch.setattr("app.websocket.handlers.publish_to_user", mock_pub_user)
+
+    # Import sites in the CME scheduler
+    monkeypatch.setattr("app.engine.cme.mark_subgroup_dirty", mock_mark_dirty)
+    monkeypatch.setattr("app.engine.cme.get_dirty_subgroups", mock_get_dirty)
+    monkeypatch.setattr("app.engine.cme.claim_dirty_subgroup", mock_claim_dirty)
 
     # start_redis_subscriber — no-op in tests (no real Redis connection)
     monkeypatch.setattr("app.services.redis.start_redis_subscriber", AsyncMock())
 
-    # Mock get_redis in cme module (used by distributed lock)
+    # Mock get_redis in sharding module (used by shard leases)
     mock_redis_client = AsyncMock()
     mock_redis_client.set = AsyncMock(return_value=True)
     mock_redis_client.get = AsyncMock(return_value=None)
     mock_redis_client.expire = AsyncMock(return_value=True)
     mock_redis_client.delete = AsyncMock(return_value=1)
     mock_get_redis = AsyncMock(return_value=mock_redis_client)
-    monkeypatch.setattr("app.engine.cme.get_redis", mock_get_redis)
+    monkeypatch.setattr("app.engine.sharding.get_redis", mock_get_redis)
+
+    # Recent-message buffers — no Redis, so every read falls back to the DB
+    # (tests of the buffer itself install a fake Redis)
+    from app.engine.recent_messages import clear_local
+    clear_local()
+    monkeypatch.setattr(
+        "app.engine.recent_messages.get_redis",
+        AsyncMock(side_effect=ConnectionError("no Redis in tests")),
+    )
+
+    # Convergence aggregates — no Redis, so scores are computed from the DB;
+    # trajectories start empty
+    from app.engine.convergence import clear_local as clear_convergence_series
+    clear_convergence_series()
+    monkeypatch.setattr(
+        "app.engine.convergence.get_redis",
+        AsyncMock(side_effect=ConnectionError("no Redis in tests")),
+    )
+
+    # Cluster-wide presence counts (admin status, CME) — one user online
+    # everywhere unless a test says otherwise
+    mock_online_counts = AsyncMock(side_effect=lambda ids: {i: 1 for i in ids})
+    monkeypatch.setattr("app.services.presence.get_subgroup_online_counts", mock_online_counts)
+    monkeypatch.setattr("app.routers.admin.get_subgroup_online_counts", mock_online_counts)
+    monkeypatch.setattr("app.engine.cme.get_subgroup_online_counts", mock_online_counts)
+
+    # CME idle backoff — nothing backed off unless a test says so
+    mock_get_backoffs = AsyncMock(return_value={})
+    mock_set_backoff = AsyncMock()
+    mock_clear_backoff = AsyncMock()
+    monkeypatch.setattr("app.services.redis.get_subgroup_backoffs", mock_get_backoffs)
+    monkeypatch.setattr("app.services.redis.set_subgroup_backoff", mock_set_backoff)
+    monkeypatch.setattr("app.services.redis.clear_subgroup_backoff", mock_clear_backoff)
+    monkeypatch.setattr("app.engine.cme.get_subgroup_backoffs", mock_get_backoffs)
+    monkeypatch.setattr("app.engine.cme.set_subgroup_backoff", mock_set_backoff)
+    monkeypatch.setattr("app.engine.cme.clear_subgroup_backoff", mock_clear_backoff)
+
+    # CME delivery ledger — nothing relayed yet unless a test says so
+    mock_get_relayed = AsyncMock(return_value=set())
+    mock_add_relayed = AsyncMock()
+    monkeypatch.setattr("app.services.redis.get_relayed_ideas", mock_get_relayed)
+    monkeypatch.setattr("app.services.redis.add_relayed_ideas", mock_add_relayed)
+    monkeypatch.setattr("app.engine.cme.get_relayed_ideas", mock_get_relayed)
+    monkeypatch.setattr("app.engine.cme.add_relayed_ideas", mock_add_relayed)
 
     return {
         "publish_to_subgroup": mock_pub_subgroup,
         "publish_to_session": mock_pub_session,
-        "enqueue_cme_task": mock_enqueue,
+        "publish_to_user": mock_pub_user,
+        "mark_subgroup_dirty": mock_mark_dirty,
+        "get_dirty_subgroups": mock_get_dirty,
+        "claim_dirty_subgroup": mock_claim_dirty,
         "redis_client": mock_redis_client,
         "get_redis": mock_get_redis,
+        "get_subgroup_online_counts": mock_online_counts,
+        "get_subgroup_backoffs": mock_get_backoffs,
+        "set_subgroup_backoff": mock_set_backoff,
+        "clear_subgroup_backoff": mock_clear_backoff,
+        "get_relayed_ideas": mock_get_relayed,
+        "add_relayed_ideas": mock_add_relayed,
     }
 
 
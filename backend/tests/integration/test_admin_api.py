@@ -32,6 +32,35 @@ class TestSessionStatus:
         assert data["status"] == "active"
         assert len(data["subgroups"]) >= 1
 
+    async def test_online_count_is_cluster_wide(self, client, mock_redis):
+        create = await client.post("/api/sessions", json={"title": "Presence"})
+        code = create.json()["join_code"]
+        sid = create.json()["id"]
+        await client.post("/api/users", json={"join_code": code, "display_name": "A"})
+        await client.post("/api/users", json={"join_code": code, "display_name": "B"})
+        subgroups = (await client.post(f"/api/sessions/{sid}/start")).json()
+        sg_id = uuid.UUID(subgroups[0]["id"])
+        mock_redis["get_subgroup_online_counts"].side_effect = lambda ids: {sg_id: 2}
+
+        resp = await client.get(f"/api/admin/{sid}/status")
+
+        by_id = {sg["id"]: sg for sg in resp.json()["subgroups"]}
+        assert by_id[str(sg_id)]["online_count"] == 2
+
+    async def test_online_count_unknown_when_presence_is_down(self, client, mock_redis):
+        create = await client.post("/api/sessions", json={"title": "Presence"})
+        code = create.json()["join_code"]
+        sid = create.json()["id"]
+        await client.post("/api/users", json={"join_code": code, "display_name": "A"})
+        await client.post("/api/users", json={"join_code": code, "display_name": "B"})
+        await client.post(f"/api/sessions/{sid}/start")
+        mock_redis["get_subgroup_online_counts"].side_effect = ConnectionError("redis down")
+
+        resp = await client.get(f"/api/admin/{sid}/status")
+
+        assert resp.status_code == 200
+        assert all(sg["online_count"] is None for sg in resp.json()["subgroups"])
+
     async def test_status_404(self, client):
         resp = await client.get(f"/api/admin/{uuid.uuid4()}/status")
         assert resp.status_code == 404
@@ -9,3 +9,10 @@ class TestHealthEndpoint:
         resp = await client.get("/api/health")
         assert resp.status_code == 200
         assert resp.json() == {"status": "ok"}
+
+
+async def test_metrics(client):
+    resp = await client.get("/api/metrics")
+    assert resp.status_code == 200
+    assert "llm" in resp.json()
+    assert "recent_messages" in resp.json()
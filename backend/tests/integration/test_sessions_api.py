@@ -70,6 +70,23 @@ class TestSessionStart:
         subgroups = resp.json()
         assert len(subgroups) >= 1
 
+    async def test_start_publishes_each_assignment(self, client, mock_redis):
+        create = await client.post("/api/sessions", json={"title": "Assign"})
+        code = create.json()["join_code"]
+        sid = create.json()["id"]
+        for name in ("Alice", "Bob"):
+            await client.post("/api/users", json={"join_code": code, "display_name": name})
+
+        resp = await client.post(f"/api/sessions/{sid}/start")
+        subgroup_ids = {sg["id"] for sg in resp.json()}
+
+        calls = mock_redis["publish_to_user"].await_args_list
+        assert len(calls) == 2
+        for call in calls:
+            event, data = call.args[1:]
+            assert event == "user:updated"
+            assert str(data["subgroup_id"]) in subgroup_ids
+
     async def test_start_with_one_user_fails(self, client):
         create = await client.post("/api/sessions", json={"title": "Lonely"})
         code = create.json()["join_code"]
@@ -105,6 +122,28 @@ class TestSessionStop:
         assert resp.status_code == 404
 
 
+class TestConvergenceEndpoint:
+
+    async def test_unknown_session_404(self, client):
+        resp = await client.get(f"/api/sessions/{uuid.uuid4()}/convergence")
+        assert resp.status_code == 404
+
+    async def test_stop_records_final_point(self, client):
+        create = await client.post("/api/sessions", json={"title": "Trajectory"})
+        sid = create.json()["id"]
+        assert (await client.get(f"/api/sessions/{sid}/convergence")).json() == []
+
+        await client.post(f"/api/sessions/{sid}/stop")
+
+        points = (await client.get(f"/api/sessions/{sid}/convergence")).json()
+        assert len(points) == 1
+        assert points[0]["convergence"] == 0.0
+        delta = await client.get(
+            f"/api/sessions/{sid}/convergence", params={"since": points[0]["recorded_at"]}
+        )
+        assert delta.json() == []
+
+
 class TestSubgroupsEndpoint:
 
     async def test_get_subgroups(self, client):
@@ -1,8 +1,13 @@
 """Integration tests: User join, get user, get messages."""
 
 import uuid
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from sqlalchemy import event
+
+from app.models.message import Message, MessageType
+from app.models.user import User
 
 
 class TestJoinSession:
@@ -86,3 +91,96 @@ class TestGetMessages:
             resp = await client.get(f"/api/users/{uid}/messages")
             assert resp.status_code == 200
             assert isinstance(resp.json(), list)
+
+
+async def _subgroup_with_history(client, db, count=5):
+    """Start a session and give user A's subgroup ``count`` messages, one second apart.
+
+    Returns A's user id and the message ids, oldest first.
+    """
+    create = await client.post("/api/sessions", json={"title": "History"})
+    code, sid = create.json()["join_code"], create.json()["id"]
+    uid = (await client.post("/api/users", json={"join_code": code, "display_name": "A"})).json()["id"]
+    await client.post("/api/users", json={"join_code": code, "display_name": "B"})
+    await client.post(f"/api/sessions/{sid}/start")
+    sg_id = uuid.UUID((await client.get(f"/api/users/{uid}")).json()["subgroup_id"])
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        db.add(Message(
+            subgroup_id=sg_id, content=f"m{i}", msg_type=MessageType.contributor,
+            created_at=start + timedelta(seconds=i),
+        ))
+    await db.commit()
+    return uid, [m["id"] for m in (await client.get(f"/api/users/{uid}/messages")).json()]
+
+
+class TestMessagePagination:
+
+    async def test_full_history_in_order(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages")
+        assert [m["content"] for m in resp.json()] == ["m0", "m1", "m2", "m3", "m4"]
+
+    async def test_limit_returns_newest_page(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages", params={"limit": 2})
+        assert [m["id"] for m in resp.json()] == ids[3:]
+
+    async def test_before_pages_backwards(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages", params={"before": ids[3], "limit": 2})
+        assert [m["id"] for m in resp.json()] == ids[1:3]
+
+    async def test_after_pages_forwards(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages", params={"after": ids[0], "limit": 2})
+        assert [m["id"] for m in resp.json()] == ids[1:3]
+
+    async def test_since_returns_everything_newer(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages", params={"since": ids[1]})
+        assert [m["id"] for m in resp.json()] == ids[2:]
+
+        resp = await client.get(f"/api/users/{uid}/messages", params={"since": ids[-1]})
+        assert resp.json() == []
+
+    async def test_unknown_cursor_400(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(f"/api/users/{uid}/messages", params={"since": str(uuid.uuid4())})
+        assert resp.status_code == 400
+
+    async def test_multiple_cursors_400(self, client, db):
+        uid, ids = await _subgroup_with_history(client, db)
+        resp = await client.get(
+            f"/api/users/{uid}/messages", params={"before": ids[3], "after": ids[0]}
+        )
+        assert resp.status_code == 400
+
+
+class TestMessageDisplayNames:
+
+    async def test_history_names_humans_and_agents_in_one_query(self, client, db):
+        from tests.conftest import test_engine
+
+        uid, _ = await _subgroup_with_history(client, db, count=20)
+        user = await db.get(User, uuid.UUID(uid))
+        for i in range(20):
+            db.add(Message(subgroup_id=user.subgroup_id, user_id=user.id, content=f"h{i}"))
+        await db.commit()
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count)
+        try:
+            resp = await client.get(f"/api/users/{uid}/messages")
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count)
+
+        names = {(m["msg_type"], m["display_name"]) for m in resp.json()}
+        assert names == {("contributor", "Contributor Agent"), ("human", "A")}
+        # Requesting user + joined history, however long the transcript
+        assert len(statements) == 2
@@ -1,5 +1,8 @@
-"""Tests for app.engine.cme — CME cycle logic and distributed locking."""
+"""Tests for app.engine.cme — CME cycle logic and dirty-subgroup scheduling."""
 
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, patch, MagicMock
 from contextlib import asynccontextmanager
 
@@ -9,13 +12,18 @@ from app.models.session import Session, SessionStatus
 from app.models.subgroup import Subgroup
 from app.models.user import User
 from app.models.idea import Idea
+from app.models.message import Message, MessageType
+from app.engine.sharding import ShardLeases
+import app.engine.convergence as convergence
+from app.engine import cme
 from app.engine.cme import (
+    idle_backoff_seconds,
+    maintain_leases,
     process_session,
+    prune_convergence_series,
+    resume_subgroup,
     run_cme_cycle,
-    acquire_cme_lock,
-    renew_cme_lock,
-    release_cme_lock,
-    CME_LOCK_KEY,
+    select_ready_subgroups,
 )
 
 
@@ -57,7 +65,7 @@ class TestProcessSession:
         await db.flush()
 
         with patch("app.engine.cme.async_session", _mock_async_session(db)), \
-             patch("app.engine.cme.update_taxonomy_for_subgroup") as mock_tax:
+             patch("app.engine.cme.update_taxonomy_for_subgroups") as mock_tax:
             await process_session(session)
             mock_tax.assert_not_awaited()
 
@@ -65,10 +73,11 @@ class TestProcessSession:
         session, subgroups = await _setup_active_session(db, num_subgroups=3)
 
         with patch("app.engine.cme.async_session", _mock_async_session(db)), \
-             patch("app.engine.cme.update_taxonomy_for_subgroup", new_callable=AsyncMock) as mock_tax, \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}) as mock_tax, \
              patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]) as mock_ideas:
             await process_session(session)
-            assert mock_tax.await_count == 3
+            mock_tax.assert_awaited_once()
+            assert set(mock_tax.await_args[0][2]) == {sg.id for sg in subgroups}
 
     async def test_surrogate_called_with_foreign_ideas(self, db, mock_llm):
         session, subgroups = await _setup_active_session(db)
@@ -78,64 +87,428 @@ class TestProcessSession:
         await db.flush()
 
         with patch("app.engine.cme.async_session", _mock_async_session(db)), \
-             patch("app.engine.cme.update_taxonomy_for_subgroup", new_callable=AsyncMock), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
              patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[idea]), \
              patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock) as mock_surrogate:
             await process_session(session)
             assert mock_surrogate.await_count >= 1
 
+    async def test_cross_pollination_planned_once_per_cycle(self, db, mock_llm):
+        session, subgroups = await _setup_active_session(db, num_subgroups=3)
+        db.add(Idea(session_id=session.id, subgroup_id=subgroups[0].id, summary="Idea", sentiment=0.5))
+        await db.flush()
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.taxonomy.load_cross_pollination_plan") as per_call, \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock) as mock_surrogate:
+            await process_session(session)
+
+        per_call.assert_not_called()
+        relayed = {call.args[2].id: call.args[3] for call in mock_surrogate.await_args_list}
+        assert set(relayed) == {subgroups[1].id, subgroups[2].id}
+        assert all(insights == ["Idea"] for insights in relayed.values())
+
+    async def _relay_setup(self, db):
+        session, subgroups = await _setup_active_session(db)
+        ideas = [
+            Idea(session_id=session.id, subgroup_id=subgroups[0].id, summary=f"Idea {i}", sentiment=s)
+            for i, s in enumerate((0.9, 0.6, 0.3, 0.0))
+        ]
+        db.add_all(ideas)
+        await db.flush()
+        return session, subgroups, ideas
+
+    async def test_relayed_ideas_are_recorded_and_skipped(self, db, mock_llm, mock_redis):
+        session, subgroups, ideas = await self._relay_setup(db)
+        mock_redis["get_relayed_ideas"].return_value = {ideas[0].id}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock) as mock_surrogate:
+            await process_session(session, {subgroups[1].id})
+
+        assert mock_surrogate.await_args[0][3] == ["Idea 1", "Idea 2"]
+        mock_redis["add_relayed_ideas"].assert_awaited_once_with(
+            subgroups[1].id, [ideas[1].id, ideas[2].id]
+        )
+
+    async def test_no_surrogate_turn_when_everything_was_relayed(self, db, mock_llm, mock_redis):
+        session, subgroups, ideas = await self._relay_setup(db)
+        mock_redis["get_relayed_ideas"].return_value = {idea.id for idea in ideas}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock) as mock_surrogate:
+            await process_session(session, {subgroups[1].id})
+
+        mock_surrogate.assert_not_awaited()
+        mock_redis["add_relayed_ideas"].assert_not_awaited()
+
+    async def test_failed_delivery_not_recorded(self, db, mock_llm, mock_redis):
+        session, subgroups, _ = await self._relay_setup(db)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock,
+                   side_effect=RuntimeError("LLM down")):
+            await process_session(session, {subgroups[1].id})
+
+        mock_redis["add_relayed_ideas"].assert_not_awaited()
+
+    async def test_discarded_surrogate_message_not_recorded(self, db, mock_llm, mock_redis):
+        session, subgroups, _ = await self._relay_setup(db)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock,
+                   return_value=None) as mock_surrogate:
+            await process_session(session, {subgroups[1].id})
+
+        mock_surrogate.assert_awaited_once()
+        mock_redis["add_relayed_ideas"].assert_not_awaited()
+
+    async def test_agent_messages_buffered_only_after_commit(self, db, mock_llm, mock_redis):
+        session, subgroups, _ = await self._relay_setup(db)
+        surrogate_msg, contributor_msg = MagicMock(), MagicMock()
+        db.add(Message(subgroup_id=subgroups[1].id, content="Hi", msg_type=MessageType.human))
+        await db.flush()
+        order = []
+        real_commit = db.commit
+
+        async def commit():
+            order.append("commit")
+            await real_commit()
+
+        async def record(message):
+            order.append(message)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch.object(db, "commit", side_effect=commit), \
+             patch("app.engine.cme.record_message", side_effect=record), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock,
+                   return_value=surrogate_msg), \
+             patch("app.engine.cme.deliver_contributor_message", new_callable=AsyncMock,
+                   return_value=contributor_msg):
+            await process_session(session, {subgroups[1].id})
+
+        for message in (surrogate_msg, contributor_msg):
+            assert order[order.index(message) - 1] == "commit"
+
+    async def test_failed_commit_leaves_buffer_alone(self, db, mock_llm, mock_redis):
+        session, subgroups, _ = await self._relay_setup(db)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch.object(db, "commit", side_effect=RuntimeError("rolled back")), \
+             patch("app.engine.cme.record_message", new_callable=AsyncMock) as mock_record, \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.deliver_surrogate_message", new_callable=AsyncMock), \
+             patch("app.engine.cme.deliver_contributor_message", new_callable=AsyncMock):
+            await process_session(session, {subgroups[1].id})
+
+        mock_record.assert_not_awaited()
+
     async def test_error_in_one_subgroup_doesnt_stop_others(self, db, mock_llm):
         session, subgroups = await _setup_active_session(db, num_subgroups=2)
 
         call_count = 0
 
-        async def fail_first(db, sess_id, sg_id):
+        async def fail_first(db, sess_id, sg_id, **kwargs):
             nonlocal call_count
             call_count += 1
             if call_count == 1:
-                raise RuntimeError("Taxonomy exploded")
+                raise RuntimeError("Cross-pollination exploded")
+            return []
 
         with patch("app.engine.cme.async_session", _mock_async_session(db)), \
-             patch("app.engine.cme.update_taxonomy_for_subgroup", side_effect=fail_first), \
-             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]):
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", side_effect=fail_first):
             # Should not raise
             await process_session(session)
             # Both subgroups attempted
             assert call_count == 2
 
+    async def test_taxonomy_failure_doesnt_stop_delivery(self, db, mock_llm):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", side_effect=RuntimeError("Taxonomy exploded")), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]) as mock_ideas:
+            await process_session(session)
+            assert mock_ideas.await_count == 2
+
+
+    async def test_only_requested_subgroups_processed(self, db, mock_llm):
+        session, subgroups = await _setup_active_session(db, num_subgroups=3)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}) as mock_tax, \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]) as mock_ideas:
+            await process_session(session, {subgroups[1].id})
+            assert mock_tax.await_args[0][2] == [subgroups[1].id]
+            assert mock_ideas.await_count == 1
+
+
+    async def test_new_ideas_mark_other_subgroups_dirty(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=3)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock,
+                   return_value={subgroups[0].id: ["idea"]}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]):
+            await process_session(session, {subgroups[0].id})
+
+        marked = {c[0][1] for c in mock_redis["mark_subgroup_dirty"].await_args_list}
+        assert marked == {subgroups[1].id, subgroups[2].id}
+        assert all(c.kwargs["activity"] is False for c in mock_redis["mark_subgroup_dirty"].await_args_list)
+
+
+class TestIdleSubgroups:
+
+    async def test_subgroup_with_nobody_online_gets_no_agent_turns(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        mock_redis["get_subgroup_online_counts"].side_effect = lambda ids: {subgroups[0].id: 1}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}) as mock_tax, \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]) as mock_ideas:
+            await process_session(session)
+
+        # Taxonomy still covers both; agent work only the attended one
+        assert len(mock_tax.await_args[0][2]) == 2
+        assert [c[0][2] for c in mock_ideas.await_args_list] == [subgroups[0].id]
+
+    async def test_backed_off_subgroup_skipped_until_due(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        mock_redis["get_subgroup_backoffs"].return_value = {subgroups[1].id: (2, time.time() + 60)}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]) as mock_ideas:
+            await process_session(session)
+
+        assert [c[0][2] for c in mock_ideas.await_args_list] == [subgroups[0].id]
+
+    async def test_unanswered_agent_turn_backs_off_exponentially(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        db.add(Message(subgroup_id=subgroups[0].id, content="Anyone?", msg_type=MessageType.contributor))
+        await db.flush()
+        mock_redis["get_subgroup_backoffs"].return_value = {subgroups[0].id: (2, time.time() - 1)}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]):
+            await process_session(session, {subgroups[0].id})
+
+        sess_id, sg_id, level, until = mock_redis["set_subgroup_backoff"].await_args[0]
+        assert (sg_id, level) == (subgroups[0].id, 3)
+        assert until - time.time() == pytest.approx(idle_backoff_seconds(2), abs=5)
+
+    async def test_human_reply_clears_backoff(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        db.add(Message(subgroup_id=subgroups[0].id, content="I'm here", msg_type=MessageType.human))
+        await db.flush()
+        mock_redis["get_subgroup_backoffs"].return_value = {subgroups[0].id: (3, 0.0)}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]):
+            await process_session(session, {subgroups[0].id})
+
+        mock_redis["clear_subgroup_backoff"].assert_awaited_once_with(session.id, subgroups[0].id)
+        mock_redis["set_subgroup_backoff"].assert_not_awaited()
+
+    async def test_human_reply_during_backoff_gets_agent_turns(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        agent_turn = datetime.now(timezone.utc) - timedelta(minutes=1)
+        db.add_all([
+            Message(subgroup_id=subgroups[0].id, content="Anyone?",
+                    msg_type=MessageType.contributor, created_at=agent_turn),
+            Message(subgroup_id=subgroups[0].id, content="Back now",
+                    msg_type=MessageType.human, created_at=agent_turn + timedelta(seconds=30)),
+        ])
+        await db.flush()
+        mock_redis["get_subgroup_backoffs"].return_value = {subgroups[0].id: (3, time.time() + 300)}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]), \
+             patch("app.engine.cme.deliver_contributor_message", new_callable=AsyncMock) as mock_contributor:
+            await process_session(session, {subgroups[0].id})
+
+        mock_contributor.assert_awaited_once()
+        mock_redis["clear_subgroup_backoff"].assert_awaited_once_with(session.id, subgroups[0].id)
+        mock_redis["set_subgroup_backoff"].assert_not_awaited()
+
+    def test_backoff_doubles_up_to_cap(self, monkeypatch):
+        monkeypatch.setattr("app.engine.cme.settings.CME_INTERVAL_SECONDS", 20)
+        monkeypatch.setattr("app.engine.cme.settings.CME_IDLE_BACKOFF_MAX_SECONDS", 100)
+        assert [idle_backoff_seconds(n) for n in range(4)] == [20, 40, 80, 100]
+
+    async def test_resume_clears_backoff_and_schedules(self, mock_redis):
+        sess_id, sg_id = uuid.uuid4(), uuid.uuid4()
+        await resume_subgroup(sess_id, sg_id)
+        mock_redis["clear_subgroup_backoff"].assert_awaited_once_with(sess_id, sg_id)
+        mock_redis["mark_subgroup_dirty"].assert_awaited_once_with(sess_id, sg_id, activity=False)
+
+    async def test_resume_ignores_subgroup_that_was_not_skipped(self, mock_redis):
+        mock_redis["clear_subgroup_backoff"].return_value = False
+        await resume_subgroup(uuid.uuid4(), uuid.uuid4())
+        mock_redis["mark_subgroup_dirty"].assert_not_awaited()
+
+    async def test_skipped_subgroup_is_marked_for_resume(self, db, mock_llm, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=2)
+        mock_redis["get_subgroup_online_counts"].side_effect = lambda ids: {subgroups[0].id: 1}
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.update_taxonomy_for_subgroups", new_callable=AsyncMock, return_value={}), \
+             patch("app.engine.cme.get_ideas_not_in_subgroup", new_callable=AsyncMock, return_value=[]):
+            await process_session(session)
+
+        mock_redis["set_subgroup_backoff"].assert_awaited_once_with(session.id, subgroups[1].id, 0, 0.0)
+
+
+class TestScheduler:
+
+    def test_quiet_subgroup_is_ready(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_DEBOUNCE_SECONDS", 3.0)
+        sess_id, sg_id = uuid.uuid4(), uuid.uuid4()
+        now = time.time()
+        ready = select_ready_subgroups([(sess_id, sg_id, now - 5, now - 4)], now)
+        assert ready == [(sess_id, sg_id)]
+
+    def test_active_subgroup_is_debounced(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_DEBOUNCE_SECONDS", 3.0)
+        monkeypatch.setattr("app.config.settings.CME_INTERVAL_SECONDS", 20)
+        now = time.time()
+        ready = select_ready_subgroups([(uuid.uuid4(), uuid.uuid4(), now - 5, now - 1)], now)
+        assert ready == []
+
+    def test_max_staleness_overrides_debounce(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_DEBOUNCE_SECONDS", 3.0)
+        monkeypatch.setattr("app.config.settings.CME_INTERVAL_SECONDS", 20)
+        now = time.time()
+        ready = select_ready_subgroups([(uuid.uuid4(), uuid.uuid4(), now - 25, now - 1)], now)
+        assert len(ready) == 1
+
+    def test_mark_without_activity_is_ready_immediately(self):
+        now = time.time()
+        ready = select_ready_subgroups([(uuid.uuid4(), uuid.uuid4(), now, None)], now)
+        assert len(ready) == 1
+
+    async def test_no_dirty_subgroups_does_nothing(self, db, mock_redis):
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.process_session", new_callable=AsyncMock) as mock_process:
+            await run_cme_cycle()
+            mock_process.assert_not_awaited()
+
+    async def test_cycle_processes_claimed_subgroups(self, db, mock_redis):
+        session, subgroups = await _setup_active_session(db, num_subgroups=3)
+        stale = time.time() - 60
+        mock_redis["get_dirty_subgroups"].return_value = [
+            (session.id, subgroups[0].id, stale, stale),
+        ]
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.process_session", new_callable=AsyncMock) as mock_process:
+            await run_cme_cycle()
+            mock_process.assert_awaited_once()
+            assert mock_process.await_args[0][1] == {subgroups[0].id}
+
+    async def test_unclaimed_subgroups_skipped(self, db, mock_redis):
+        """Another worker cleared the flag first — nothing to do."""
+        session, subgroups = await _setup_active_session(db)
+        stale = time.time() - 60
+        mock_redis["get_dirty_subgroups"].return_value = [
+            (session.id, subgroups[0].id, stale, stale),
+        ]
+        mock_redis["claim_dirty_subgroup"].return_value = False
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.process_session", new_callable=AsyncMock) as mock_process:
+            await run_cme_cycle()
+            mock_process.assert_not_awaited()
+
+    async def test_cycle_skips_sessions_on_foreign_shards(self, db, mock_redis):
+        session, subgroups = await _setup_active_session(db)
+        stale = time.time() - 60
+        mock_redis["get_dirty_subgroups"].return_value = [
+            (session.id, subgroups[0].id, stale, stale),
+        ]
+        leases = ShardLeases("worker-1")  # holds no shards
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.process_session", new_callable=AsyncMock) as mock_process:
+            await run_cme_cycle(leases)
+            mock_process.assert_not_awaited()
+            mock_redis["claim_dirty_subgroup"].assert_not_awaited()
+
+    async def test_session_on_shard_lost_mid_cycle_skipped(self, db, mock_redis):
+        first, first_sgs = await _setup_active_session(db)
+        second, second_sgs = await _setup_active_session(db)
+        stale = time.time() - 60
+        mock_redis["get_dirty_subgroups"].return_value = [
+            (first.id, first_sgs[0].id, stale, stale),
+            (second.id, second_sgs[0].id, stale, stale),
+        ]
+        leases = MagicMock(spec=ShardLeases)
+        owned = {first.id, second.id}
+        leases.owns_session.side_effect = lambda sid: sid in owned
+
+        async def lose_the_other(session, subgroup_ids):
+            # The lease renewal task loses the other session's shard meanwhile
+            owned.discard(second.id if session.id == first.id else first.id)
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)), \
+             patch("app.engine.cme.process_session", side_effect=lose_the_other) as mock_process:
+            await run_cme_cycle(leases)
+
+        assert mock_process.call_count == 1
+
+    async def test_lease_renewal_survives_errors(self, monkeypatch):
+        monkeypatch.setattr(cme, "_running", True)
+        monkeypatch.setattr("app.config.settings.CME_LEASE_TTL_SECONDS", 0)
+        leases = ShardLeases("worker-1")
+        calls = 0
+
+        async def rebalance():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise ConnectionError("redis down")
+            cme._running = False
+
+        monkeypatch.setattr(leases, "rebalance", rebalance)
+        with patch("app.engine.cme.prune_convergence_series", new_callable=AsyncMock) as prune:
+            await maintain_leases(leases)
+
+        assert calls == 2
+        prune.assert_awaited_once_with(leases)
+
+
+
+class TestConvergenceSeriesPruning:
+
+    async def test_series_of_stopped_sessions_dropped(self, db):
+        session, subgroups = await _setup_active_session(db)
+        ended = Session(title="Ended", status=SessionStatus.completed)
+        db.add(ended)
+        await db.flush()
+        for s in (session, ended):
+            await convergence.record_convergence(db, s.id, 0.5, {subgroups[0].id: 0.1})
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)):
+            await prune_convergence_series()
+
+        assert convergence.series_session_ids() == [session.id]
+
+    async def test_series_of_sessions_on_foreign_shards_dropped(self, db):
+        session, subgroups = await _setup_active_session(db)
+        await convergence.record_convergence(db, session.id, 0.5, {subgroups[0].id: 0.1})
+        leases = ShardLeases("worker-1")  # holds no shards
+
+        with patch("app.engine.cme.async_session", _mock_async_session(db)):
+            await prune_convergence_series(leases)
 
-class TestDistributedLock:
-
-    async def test_acquire_lock_success(self, mock_redis):
-        """Lock is acquired when Redis SET NX succeeds."""
-        mock_redis["redis_client"].set = AsyncMock(return_value=True)
-        assert await acquire_cme_lock("worker-1") is True
-
-    async def test_acquire_lock_failure(self, mock_redis):
-        """Lock is not acquired when another worker holds it."""
-        mock_redis["redis_client"].set = AsyncMock(return_value=None)
-        assert await acquire_cme_lock("worker-2") is False
-
-    async def test_renew_lock_when_owner(self, mock_redis):
-        """Lock is renewed when we still own it."""
-        mock_redis["redis_client"].get = AsyncMock(return_value="worker-1")
-        mock_redis["redis_client"].expire = AsyncMock(return_value=True)
-        assert await renew_cme_lock("worker-1") is True
-        mock_redis["redis_client"].expire.assert_awaited_once()
-
-    async def test_renew_lock_lost_ownership(self, mock_redis):
-        """Renewal fails if another worker now holds the lock."""
-        mock_redis["redis_client"].get = AsyncMock(return_value="worker-other")
-        assert await renew_cme_lock("worker-1") is False
-
-    async def test_release_lock_when_owner(self, mock_redis):
-        """Lock is released when we own it."""
-        mock_redis["redis_client"].get = AsyncMock(return_value="worker-1")
-        await release_cme_lock("worker-1")
-        mock_redis["redis_client"].delete.assert_awaited_once_with(CME_LOCK_KEY)
-
-    async def test_release_lock_not_owner(self, mock_redis):
-        """Lock is not released if we don't own it."""
-        mock_redis["redis_client"].get = AsyncMock(return_value="worker-other")
-        await release_cme_lock("worker-1")
-        mock_redis["redis_client"].delete.assert_not_awaited()
+        assert convergence.series_session_ids() == []
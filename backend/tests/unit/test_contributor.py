@@ -25,7 +25,7 @@ class TestDeliverContributorMessage:
         session, sg = await _setup(db)
         mock_llm["generate_text"].return_value = "Have you considered X?"
 
-        await deliver_contributor_message(db, session, sg, "Some context")
+        delivered = await deliver_contributor_message(db, session, sg, "Some context")
         await db.flush()
 
         result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
@@ -34,6 +34,7 @@ class TestDeliverContributorMessage:
         assert messages[0].msg_type == MessageType.contributor
         assert messages[0].user_id is None
         assert messages[0].content == "Have you considered X?"
+        assert delivered is messages[0]
 
     async def test_broadcasts_to_subgroup(self, db, mock_llm, mock_redis):
         session, sg = await _setup(db)
@@ -41,10 +42,11 @@ class TestDeliverContributorMessage:
 
         await deliver_contributor_message(db, session, sg, "context")
 
-        mock_redis["publish_to_subgroup"].assert_awaited_once()
-        call_args = mock_redis["publish_to_subgroup"].call_args
-        assert call_args[0][0] == sg.id
-        assert call_args[0][1] == "chat:new_message"
+        calls = mock_redis["publish_to_subgroup"].call_args_list
+        assert [c[0][1] for c in calls] == ["chat:message_delta", "chat:message_done"]
+        assert all(c[0][0] == sg.id for c in calls)
+        assert calls[0][0][2]["delta"] == "Novel question?"
+        assert calls[0][0][2]["id"] == calls[1][0][2]["id"]
 
     async def test_empty_llm_response_no_save(self, db, mock_llm, mock_redis):
         session, sg = await _setup(db)
@@ -0,0 +1,247 @@
+"""Tests for app.engine.convergence — running per-subgroup sentiment aggregates."""
+
+import math
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+import app.engine.convergence as convergence
+from app.engine.convergence import (
+    ConvergenceSeries,
+    compute_convergence,
+    convergence_score,
+    get_convergence_points,
+    get_subgroup_sentiments,
+    record_convergence,
+    record_ideas,
+)
+from app.models.idea import Idea
+from app.models.session import Session, SessionStatus
+from app.models.subgroup import Subgroup
+
+
+class _FakeHashes:
+    """Just enough of a Redis client for the aggregates: hashes."""
+
+    def __init__(self):
+        self.data: dict[str, dict[str, str]] = {}
+        self.fail = False
+
+    def pipeline(self, **kwargs):
+        return _FakePipeline(self)
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def hexists(self, key, field):
+        return field in self.data.get(key, {})
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hincrbyfloat(self, key, field, amount):
+        fields = self.data.setdefault(key, {})
+        fields[field] = str(float(fields.get(field, 0)) + amount)
+
+    def hincrby(self, key, field, amount):
+        fields = self.data.setdefault(key, {})
+        fields[field] = str(int(fields.get(field, 0)) + amount)
+
+    def expire(self, key, ttl):
+        pass
+
+
+class _FakePipeline:
+
+    def __init__(self, redis: _FakeHashes):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def delete(self, key):
+        self.calls.append(lambda: self.redis.data.pop(key, None))
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append(lambda: getattr(self.redis, name)(*args, **kwargs))
+        return queue
+
+    async def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        return [call() for call in self.calls]
+
+
+@pytest.fixture
+def hashes(monkeypatch):
+    fake = _FakeHashes()
+    monkeypatch.setattr(convergence, "get_redis", AsyncMock(return_value=fake))
+    return fake
+
+
+async def _session_with_ideas(db, sentiments_by_subgroup):
+    session = Session(title="Converging", status=SessionStatus.active)
+    db.add(session)
+    await db.flush()
+    subgroups = []
+    for i, sentiments in enumerate(sentiments_by_subgroup):
+        sg = Subgroup(session_id=session.id, label=f"ThinkTank {i + 1}")
+        db.add(sg)
+        await db.flush()
+        for sentiment in sentiments:
+            db.add(Idea(session_id=session.id, subgroup_id=sg.id, summary="idea", sentiment=sentiment))
+        subgroups.append(sg)
+    await db.flush()
+    return session, subgroups
+
+
+async def _add_idea(db, session, sg, sentiment) -> Idea:
+    idea = Idea(session_id=session.id, subgroup_id=sg.id, summary="new", sentiment=sentiment)
+    db.add(idea)
+    await db.flush()
+    return idea
+
+
+class TestConvergenceScore:
+
+    def test_needs_two_subgroups(self):
+        assert convergence_score([0.5]) == 0.0
+
+    def test_identical_sentiments_fully_converged(self):
+        assert convergence_score([0.3, 0.3, 0.3]) == 1.0
+
+    def test_opposite_sentiments_divergent(self):
+        assert convergence_score([-1.0, 1.0]) == 0.0
+
+
+class TestRunningAggregates:
+
+    async def test_owner_fill_then_served_from_redis(self, db, hashes):
+        session, (sg1, sg2) = await _session_with_ideas(db, [[0.2, 0.4], [-0.5]])
+
+        filled = await get_subgroup_sentiments(db, session.id, fill=True)
+        reads = convergence._counters["db_reads"]
+        cached = await get_subgroup_sentiments(db, session.id)
+
+        assert filled == cached == pytest.approx({sg1.id: 0.3, sg2.id: -0.5})
+        assert convergence._counters["db_reads"] == reads
+
+    async def test_cold_read_without_fill_leaves_redis_alone(self, db, hashes):
+        session, _ = await _session_with_ideas(db, [[0.1], [0.2]])
+        await get_subgroup_sentiments(db, session.id)
+        assert not hashes.data
+
+    async def test_recorded_ideas_match_a_full_scan(self, db, hashes):
+        session, (sg1, sg2) = await _session_with_ideas(db, [[0.2], [-0.4]])
+        await get_subgroup_sentiments(db, session.id, fill=True)
+
+        new = [await _add_idea(db, session, sg1, 0.8), await _add_idea(db, session, sg2, 0.0)]
+        await record_ideas(session.id, new)
+
+        incremental = await compute_convergence(db, session.id)
+        hashes.data.clear()
+        assert incremental == await compute_convergence(db, session.id)
+        assert await get_subgroup_sentiments(db, session.id) == pytest.approx(
+            {sg1.id: 0.5, sg2.id: -0.2}
+        )
+
+    async def test_recording_into_cold_hash_is_skipped(self, db, hashes):
+        session, (sg1, _) = await _session_with_ideas(db, [[0.2], [0.4]])
+        await record_ideas(session.id, [await _add_idea(db, session, sg1, 1.0)])
+        assert not hashes.data
+
+    async def test_failed_update_drops_the_hash(self, db, hashes):
+        session, (sg1, _) = await _session_with_ideas(db, [[0.2], [0.4]])
+        await get_subgroup_sentiments(db, session.id, fill=True)
+
+        hashes.fail = True
+        await record_ideas(session.id, [await _add_idea(db, session, sg1, 1.0)])
+
+        assert not hashes.data
+
+    async def test_redis_failure_falls_back_to_db(self, db):
+        # conftest leaves get_redis raising
+        session, (sg1, sg2) = await _session_with_ideas(db, [[1.0], [1.0]])
+        assert await compute_convergence(db, session.id, fill=True) == 1.0
+
+
+class TestConvergenceSeries:
+
+    def test_columns_grow_with_new_subgroups(self):
+        a, b = uuid.uuid4(), uuid.uuid4()
+        series = ConvergenceSeries()
+        series.append(1.0, 0.0, {a: 0.5})
+        series.append(2.0, 0.8, {a: 0.4, b: 0.2})
+        series.append(3.0, 0.9, {b: 0.1})
+
+        assert series.since(0.0) == [
+            (1.0, 0.0, {a: 0.5}),
+            (2.0, 0.8, {a: 0.4, b: 0.2}),
+            (3.0, 0.9, {b: 0.1}),
+        ]
+        assert series.since(2.0) == [(3.0, 0.9, {b: 0.1})]
+        assert math.isnan(series.values[-2])
+
+    def test_oldest_half_dropped_when_full(self, monkeypatch):
+        monkeypatch.setattr(convergence, "_MAX_SERIES_POINTS", 4)
+        sg = uuid.uuid4()
+        series = ConvergenceSeries()
+        for i in range(5):
+            series.append(float(i), 0.5, {sg: i / 10})
+
+        assert list(series.times) == [2.0, 3.0, 4.0]
+        assert series.since(3.0) == [(4.0, 0.5, {sg: 0.4})]
+
+
+class TestTrajectory:
+
+    async def test_points_persisted_at_most_once_per_interval(self, db, monkeypatch):
+        monkeypatch.setattr(convergence.settings, "CONVERGENCE_HISTORY_INTERVAL_SECONDS", 60)
+        session, (sg1, _) = await _session_with_ideas(db, [[0.1], [0.2]])
+        start = datetime(2026, 10, 1, tzinfo=timezone.utc).timestamp()
+        for offset in (0, 20, 40, 60):
+            await record_convergence(db, session.id, 0.9, {sg1.id: 0.1}, now=start + offset)
+
+        stored = await get_convergence_points(db, session.id)
+        convergence.clear_local()
+        persisted = await get_convergence_points(db, session.id)
+
+        assert len(stored) == 4
+        assert [p["recorded_at"].timestamp() - start for p in persisted] == [0, 60]
+        assert persisted[0]["sentiments"] == {sg1.id: 0.1}
+
+    async def test_since_returns_only_the_delta(self, db):
+        session, (sg1, _) = await _session_with_ideas(db, [[0.1], [0.2]])
+        start = datetime(2026, 10, 1, tzinfo=timezone.utc).timestamp()
+        first = await record_convergence(db, session.id, 0.5, {sg1.id: 0.1}, now=start)
+        await record_convergence(db, session.id, 0.6, {sg1.id: 0.2}, now=start + 5)
+
+        delta = await get_convergence_points(db, session.id, since=first["recorded_at"])
+
+        assert [p["convergence"] for p in delta] == [0.6]
+        assert await get_convergence_points(db, session.id, since=delta[-1]["recorded_at"]) == []
+
+    async def test_stale_series_keeps_later_persisted_points(self, db):
+        session, (sg1, _) = await _session_with_ideas(db, [[0.1], [0.2]])
+        start = datetime(2026, 10, 1, tzinfo=timezone.utc).timestamp()
+        await record_convergence(db, session.id, 0.5, {sg1.id: 0.1}, now=start)
+        await record_convergence(db, session.id, 0.6, {sg1.id: 0.2}, now=start + 5)
+        # The session is stopped on another worker: a final point lands in
+        # the database while this worker's series stays behind
+        series = convergence._series.pop(session.id)
+        await record_convergence(db, session.id, 0.7, {sg1.id: 0.3}, persist=True, now=start + 30)
+        convergence._series[session.id] = series
+
+        points = await get_convergence_points(db, session.id)
+
+        assert [p["convergence"] for p in points] == [0.5, 0.6, 0.7]
@@ -0,0 +1,93 @@
+"""Tests for app.engine.crosspollination — vectorized challenge rankings."""
+
+import random
+import uuid
+
+from app.engine.crosspollination import CrossPollinationPlan, load_cross_pollination_plan
+from app.models.idea import Idea
+from app.models.session import Session, SessionStatus
+from app.models.subgroup import Subgroup
+
+
+def _idea(subgroup_id, sentiment, support=1, summary=""):
+    return Idea(
+        id=uuid.uuid4(), subgroup_id=subgroup_id, sentiment=sentiment,
+        support_count=support, summary=summary,
+    )
+
+
+def _reference(ideas, subgroup_id, limit):
+    """The per-subgroup ranking computed one subgroup at a time."""
+    own = [i.sentiment for i in ideas if i.subgroup_id == subgroup_id]
+    local = sum(own) / len(own) if own else 0.0
+    foreign = [i for i in ideas if i.subgroup_id != subgroup_id]
+    foreign.sort(key=lambda i: (-abs(i.sentiment - local), -i.support_count))
+    return foreign[:limit]
+
+
+class TestCrossPollinationPlan:
+
+    def test_matches_per_subgroup_ranking(self):
+        rng = random.Random(7)
+        subgroups = [uuid.uuid4() for _ in range(5)]
+        ideas = [
+            _idea(rng.choice(subgroups), round(rng.uniform(-1, 1), 2), rng.randint(1, 3))
+            for _ in range(200)
+        ]
+        plan = CrossPollinationPlan(ideas)
+
+        for sg in subgroups + [uuid.uuid4()]:
+            assert plan.challenging(sg, limit=10) == _reference(ideas, sg, 10)
+
+    def test_own_ideas_never_offered(self):
+        a, b = uuid.uuid4(), uuid.uuid4()
+        ideas = [_idea(a, 0.9), _idea(a, -0.9), _idea(b, 0.1)]
+        plan = CrossPollinationPlan(ideas)
+
+        assert plan.challenging(a, limit=None) == [ideas[2]]
+        assert plan.challenging(b, limit=None) == [ideas[1], ideas[0]]
+
+    def test_ties_go_to_support_then_age(self):
+        a, b = uuid.uuid4(), uuid.uuid4()
+        ideas = [_idea(a, 0.0), _idea(b, 0.5), _idea(b, -0.5, support=3), _idea(b, 0.5)]
+        plan = CrossPollinationPlan(ideas)
+
+        assert plan.challenging(a) == [ideas[2], ideas[1], ideas[3]]
+
+    def test_subgroup_without_ideas_measured_from_neutral(self):
+        a = uuid.uuid4()
+        ideas = [_idea(a, 0.2), _idea(a, -0.7)]
+        plan = CrossPollinationPlan(ideas)
+
+        assert plan.local_mean(uuid.uuid4()) == 0.0
+        assert plan.challenging(uuid.uuid4()) == [ideas[1], ideas[0]]
+
+    def test_excluded_ideas_skipped(self):
+        a, b = uuid.uuid4(), uuid.uuid4()
+        ideas = [_idea(a, 0.0)] + [_idea(b, s) for s in (0.9, 0.7, 0.5, 0.3)]
+        plan = CrossPollinationPlan(ideas)
+
+        got = plan.challenging(a, limit=2, exclude={ideas[1].id, ideas[3].id})
+
+        assert got == [ideas[2], ideas[4]]
+
+    def test_empty_session(self):
+        assert CrossPollinationPlan([]).challenging(uuid.uuid4()) == []
+
+    async def test_loads_session_ideas_once(self, db):
+        session = Session(title="Plan", status=SessionStatus.active)
+        db.add(session)
+        await db.flush()
+        sg1, sg2 = Subgroup(session_id=session.id, label="A"), Subgroup(session_id=session.id, label="B")
+        db.add_all([sg1, sg2])
+        await db.flush()
+        db.add_all([
+            Idea(session_id=session.id, subgroup_id=sg1.id, summary="for", sentiment=0.8),
+            Idea(session_id=session.id, subgroup_id=sg2.id, summary="against", sentiment=-0.6),
+        ])
+        await db.flush()
+
+        plan = await load_cross_pollination_plan(db, session.id)
+
+        assert [i.summary for i in plan.challenging(sg1.id)] == ["against"]
+        assert [i.summary for i in plan.challenging(sg2.id)] == ["for"]
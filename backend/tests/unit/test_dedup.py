@@ -0,0 +1,69 @@
+"""Tests for app.engine.dedup and app.services.embeddings — semantic idea dedup."""
+
+import numpy as np
+import pytest
+
+from app.models.session import Session
+from app.models.subgroup import Subgroup
+from app.models.idea import Idea
+from app.engine.dedup import IdeaIndex, get_session_index
+from app.services.embeddings import HashingEmbedder
+
+
+class TestHashingEmbedder:
+
+    def test_deterministic(self):
+        a = HashingEmbedder().embed(["We should build more parks"])
+        b = HashingEmbedder().embed(["We should build more parks"])
+        assert np.array_equal(a, b)
+
+    def test_rows_are_unit_length(self):
+        vectors = HashingEmbedder().embed(["one idea", "another longer idea here"])
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+    def test_paraphrase_closer_than_unrelated(self):
+        e = HashingEmbedder()
+        base, para, other = e.embed([
+            "We should invest more in public transit",
+            "We should invest more in public transportation",
+            "Taxes on the wealthy should go up",
+        ])
+        assert base @ para > 0.8
+        assert base @ other < 0.3
+
+    def test_empty_text_is_zero_vector(self):
+        assert not HashingEmbedder().embed([""]).any()
+
+
+class TestIdeaIndex:
+
+    def test_nearest_on_empty_index(self):
+        index = IdeaIndex([], np.zeros((0, 8), dtype=np.float32))
+        assert index.nearest(np.ones(8, dtype=np.float32)) == (None, 0.0)
+
+    def test_add_then_find(self):
+        import uuid
+        e = HashingEmbedder()
+        index = IdeaIndex([], np.zeros((0, e.dim), dtype=np.float32))
+        first, second = uuid.uuid4(), uuid.uuid4()
+        index.add(first, e.embed(["ban cars downtown"])[0])
+        index.add(second, e.embed(["fund public libraries"])[0])
+        match, score = index.nearest(e.embed(["fund public libraries"])[0])
+        assert match == second
+        assert score == pytest.approx(1.0)
+
+    async def test_index_rebuilt_when_ideas_change(self, db):
+        session = Session(title="Index")
+        db.add(session)
+        await db.flush()
+        sg = Subgroup(session_id=session.id, label="ThinkTank 1")
+        db.add(sg)
+        await db.flush()
+
+        index = await get_session_index(db, session.id)
+        assert index.size == 0
+
+        db.add(Idea(session_id=session.id, subgroup_id=sg.id, summary="New idea", sentiment=0.0))
+        await db.flush()
+        index = await get_session_index(db, session.id)
+        assert index.size == 1
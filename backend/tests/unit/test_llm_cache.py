@@ -0,0 +1,124 @@
+"""Tests for app.services.llm_cache and its use by app.services.llm."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.services.llm as llm
+import app.services.llm_cache as llm_cache
+from app.services.llm_governor import CallClass
+
+_original_generate_text = llm.generate_text
+_original_generate_json = llm.generate_json
+
+
+class TestCacheKey:
+
+    def test_same_request_same_key(self):
+        assert llm_cache.cache_key("text", "sys", "p") == llm_cache.cache_key("text", "sys", "p")
+
+    def test_mode_system_and_prompt_distinguish(self):
+        keys = {
+            llm_cache.cache_key("text", "sys", "p"),
+            llm_cache.cache_key("json", "sys", "p"),
+            llm_cache.cache_key("text", "other", "p"),
+            llm_cache.cache_key("text", "sys", "q"),
+        }
+        assert len(keys) == 4
+
+    def test_model_distinguishes(self, monkeypatch):
+        before = llm_cache.cache_key("text", "", "p")
+        monkeypatch.setattr("app.config.settings.LLM_MODEL", "other-model")
+        assert llm_cache.cache_key("text", "", "p") != before
+
+
+class TestLocalTier:
+
+    async def test_store_then_hit(self):
+        await llm_cache.store("k", "value", 60)
+        assert await llm_cache.get_cached("k") == "value"
+
+    async def test_zero_ttl_not_stored(self):
+        await llm_cache.store("k", "value", 0)
+        assert await llm_cache.get_cached("k") is None
+
+    async def test_expired_entry_misses(self, monkeypatch):
+        await llm_cache.store("k", "value", 60)
+        now = llm_cache.time.monotonic()
+        monkeypatch.setattr(llm_cache.time, "monotonic", lambda: now + 61)
+        assert await llm_cache.get_cached("k") is None
+
+    async def test_lru_eviction(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.LLM_CACHE_MAX_ENTRIES", 2)
+        await llm_cache.store("a", "1", 60)
+        await llm_cache.store("b", "2", 60)
+        await llm_cache.get_cached("a")  # a is now most recently used
+        await llm_cache.store("c", "3", 60)
+        assert await llm_cache.get_cached("b") is None
+        assert await llm_cache.get_cached("a") == "1"
+        assert await llm_cache.get_cached("c") == "3"
+
+    def test_generative_classes_never_cached(self):
+        for call_class in (CallClass.surrogate, CallClass.contributor, CallClass.bots):
+            assert llm_cache.ttl_for(call_class) == 0
+        assert llm_cache.ttl_for(CallClass.summary) > 0
+
+
+class TestRedisTier:
+
+    async def test_redis_hit_populates_local_tier(self, monkeypatch, mock_redis):
+        monkeypatch.setattr("app.config.settings.LLM_CACHE_REDIS", True)
+        pipe = MagicMock()
+        pipe.execute = AsyncMock(return_value=["from redis", 30])
+        pipe.__aenter__ = AsyncMock(return_value=pipe)
+        pipe.__aexit__ = AsyncMock(return_value=False)
+        mock_redis["redis_client"].pipeline = MagicMock(return_value=pipe)
+        monkeypatch.setattr(llm_cache, "get_redis", AsyncMock(return_value=mock_redis["redis_client"]))
+
+        assert await llm_cache.get_cached("k") == "from redis"
+        assert "k" in llm_cache._entries
+
+    async def test_redis_failure_is_a_miss(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.LLM_CACHE_REDIS", True)
+        monkeypatch.setattr(llm_cache, "get_redis", AsyncMock(side_effect=ConnectionError("down")))
+        assert await llm_cache.get_cached("k") is None
+
+
+class TestGenerateWithCache:
+
+    @pytest.fixture(autouse=True)
+    def _real_llm(self, monkeypatch):
+        monkeypatch.setattr(llm, "generate_text", _original_generate_text)
+        monkeypatch.setattr(llm, "generate_json", _original_generate_json)
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+
+    async def test_repeated_summary_served_from_cache(self, monkeypatch):
+        mock = AsyncMock(return_value="summary")
+        monkeypatch.setattr(llm, "_generate_text_openai", mock)
+        for _ in range(2):
+            assert await llm.generate_text("p", call_class=CallClass.summary) == "summary"
+        assert mock.await_count == 1
+
+    async def test_fresh_bypasses_cache(self, monkeypatch):
+        mock = AsyncMock(side_effect=["first", "second"])
+        monkeypatch.setattr(llm, "_generate_text_openai", mock)
+        await llm.generate_text("p", call_class=CallClass.summary)
+        assert await llm.generate_text("p", call_class=CallClass.summary, fresh=True) == "second"
+        # The fresh answer replaced the cached one
+        assert await llm.generate_text("p", call_class=CallClass.summary) == "second"
+        assert mock.await_count == 2
+
+    async def test_surrogate_calls_not_cached(self, monkeypatch):
+        mock = AsyncMock(return_value="relay")
+        monkeypatch.setattr(llm, "_generate_text_openai", mock)
+        for _ in range(2):
+            await llm.generate_text("p", call_class=CallClass.surrogate)
+        assert mock.await_count == 2
+
+    async def test_malformed_json_not_cached(self, monkeypatch):
+        mock = AsyncMock(side_effect=["not json", '[{"summary": "x"}]'])
+        monkeypatch.setattr(llm, "_generate_json_openai", mock)
+        assert await llm.generate_json("p", call_class=CallClass.taxonomy) == []
+        assert await llm.generate_json("p", call_class=CallClass.taxonomy) == [{"summary": "x"}]
+        assert await llm.generate_json("p", call_class=CallClass.taxonomy) == [{"summary": "x"}]
+        assert mock.await_count == 2
@@ -0,0 +1,154 @@
+"""Tests for app.services.llm_governor — admission, priority, fairness, budgets."""
+
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services import llm_governor
+from app.services.llm_governor import CallClass, LLMGovernor, TokenBucket
+
+
+async def _hold(governor, call_class, session_key, order, release: asyncio.Event, tokens=1):
+    async with governor.slot(call_class, session_key, tokens):
+        order.append((call_class, session_key))
+        await release.wait()
+
+
+class TestTokenBucket:
+
+    def test_starts_full(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(60) == 0.0
+
+    def test_empty_bucket_reports_wait(self):
+        bucket = TokenBucket(60)  # one per second
+        bucket.take(60)
+        assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_oversized_request_clamped_to_capacity(self):
+        bucket = TokenBucket(10)
+        assert bucket.wait_time(1000) == 0.0
+
+
+class TestLLMGovernor:
+
+    async def test_concurrency_cap(self):
+        governor = LLMGovernor("test", max_concurrency=2)
+        release = asyncio.Event()
+        order = []
+        tasks = [asyncio.create_task(_hold(governor, CallClass.default, "s", order, release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert governor.in_flight == 2
+        assert governor.stats()["queued"]["default"] == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert governor.in_flight == 0
+        assert governor.stats()["granted"]["default"] == 3
+
+    async def test_priority_order(self):
+        governor = LLMGovernor("test", max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+        blocker = asyncio.create_task(_hold(governor, CallClass.default, "s", order, release))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(_hold(governor, CallClass.bots, "s", order, release)),
+            asyncio.create_task(_hold(governor, CallClass.contributor, "s", order, release)),
+            asyncio.create_task(_hold(governor, CallClass.summary, "s", order, release)),
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        assert [c for c, _ in order[1:]] == [CallClass.summary, CallClass.contributor, CallClass.bots]
+
+    async def test_round_robin_across_sessions(self):
+        governor = LLMGovernor("test", max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+        blocker = asyncio.create_task(_hold(governor, CallClass.taxonomy, "big", order, release))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(_hold(governor, CallClass.taxonomy, "big", order, release)) for _ in range(3)]
+        tasks.append(asyncio.create_task(_hold(governor, CallClass.taxonomy, "small", order, release)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+        # The small session is served right after the big session's next call, not last
+        assert [s for _, s in order[1:3]] == ["big", "small"]
+
+    async def test_rate_limit_delays_admission(self):
+        governor = LLMGovernor("test", max_concurrency=10, rpm=60)
+        governor.requests.take(60)  # exhaust the bucket
+        release = asyncio.Event()
+        release.set()
+        order = []
+        task = asyncio.create_task(_hold(governor, CallClass.default, "s", order, release))
+        await asyncio.sleep(0.1)
+        assert order == []
+        await asyncio.wait_for(task, timeout=2)
+        assert len(order) == 1
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        governor = LLMGovernor("test", max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+        blocker = asyncio.create_task(_hold(governor, CallClass.default, "s", order, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(governor, CallClass.default, "s", order, release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert governor.stats()["queued"]["default"] == 0
+        release.set()
+        await blocker
+        assert governor.in_flight == 0
+
+
+class _FakeBudget:
+    """Evaluates the admission script's logic against in-memory windows."""
+
+    def __init__(self):
+        self.windows: dict[str, dict[str, int]] = {}
+        self.calls = []
+
+    async def eval(self, script, numkeys, key, rpm, tpm, tokens):
+        self.calls.append(tokens)
+        window = self.windows.setdefault(key, {"requests": 0, "tokens": 0})
+        if (rpm and window["requests"] + 1 > rpm) or (tpm and window["tokens"] + tokens > tpm):
+            return 0
+        window["requests"] += 1
+        window["tokens"] += tokens
+        return 1
+
+
+class TestClusterAdmission:
+
+    @pytest.fixture
+    def budget(self, monkeypatch):
+        fake = _FakeBudget()
+        monkeypatch.setattr(llm_governor, "get_redis", AsyncMock(return_value=fake))
+        monkeypatch.setattr(llm_governor.settings, "LLM_GOVERNOR_REDIS", True)
+        monkeypatch.setattr(llm_governor.settings, "LLM_RPM", 10)
+        monkeypatch.setattr(llm_governor.settings, "LLM_TPM", 1000)
+        return fake
+
+    async def test_oversized_call_is_clamped_to_a_window(self, budget):
+        await asyncio.wait_for(llm_governor.admit_cluster("openai", 50_000), 1)
+        assert budget.calls == [1000]
+
+    async def test_rejected_attempt_does_not_use_budget(self, budget, monkeypatch):
+        await llm_governor.admit_cluster("openai", 900)
+        waits = []
+
+        async def next_window(seconds):
+            # The rejected attempt left the full window as it was
+            waits.append(list(budget.windows.values()))
+            # The next minute starts with a fresh window
+            budget.windows.clear()
+
+        monkeypatch.setattr(llm_governor.asyncio, "sleep", next_window)
+        await llm_governor.admit_cluster("openai", 200)
+
+        assert waits == [[{"requests": 1, "tokens": 900}]]
+        assert list(budget.windows.values()) == [{"requests": 1, "tokens": 200}]
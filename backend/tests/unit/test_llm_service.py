@@ -10,6 +10,7 @@ import app.services.llm as llm
 # Save originals at import time (before autouse mocks patch them during tests)
 _original_generate_text = llm.generate_text
 _original_generate_json = llm.generate_json
+_original_stream_text = llm.stream_text
 
 
 class TestParseJson:
@@ -165,3 +166,132 @@ class TestClientSingletons:
             first = llm._get_openai_client()
             second = llm._get_openai_client()
             assert first is second
+
+
+class TestCoalescing:
+    """Identical concurrent requests share a single provider call."""
+
+    async def test_identical_requests_share_one_call(self, monkeypatch):
+        import asyncio
+
+        monkeypatch.setattr(llm, "generate_text", _original_generate_text)
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+        started = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def slow(prompt, system_instruction):
+            started.set()
+            await finish.wait()
+            return "shared"
+
+        mock = AsyncMock(side_effect=slow)
+        monkeypatch.setattr(llm, "_generate_text_openai", mock)
+        first = asyncio.create_task(llm.generate_text("same prompt"))
+        await started.wait()
+        second = asyncio.create_task(llm.generate_text("same prompt"))
+        await asyncio.sleep(0)
+        finish.set()
+        assert await asyncio.gather(first, second) == ["shared", "shared"]
+        assert mock.await_count == 1
+
+    async def test_failure_propagates_to_all_waiters(self, monkeypatch):
+        import asyncio
+
+        monkeypatch.setattr(llm, "generate_text", _original_generate_text)
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+        started = asyncio.Event()
+
+        async def failing(prompt, system_instruction):
+            started.set()
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+
+        monkeypatch.setattr(llm, "_generate_text_openai", AsyncMock(side_effect=failing))
+        first = asyncio.create_task(llm.generate_text("p"))
+        await started.wait()
+        second = asyncio.create_task(llm.generate_text("p"))
+        results = await asyncio.gather(first, second, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+class TestClusterAdmission:
+    """Waiting on the shared Redis budget never holds a local governor slot."""
+
+    async def test_generate_admits_before_taking_a_slot(self, monkeypatch):
+        monkeypatch.setattr(llm, "generate_text", _original_generate_text)
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+        monkeypatch.setattr(llm, "_generate_text_openai", AsyncMock(return_value="ok"))
+        in_flight = []
+
+        async def admit(provider, tokens):
+            in_flight.append(llm.get_governor(provider).in_flight)
+
+        monkeypatch.setattr(llm, "admit_cluster", admit)
+        assert await llm.generate_text("admitted", fresh=True) == "ok"
+        assert in_flight == [0]
+
+    async def test_stream_admits_before_taking_a_slot(self, monkeypatch):
+        monkeypatch.setattr(llm, "stream_text", _original_stream_text)
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+        in_flight = []
+
+        async def admit(provider, tokens):
+            in_flight.append(llm.get_governor(provider).in_flight)
+
+        async def stream(prompt, system_instruction):
+            yield "chunk"
+
+        monkeypatch.setattr(llm, "admit_cluster", admit)
+        monkeypatch.setattr(llm, "_dispatch_stream", stream)
+        assert [c async for c in llm.stream_text("prompt")] == ["chunk"]
+        assert in_flight == [0]
+
+
+class TestStreamText:
+    """stream_text yields provider chunks through the selected backend."""
+
+    @pytest.fixture(autouse=True)
+    def _real_stream(self, monkeypatch):
+        monkeypatch.setattr(llm, "stream_text", _original_stream_text)
+
+    async def test_openai_stream(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "openai")
+
+        def chunk(text):
+            return MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+
+        async def events():
+            for c in (chunk("Hel"), chunk(None), chunk("lo"), MagicMock(choices=[])):
+                yield c
+
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(return_value=events())
+        monkeypatch.setattr(llm, "_get_openai_client", lambda: client)
+
+        chunks = [c async for c in llm.stream_text("prompt", "system")]
+        assert chunks == ["Hel", "lo"]
+        kwargs = client.chat.completions.create.call_args.kwargs
+        assert kwargs["stream"] is True
+        assert kwargs["messages"][0] == {"role": "system", "content": "system"}
+
+    async def test_anthropic_stream(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "anthropic")
+
+        async def text_stream():
+            for t in ("a", "b"):
+                yield t
+
+        stream = MagicMock(text_stream=text_stream())
+        manager = MagicMock()
+        manager.__aenter__ = AsyncMock(return_value=stream)
+        manager.__aexit__ = AsyncMock(return_value=False)
+        client = MagicMock()
+        client.messages.stream = MagicMock(return_value=manager)
+        monkeypatch.setattr(llm, "_get_anthropic_client", lambda: client)
+
+        assert [c async for c in llm.stream_text("prompt")] == ["a", "b"]
+
+    async def test_unknown_provider_raises(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.LLM_PROVIDER", "nope")
+        with pytest.raises(ValueError, match="Unknown LLM_PROVIDER"):
+            [c async for c in llm.stream_text("prompt")]
@@ -0,0 +1,204 @@
+"""Tests for app.services.presence — cluster-wide presence in Redis sorted sets."""
+
+import asyncio
+import time
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.services.presence as presence_module
+from app.services.presence import PresenceTracker, get_online_counts, presence_key
+
+# Save originals at import time (before autouse mocks patch them during tests)
+_original_get_subgroup_online_counts = presence_module.get_subgroup_online_counts
+
+
+class _FakeZSets:
+    """Just enough of a Redis client for presence: sorted sets behind a pipeline."""
+
+    def __init__(self):
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    def pipeline(self, **kwargs):
+        return _FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        zset = self.zsets.setdefault(key, {})
+        added = sum(1 for member in mapping if member not in zset)
+        zset.update(mapping)
+        return added
+
+    def zrem(self, key, member):
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        stale = [m for m, score in zset.items() if score <= high]
+        for member in stale:
+            del zset[member]
+        return len(stale)
+
+    def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def zrange(self, key, start, end):
+        return list(self.zsets.get(key, {}))
+
+    def expire(self, key, ttl):
+        return True
+
+
+class _FakePipeline:
+
+    def __init__(self, redis: _FakeZSets):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def zsets(monkeypatch):
+    fake = _FakeZSets()
+    monkeypatch.setattr(presence_module, "get_redis", AsyncMock(return_value=fake))
+    return fake
+
+
+@pytest.fixture
+def publish(monkeypatch):
+    mock = AsyncMock()
+    monkeypatch.setattr(presence_module, "publish_to_session", mock)
+    return mock
+
+
+class TestPresenceTracker:
+
+    async def test_first_socket_marks_user_online(self, zsets, publish):
+        tracker = PresenceTracker()
+        sg_id, sess_id, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+        await tracker.join("subgroup", sg_id, user_id, sess_id)
+
+        assert tracker._member(user_id) in zsets.zsets[presence_key("subgroup", sg_id)]
+        publish.assert_awaited_once_with(
+            sess_id,
+            "presence:changed",
+            {"session_id": str(sess_id), "subgroup_id": str(sg_id), "online": 1},
+        )
+
+    async def test_second_socket_of_same_user_is_silent(self, zsets, publish):
+        tracker = PresenceTracker()
+        sg_id, sess_id, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        await tracker.join("subgroup", sg_id, user_id, sess_id)
+        await tracker.join("subgroup", sg_id, user_id, sess_id)
+
+        tracker.leave("subgroup", sg_id, user_id)
+        await asyncio.gather(*tracker._tasks)
+
+        assert publish.await_count == 1
+        assert zsets.zcard(presence_key("subgroup", sg_id)) == 1
+
+    async def test_last_socket_leaving_marks_user_offline(self, zsets, publish):
+        tracker = PresenceTracker()
+        sess_id, user_id = uuid.uuid4(), uuid.uuid4()
+        await tracker.join("session", sess_id, user_id, sess_id)
+
+        tracker.leave("session", sess_id, user_id)
+        await asyncio.gather(*tracker._tasks)
+
+        assert zsets.zcard(presence_key("session", sess_id)) == 0
+        assert publish.call_args[0][2] == {"session_id": str(sess_id), "subgroup_id": None, "online": 0}
+        assert tracker.local == {}
+
+    async def test_leave_on_one_worker_keeps_user_online_on_another(self, zsets, publish):
+        first, second = PresenceTracker(), PresenceTracker()
+        sg_id, sess_id, user_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        await first.join("subgroup", sg_id, user_id, sess_id)
+        await second.join("subgroup", sg_id, user_id, sess_id)
+
+        first.leave("subgroup", sg_id, user_id)
+        await asyncio.gather(*first._tasks)
+
+        counts = await get_online_counts("subgroup", [sg_id])
+        assert counts == {sg_id: 1}
+        # Only the first join brought the user online; nothing changed since
+        assert publish.await_count == 1
+
+    async def test_first_user_back_in_subgroup_resumes_it(self, zsets, publish):
+        tracker = PresenceTracker()
+        tracker.on_subgroup_online = AsyncMock()
+        sg_id, sess_id = uuid.uuid4(), uuid.uuid4()
+
+        await tracker.join("subgroup", sg_id, uuid.uuid4(), sess_id)
+        await tracker.join("subgroup", sg_id, uuid.uuid4(), sess_id)
+        await tracker.join("session", sess_id, uuid.uuid4(), sess_id)
+
+        tracker.on_subgroup_online.assert_awaited_once_with(sess_id, sg_id)
+
+    async def test_redis_failure_does_not_break_connect(self, monkeypatch, publish):
+        monkeypatch.setattr(presence_module, "get_redis", AsyncMock(side_effect=ConnectionError("down")))
+        tracker = PresenceTracker()
+        await tracker.join("subgroup", uuid.uuid4(), uuid.uuid4(), uuid.uuid4())
+        publish.assert_not_awaited()
+
+    async def test_heartbeat_refreshes_scores(self, zsets, publish):
+        tracker = PresenceTracker()
+        sg_id, user_id = uuid.uuid4(), uuid.uuid4()
+        await tracker.join("subgroup", sg_id, user_id, None)
+        zsets.zsets[presence_key("subgroup", sg_id)][tracker._member(user_id)] = 0.0
+
+        await tracker.heartbeat()
+
+        assert zsets.zsets[presence_key("subgroup", sg_id)][tracker._member(user_id)] > time.time() - 5
+
+
+class TestOnlineCounts:
+
+    async def test_counts_across_workers_and_prunes_stale(self, zsets, monkeypatch):
+        monkeypatch.setattr(
+            presence_module, "get_subgroup_online_counts", _original_get_subgroup_online_counts
+        )
+        busy, quiet = uuid.uuid4(), uuid.uuid4()
+        now = time.time()
+        # Two workers' users in one subgroup, plus one whose worker died long ago
+        zsets.zsets[presence_key("subgroup", busy)] = {
+            "w1:a": now, "w2:b": now, "w2:a": now, "w0:ghost": now - 3600,
+        }
+
+        counts = await presence_module.get_subgroup_online_counts([busy, quiet])
+
+        assert counts == {busy: 2, quiet: 0}
+
+    async def test_no_keys_no_round_trip(self, monkeypatch):
+        get_redis = AsyncMock()
+        monkeypatch.setattr(presence_module, "get_redis", get_redis)
+        assert await get_online_counts("subgroup", []) == {}
+        get_redis.assert_not_awaited()
+
+
+class TestManagerReportsPresence:
+
+    async def test_join_and_leave_forwarded(self):
+        from app.websocket.manager import ConnectionManager
+
+        mgr = ConnectionManager()
+        mgr.presence = MagicMock(join=AsyncMock(), leave=MagicMock())
+        ws = AsyncMock()
+        user_id, sg_id, sess_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+        await mgr.connect_to_subgroup(ws, user_id, sg_id, sess_id)
+        mgr.disconnect(user_id, websocket=ws)
+
+        mgr.presence.join.assert_awaited_once_with("subgroup", sg_id, user_id, sess_id)
+        mgr.presence.leave.assert_called_once_with("subgroup", sg_id, user_id)
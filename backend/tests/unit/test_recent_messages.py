@@ -0,0 +1,282 @@
+"""Tests for app.engine.recent_messages — per-subgroup recent-message buffers."""
+
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from redis.exceptions import WatchError
+
+import app.engine.recent_messages as recent
+from app.engine.recent_messages import get_recent_messages, record_message
+from app.models.message import Message, MessageType
+from app.models.session import Session, SessionStatus
+from app.models.subgroup import Subgroup
+from app.websocket.write_behind import MessageWriter, message_row
+
+
+class _FakeLists:
+    """Just enough of a Redis client for the buffer: lists and plain keys."""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+        self.version: dict[str, int] = {}
+
+    def pipeline(self, **kwargs):
+        return _FakePipeline(self)
+
+    def _touch(self, key):
+        self.version[key] = self.version.get(key, 0) + 1
+
+    def lpush(self, key, *values):
+        self.data.setdefault(key, [])[:0] = reversed(values)
+        self._touch(key)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        self._touch(key)
+
+    def ltrim(self, key, start, end):
+        if key in self.data:
+            self.data[key] = self.data[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+        self._touch(key)
+
+    def expire(self, key, ttl):
+        return key in self.data
+
+
+class _FakePipeline:
+
+    def __init__(self, redis: _FakeLists):
+        self.redis = redis
+        self.calls = []
+        self.watched: dict[str, int] = {}
+        self.immediate = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, key):
+        self.watched[key] = self.redis.version.get(key, 0)
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        if self.immediate:
+            async def run(*args, **kwargs):
+                return getattr(self.redis, name)(*args, **kwargs)
+            return run
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        if any(self.redis.version.get(k, 0) != v for k, v in self.watched.items()):
+            raise WatchError("watched key changed")
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+@pytest.fixture
+def lists(monkeypatch):
+    fake = _FakeLists()
+    monkeypatch.setattr(recent, "get_redis", AsyncMock(return_value=fake))
+    return fake
+
+
+async def _subgroup_with_messages(db, count):
+    session = Session(title="Buffered", status=SessionStatus.active)
+    db.add(session)
+    await db.flush()
+    sg = Subgroup(session_id=session.id, label="ThinkTank 1")
+    db.add(sg)
+    await db.flush()
+    start = datetime(2026, 1, 1)
+    messages = []
+    for i in range(count):
+        m = Message(
+            subgroup_id=sg.id, content=f"m{i}", msg_type=MessageType.human,
+            created_at=start + timedelta(seconds=i),
+        )
+        db.add(m)
+        messages.append(m)
+    await db.flush()
+    return sg, messages
+
+
+class TestRedisBuffer:
+
+    async def test_cold_read_fills_from_db_then_serves_from_redis(self, db, lists):
+        sg, messages = await _subgroup_with_messages(db, 3)
+
+        first = await get_recent_messages(db, sg.id, 2)
+        reads_after_fill = recent._counters["db_reads"]
+        second = await get_recent_messages(db, sg.id, 2)
+
+        assert [m.content for m in first] == ["m2", "m1"]
+        assert [m.content for m in second] == ["m2", "m1"]
+        assert recent._counters["db_reads"] == reads_after_fill
+
+    async def test_pushes_reach_warm_buffer_and_are_bounded(self, db, lists, monkeypatch):
+        monkeypatch.setattr(recent.settings, "RECENT_MESSAGES_SIZE", 3)
+        sg, messages = await _subgroup_with_messages(db, 3)
+        await get_recent_messages(db, sg.id, 3)
+
+        new = Message(
+            subgroup_id=sg.id, content="m3", msg_type=MessageType.contributor,
+            created_at=messages[-1].created_at + timedelta(seconds=1),
+        )
+        db.add(new)
+        await db.flush()
+        await record_message(new)
+
+        got = await get_recent_messages(db, sg.id, 3)
+        assert [m.content for m in got] == ["m3", "m2", "m1"]
+        assert got[0].msg_type == MessageType.contributor
+        assert got[0].id == new.id
+
+    async def test_after_filters_past_watermark(self, db, lists):
+        sg, messages = await _subgroup_with_messages(db, 4)
+        await get_recent_messages(db, sg.id, 1)
+
+        got = await get_recent_messages(
+            db, sg.id, 10, after=(messages[1].created_at, messages[1].id)
+        )
+        assert [m.content for m in got] == ["m3", "m2"]
+
+    async def test_out_of_order_pushes_served_newest_first(self, db, lists):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        await get_recent_messages(db, sg.id, 1)
+
+        # Two writers: the later message is pushed first
+        late = Message(
+            subgroup_id=sg.id, content="m3", msg_type=MessageType.human,
+            created_at=messages[-1].created_at + timedelta(seconds=2),
+        )
+        early = Message(
+            subgroup_id=sg.id, content="m2", msg_type=MessageType.human,
+            created_at=messages[-1].created_at + timedelta(seconds=1),
+        )
+        db.add_all([late, early])
+        await db.flush()
+        await record_message(late)
+        await record_message(early)
+
+        got = await get_recent_messages(db, sg.id, 3)
+        assert [m.content for m in got] == ["m3", "m2", "m1"]
+
+    async def test_push_during_fill_leaves_buffer_cold(self, db, lists, monkeypatch):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        real_query = recent._query
+
+        async def query_then_push(*args, **kwargs):
+            result = await real_query(*args, **kwargs)
+            lists.lpush(recent._list_key(sg.id), "racing push")
+            return result
+
+        monkeypatch.setattr(recent, "_query", query_then_push)
+        got = await get_recent_messages(db, sg.id, 5)
+
+        assert [m.content for m in got] == ["m1", "m0"]
+        assert not lists.exists(recent._warm_key(sg.id))
+
+    async def test_push_to_cold_buffer_is_not_served(self, db, lists):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        await record_message(messages[-1])
+
+        got = await get_recent_messages(db, sg.id, 5)
+        assert [m.content for m in got] == ["m1", "m0"]
+
+    async def test_fill_keeps_pushed_messages_not_stored_yet(self, db, lists):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        # Published in fast mode, still pending in the write-behind writer
+        pending = Message(
+            id=uuid.uuid4(), subgroup_id=sg.id, content="m2", msg_type=MessageType.human,
+            created_at=messages[-1].created_at + timedelta(seconds=1),
+        )
+        await record_message(pending)
+
+        got = await get_recent_messages(db, sg.id, 5)
+        cached = await get_recent_messages(db, sg.id, 5)
+
+        assert [m.content for m in got] == ["m2", "m1", "m0"]
+        assert [m.content for m in cached] == ["m2", "m1", "m0"]
+
+    async def test_redis_failure_falls_back_to_db(self, db):
+        # conftest leaves get_redis raising
+        sg, messages = await _subgroup_with_messages(db, 2)
+        got = await get_recent_messages(db, sg.id, 5)
+        assert [m.content for m in got] == ["m1", "m0"]
+
+
+class TestLocalBuffer:
+
+    @pytest.fixture(autouse=True)
+    def _local_mode(self, monkeypatch):
+        monkeypatch.setattr(recent.settings, "RECENT_MESSAGES_REDIS", False)
+
+    async def test_warm_buffer_serves_without_db(self, db):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        await get_recent_messages(db, sg.id, 5)
+        reads = recent._counters["db_reads"]
+
+        new = Message(
+            subgroup_id=sg.id, content="m2", msg_type=MessageType.human,
+            created_at=messages[-1].created_at + timedelta(seconds=1),
+        )
+        db.add(new)
+        await db.flush()
+        await record_message(new)
+        got = await get_recent_messages(db, sg.id, 5)
+
+        assert [m.content for m in got] == ["m2", "m1", "m0"]
+        assert recent._counters["db_reads"] == reads
+
+    async def test_fill_merges_rows_pending_write_behind(self, db, monkeypatch):
+        sg, messages = await _subgroup_with_messages(db, 2)
+        writer = MessageWriter()
+        monkeypatch.setattr(recent, "message_writer", writer)
+        pending = Message(
+            id=uuid.uuid4(), subgroup_id=sg.id, user_id=None, content="m2",
+            msg_type=MessageType.human, source_subgroup_id=None,
+            created_at=messages[-1].created_at + timedelta(seconds=1),
+        )
+        await writer.enqueue(message_row(pending))
+        await writer.enqueue({**message_row(pending), "id": uuid.uuid4(), "subgroup_id": uuid.uuid4()})
+
+        got = await get_recent_messages(db, sg.id, 5)
+
+        assert [m.content for m in got] == ["m2", "m1", "m0"]
+
+    async def test_least_recently_used_buffers_evicted(self, db, monkeypatch):
+        monkeypatch.setattr(recent.settings, "RECENT_MESSAGES_MAX_SUBGROUPS", 1)
+        sg1, _ = await _subgroup_with_messages(db, 1)
+        sg2, _ = await _subgroup_with_messages(db, 1)
+
+        await get_recent_messages(db, sg1.id, 1)
+        await get_recent_messages(db, sg2.id, 1)
+
+        assert list(recent._local) == [sg2.id]
+
+    async def test_limit_beyond_buffer_reads_db(self, db, monkeypatch):
+        monkeypatch.setattr(recent.settings, "RECENT_MESSAGES_SIZE", 2)
+        sg, messages = await _subgroup_with_messages(db, 3)
+
+        got = await get_recent_messages(db, sg.id, 3)
+
+        assert [m.content for m in got] == ["m2", "m1", "m0"]
+        assert sg.id not in recent._local
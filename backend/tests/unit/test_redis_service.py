@@ -0,0 +1,139 @@
+"""Tests for app.services.redis — batched publishing and targeted subscriptions."""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import app.services.redis as redis_service
+from app.services.redis import PublishBatcher, RedisSubscriber
+
+# Save originals at import time (before autouse mocks patch them during tests)
+_original_publish_to_session = redis_service.publish_to_session
+
+
+class _FakePipeline:
+    """Records publishes; execute() sends them to the shared log as one batch."""
+
+    def __init__(self, log: list, fail: bool):
+        self.log = log
+        self.fail = fail
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def publish(self, channel, payload):
+        self.queued.append((channel, payload))
+
+    async def execute(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.log.append(list(self.queued))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    batches = []
+    state = {"fail": False}
+    client = MagicMock()
+    client.pipeline = MagicMock(side_effect=lambda **kw: _FakePipeline(batches, state["fail"]))
+    monkeypatch.setattr("app.services.redis.get_redis", AsyncMock(return_value=client))
+    return batches, state
+
+
+class TestPublishBatcher:
+
+    async def test_concurrent_publishes_share_one_pipeline(self, fake_redis):
+        batches, _ = fake_redis
+        batcher = PublishBatcher(window=0)
+
+        await asyncio.gather(*(batcher.publish(f"subgroup:{i}", str(i)) for i in range(100)))
+
+        assert len(batches) == 1
+        assert len(batches[0]) == 100
+        assert batcher.stats()["batches"] == 1
+
+    async def test_order_preserved_per_channel(self, fake_redis):
+        batches, _ = fake_redis
+        batcher = PublishBatcher(window=0)
+
+        async def stream(channel):
+            for n in range(5):
+                await batcher.publish(channel, str(n))
+
+        await asyncio.gather(stream("subgroup:a"), stream("subgroup:b"))
+
+        sent = [item for batch in batches for item in batch]
+        for channel in ("subgroup:a", "subgroup:b"):
+            assert [p for c, p in sent if c == channel] == ["0", "1", "2", "3", "4"]
+
+    async def test_failure_raised_to_publishers(self, fake_redis):
+        _, state = fake_redis
+        state["fail"] = True
+        batcher = PublishBatcher(window=0)
+
+        with pytest.raises(ConnectionError):
+            await batcher.publish("session:x", "{}")
+
+        # A later batch is unaffected once Redis is back
+        state["fail"] = False
+        await batcher.publish("session:x", "{}")
+        assert batcher.stats()["published"] == 1
+
+    async def test_publish_to_session_serializes_uuid(self, fake_redis, monkeypatch):
+        import uuid
+
+        batches, _ = fake_redis
+        monkeypatch.setattr(redis_service, "_batcher", PublishBatcher(window=0))
+        # Undo the autouse mock for this module's own function
+        monkeypatch.setattr(redis_service, "publish_to_session", _original_publish_to_session)
+
+        sid = uuid.uuid4()
+        await redis_service.publish_to_session(sid, "session:convergence", {"id": sid})
+
+        channel, payload = batches[0][0]
+        assert channel == f"session:{sid}"
+        assert json.loads(payload) == {"event": "session:convergence", "data": {"id": str(sid)}}
+
+
+class TestRedisSubscriber:
+
+    @pytest.fixture
+    def sub(self):
+        sub = RedisSubscriber()
+        sub._pubsub = MagicMock()
+        sub._pubsub.subscribe = AsyncMock()
+        sub._pubsub.unsubscribe = AsyncMock()
+        return sub
+
+    async def test_add_subscribes_once(self, sub):
+        await sub.add("subgroup:a")
+        await sub.add("subgroup:a")
+        sub._pubsub.subscribe.assert_awaited_once_with("subgroup:a")
+        assert sub.subscribed == {"subgroup:a"}
+
+    async def test_discard_unsubscribes_in_background(self, sub):
+        await sub.add("subgroup:a")
+        sub.discard("subgroup:a")
+        await asyncio.gather(*sub._tasks)
+        sub._pubsub.unsubscribe.assert_awaited_once_with("subgroup:a")
+        assert sub.subscribed == set()
+
+    async def test_rejoin_before_unsubscribe_keeps_channel(self, sub):
+        await sub.add("subgroup:a")
+        sub.discard("subgroup:a")
+        await sub.add("subgroup:a")
+        await asyncio.gather(*sub._tasks)
+        sub._pubsub.unsubscribe.assert_not_awaited()
+        assert sub.subscribed == {"subgroup:a"}
+
+    async def test_channels_added_before_start_are_remembered(self):
+        sub = RedisSubscriber()
+        await sub.add("session:s")
+        assert sub.wanted == {"session:s"}
+        assert sub.subscribed == set()
@@ -0,0 +1,122 @@
+"""Tests for app.engine.sharding — session sharding and shard leases."""
+
+import uuid
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.engine.sharding import (
+    ShardLeases,
+    session_shard,
+    shard_owner,
+    shard_key,
+    acquire_shard_lease,
+    renew_shard_lease,
+    release_shard_lease,
+)
+
+
+def _mock_pipeline(redis_client, workers):
+    """Make redis_client.pipeline() an async context manager returning `workers`."""
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[1, 0, workers])
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(return_value=pipe)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    redis_client.pipeline = MagicMock(return_value=ctx)
+
+
+class TestConsistentHashing:
+
+    def test_session_shard_is_stable(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_SHARDS", 16)
+        sid = uuid.uuid4()
+        assert session_shard(sid) == session_shard(sid)
+        assert 0 <= session_shard(sid) < 16
+
+    def test_owner_is_one_of_the_workers(self):
+        workers = ["w1", "w2", "w3"]
+        assert shard_owner(5, workers) in workers
+
+    def test_no_workers_no_owner(self):
+        assert shard_owner(0, []) is None
+
+    def test_removing_a_worker_only_moves_its_shards(self):
+        workers = ["w1", "w2", "w3", "w4"]
+        before = {s: shard_owner(s, workers) for s in range(256)}
+        after = {s: shard_owner(s, ["w1", "w2", "w3"]) for s in range(256)}
+        moved = {s for s in range(256) if before[s] != after[s]}
+        assert moved == {s for s in range(256) if before[s] == "w4"}
+
+    def test_shards_spread_across_workers(self):
+        workers = ["w1", "w2", "w3", "w4"]
+        owners = {shard_owner(s, workers) for s in range(64)}
+        assert owners == set(workers)
+
+
+class TestShardLease:
+
+    async def test_acquire_lease_success(self, mock_redis):
+        mock_redis["redis_client"].set = AsyncMock(return_value=True)
+        assert await acquire_shard_lease(3, "worker-1") is True
+
+    async def test_acquire_lease_failure(self, mock_redis):
+        """Lease is not acquired when another worker holds it."""
+        mock_redis["redis_client"].set = AsyncMock(return_value=None)
+        assert await acquire_shard_lease(3, "worker-2") is False
+
+    async def test_renew_lease_when_owner(self, mock_redis):
+        mock_redis["redis_client"].get = AsyncMock(return_value="worker-1")
+        mock_redis["redis_client"].expire = AsyncMock(return_value=True)
+        assert await renew_shard_lease(3, "worker-1") is True
+        mock_redis["redis_client"].expire.assert_awaited_once()
+
+    async def test_renew_lease_lost_ownership(self, mock_redis):
+        mock_redis["redis_client"].get = AsyncMock(return_value="worker-other")
+        assert await renew_shard_lease(3, "worker-1") is False
+
+    async def test_release_lease_when_owner(self, mock_redis):
+        mock_redis["redis_client"].get = AsyncMock(return_value="worker-1")
+        await release_shard_lease(3, "worker-1")
+        mock_redis["redis_client"].delete.assert_awaited_once_with(shard_key(3))
+
+    async def test_release_lease_not_owner(self, mock_redis):
+        mock_redis["redis_client"].get = AsyncMock(return_value="worker-other")
+        await release_shard_lease(3, "worker-1")
+        mock_redis["redis_client"].delete.assert_not_awaited()
+
+
+class TestRebalance:
+
+    async def test_sole_worker_acquires_every_shard(self, mock_redis, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_SHARDS", 8)
+        _mock_pipeline(mock_redis["redis_client"], ["worker-1"])
+        mock_redis["redis_client"].set = AsyncMock(return_value=True)
+
+        leases = ShardLeases("worker-1")
+        await leases.rebalance()
+        assert leases.owned == set(range(8))
+
+    async def test_releases_shards_assigned_to_new_worker(self, mock_redis, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_SHARDS", 8)
+        client = mock_redis["redis_client"]
+        client.set = AsyncMock(return_value=True)
+        client.get = AsyncMock(return_value="worker-1")
+
+        leases = ShardLeases("worker-1")
+        _mock_pipeline(client, ["worker-1"])
+        await leases.rebalance()
+
+        _mock_pipeline(client, ["worker-1", "worker-2"])
+        await leases.rebalance()
+        expected = {s for s in range(8) if shard_owner(s, ["worker-1", "worker-2"]) == "worker-1"}
+        assert leases.owned == expected
+        assert client.delete.await_count == 8 - len(expected)
+
+    async def test_owns_session_follows_shard(self, monkeypatch):
+        monkeypatch.setattr("app.config.settings.CME_SHARDS", 8)
+        sid = uuid.uuid4()
+        leases = ShardLeases("worker-1")
+        assert leases.owns_session(sid) is False
+        leases.owned.add(session_shard(sid))
+        assert leases.owns_session(sid) is True
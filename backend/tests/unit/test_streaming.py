@@ -0,0 +1,112 @@
+"""Tests for app.engine.streaming — streamed agent message delivery."""
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.engine.streaming import stream_agent_message
+from app.models.message import Message, MessageType
+from app.models.session import Session
+from app.models.subgroup import Subgroup
+from app.services.llm_governor import CallClass
+
+
+async def _setup(db):
+    session = Session(title="Test")
+    db.add(session)
+    await db.flush()
+    sg = Subgroup(session_id=session.id, label="ThinkTank 1")
+    db.add(sg)
+    await db.flush()
+    return session, sg
+
+
+def _stream_of(*chunks, error: Exception | None = None):
+    async def stream(prompt, system_instruction="", **kwargs):
+        for chunk in chunks:
+            yield chunk
+        if error:
+            raise error
+    return stream
+
+
+async def _deliver(db, session, sg):
+    return await stream_agent_message(
+        db, session, sg, "prompt",
+        msg_type=MessageType.surrogate,
+        display_name="Surrogate Agent",
+        call_class=CallClass.surrogate,
+    )
+
+
+class TestStreamAgentMessage:
+
+    async def test_chunks_published_then_message_stored_once(self, db, mock_redis, monkeypatch):
+        session, sg = await _setup(db)
+        monkeypatch.setattr("app.engine.streaming.stream_text", _stream_of("Hello", " there", "!  "))
+
+        message = await _deliver(db, session, sg)
+
+        calls = mock_redis["publish_to_subgroup"].call_args_list
+        assert [c[0][1] for c in calls] == ["chat:message_delta"] * 3 + ["chat:message_done"]
+        assert [c[0][2]["delta"] for c in calls[:3]] == ["Hello", " there", "!  "]
+        assert {c[0][2]["id"] for c in calls} == {str(message.id)}
+        assert calls[-1][0][2]["content"] == "Hello there!"
+
+        result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
+        stored = result.scalars().all()
+        assert len(stored) == 1
+        assert stored[0].content == "Hello there!"
+
+    async def test_created_at_stamped_when_stream_completes(self, db, mock_redis, monkeypatch):
+        session, sg = await _setup(db)
+        started = datetime.now(timezone.utc)
+
+        async def slow_stream(prompt, system_instruction="", **kwargs):
+            yield "Hello"
+            # A human message sent while the agent is still typing
+            db.add(Message(subgroup_id=sg.id, content="hi", msg_type=MessageType.human,
+                           created_at=datetime.now(timezone.utc)))
+            yield " there"
+
+        monkeypatch.setattr("app.engine.streaming.stream_text", slow_stream)
+        message = await _deliver(db, session, sg)
+
+        assert message.created_at >= started
+        result = await db.execute(
+            select(Message).where(Message.subgroup_id == sg.id)
+            .order_by(Message.created_at.desc())
+        )
+        assert result.scalars().first().id == message.id
+
+    async def test_failure_mid_stream_discards_partial(self, db, mock_redis, monkeypatch):
+        session, sg = await _setup(db)
+        monkeypatch.setattr(
+            "app.engine.streaming.stream_text",
+            _stream_of("Partial", error=RuntimeError("connection reset")),
+        )
+
+        assert await _deliver(db, session, sg) is None
+
+        last = mock_redis["publish_to_subgroup"].call_args_list[-1][0]
+        assert last[1] == "chat:message_done"
+        assert last[2]["discarded"] is True
+        result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
+        assert result.scalars().all() == []
+
+    async def test_whitespace_only_stream_discarded(self, db, mock_redis, monkeypatch):
+        session, sg = await _setup(db)
+        monkeypatch.setattr("app.engine.streaming.stream_text", _stream_of("  ", "\n"))
+
+        assert await _deliver(db, session, sg) is None
+        assert mock_redis["publish_to_subgroup"].call_args_list[-1][0][2]["discarded"] is True
+
+    async def test_failure_before_first_chunk_publishes_nothing(self, db, mock_redis, monkeypatch):
+        session, sg = await _setup(db)
+        monkeypatch.setattr(
+            "app.engine.streaming.stream_text", _stream_of(error=RuntimeError("LLM down"))
+        )
+
+        assert await _deliver(db, session, sg) is None
+        mock_redis["publish_to_subgroup"].assert_not_awaited()
@@ -28,7 +28,7 @@ class TestDeliverSurrogateMessage:
         session, sg = await _setup(db)
         mock_llm["generate_text"].return_value = "Here's what another group said..."
 
-        await deliver_surrogate_message(db, session, sg, ["Insight from group 2"])
+        delivered = await deliver_surrogate_message(db, session, sg, ["Insight from group 2"])
         await db.flush()
 
         result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
@@ -37,6 +37,7 @@ class TestDeliverSurrogateMessage:
         assert messages[0].msg_type == MessageType.surrogate
         assert messages[0].user_id is None
         assert "another group" in messages[0].content
+        assert delivered is messages[0]
 
     async def test_typing_indicator_published(self, db, mock_llm, mock_redis):
         session, sg = await _setup(db)
@@ -53,7 +54,7 @@ class TestDeliverSurrogateMessage:
         session, sg = await _setup(db)
         mock_llm["generate_text"].return_value = ""
 
-        await deliver_surrogate_message(db, session, sg, ["Insight"])
+        assert await deliver_surrogate_message(db, session, sg, ["Insight"]) is None
 
         result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
         assert result.scalars().all() == []
@@ -73,7 +74,11 @@ class TestDeliverSurrogateMessage:
 
         # Should have broadcast to subgroup after saving
         calls = mock_redis["publish_to_subgroup"].call_args_list
-        # At least 2 calls: typing indicator + new_message
-        assert len(calls) >= 2
-        last_call = calls[-1]
-        assert last_call[0][1] == "chat:new_message"
+        # Typing indicator, then the streamed delta, then the final message
+        assert [c[0][1] for c in calls] == [
+            "chat:surrogate_typing", "chat:message_delta", "chat:message_done",
+        ]
+        done = calls[-1][0][2]
+        result = await db.execute(select(Message).where(Message.subgroup_id == sg.id))
+        assert done["id"] == str(result.scalar_one().id)
+        assert done["content"] == "Relay content"
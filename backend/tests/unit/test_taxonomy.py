@@ -1,6 +1,7 @@
 """Tests for app.engine.taxonomy — idea extraction via mocked LLM."""
 
 import uuid
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock
 
 import pytest
@@ -11,7 +12,11 @@ from app.models.subgroup import Subgroup
 from app.models.user import User
 from app.models.message import Message, MessageType
 from app.models.idea import Idea
-from app.engine.taxonomy import update_taxonomy_for_subgroup, get_ideas_not_in_subgroup
+from app.engine.taxonomy import (
+    update_taxonomy_for_subgroup,
+    update_taxonomy_for_subgroups,
+    get_ideas_not_in_subgroup,
+)
 
 
 async def _setup_session_with_subgroup(db):
@@ -88,6 +93,153 @@ class TestUpdateTaxonomy:
         assert ideas[0].summary == "Real idea"
 
 
+    async def test_paraphrase_merged_into_existing_idea(self, db, mock_llm):
+        session, sg = await _setup_session_with_subgroup(db)
+        user = User(display_name="G", session_id=session.id, subgroup_id=sg.id)
+        db.add(user)
+        existing = Idea(session_id=session.id, subgroup_id=sg.id,
+                        summary="We should invest more in public transit", sentiment=0.6)
+        db.add(existing)
+        await db.flush()
+        db.add(Message(subgroup_id=sg.id, user_id=user.id, content="transit!", msg_type=MessageType.human))
+        await db.flush()
+
+        mock_llm["generate_json"].return_value = [
+            {"summary": "We should invest more in public transportation", "sentiment": 0.7},
+            {"summary": "Bike lanes need protection from traffic", "sentiment": 0.4},
+        ]
+        ideas = await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        assert [i.summary for i in ideas] == ["Bike lanes need protection from traffic"]
+        assert existing.support_count == 2
+
+        count = len((await db.execute(select(Idea).where(Idea.session_id == session.id))).scalars().all())
+        assert count == 2
+
+    async def test_only_unseen_messages_sent(self, db, mock_llm):
+        session, sg = await _setup_session_with_subgroup(db)
+        user = User(display_name="D", session_id=session.id, subgroup_id=sg.id)
+        db.add(user)
+        await db.flush()
+        t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        db.add(Message(subgroup_id=sg.id, user_id=user.id, content="first point",
+                       msg_type=MessageType.human, created_at=t0))
+        await db.flush()
+
+        await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        assert "first point" in mock_llm["generate_json"].await_args[0][0]
+
+        db.add(Message(subgroup_id=sg.id, user_id=user.id, content="second point",
+                       msg_type=MessageType.human, created_at=t0 + timedelta(seconds=5)))
+        await db.flush()
+
+        await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        prompt = mock_llm["generate_json"].await_args[0][0]
+        assert "second point" in prompt
+        assert "first point" not in prompt.split("Messages:")[1]
+
+    async def test_no_new_messages_skips_llm(self, db, mock_llm):
+        session, sg = await _setup_session_with_subgroup(db)
+        user = User(display_name="E", session_id=session.id, subgroup_id=sg.id)
+        db.add(user)
+        await db.flush()
+        db.add(Message(subgroup_id=sg.id, user_id=user.id, content="hi", msg_type=MessageType.human))
+        await db.flush()
+
+        await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        assert mock_llm["generate_json"].await_count == 1
+
+    async def test_agent_only_messages_skip_llm(self, db, mock_llm):
+        session, sg = await _setup_session_with_subgroup(db)
+        db.add(Message(subgroup_id=sg.id, user_id=None, content="relay", msg_type=MessageType.surrogate))
+        await db.flush()
+
+        ideas = await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        assert ideas == []
+        mock_llm["generate_json"].assert_not_awaited()
+
+    async def test_known_ideas_included_as_context(self, db, mock_llm):
+        session, sg = await _setup_session_with_subgroup(db)
+        user = User(display_name="F", session_id=session.id, subgroup_id=sg.id)
+        db.add(user)
+        db.add(Idea(session_id=session.id, subgroup_id=sg.id, summary="Earlier idea", sentiment=0.1))
+        await db.flush()
+        db.add(Message(subgroup_id=sg.id, user_id=user.id, content="more", msg_type=MessageType.human))
+        await db.flush()
+
+        await update_taxonomy_for_subgroup(db, session.id, sg.id)
+        assert "Earlier idea" in mock_llm["generate_json"].await_args[0][0]
+
+
+class TestBatchedTaxonomy:
+
+    async def _setup_subgroups(self, db, count):
+        session = Session(title="Batch Topic")
+        db.add(session)
+        await db.flush()
+        subgroups = []
+        for i in range(count):
+            sg = Subgroup(session_id=session.id, label=f"ThinkTank {i + 1}")
+            db.add(sg)
+            await db.flush()
+            user = User(display_name=f"U{i}", session_id=session.id, subgroup_id=sg.id)
+            db.add(user)
+            await db.flush()
+            db.add(Message(subgroup_id=sg.id, user_id=user.id, content=f"message from group {i + 1}",
+                           msg_type=MessageType.human))
+            subgroups.append(sg)
+        await db.flush()
+        return session, subgroups
+
+    async def test_one_call_for_whole_batch(self, db, mock_llm, monkeypatch):
+        monkeypatch.setattr("app.config.settings.TAXONOMY_BATCH_SIZE", 8)
+        session, subgroups = await self._setup_subgroups(db, 3)
+        mock_llm["generate_json"].return_value = {"groups": [
+            {"group": 1, "ideas": [{"summary": "Parks need more trees", "sentiment": 0.5}]},
+            {"group": 2, "ideas": []},
+            {"group": 3, "ideas": [{"summary": "Raise the library budget", "sentiment": -0.2}]},
+        ]}
+
+        results = await update_taxonomy_for_subgroups(db, session.id, [sg.id for sg in subgroups])
+        assert mock_llm["generate_json"].await_count == 1
+        assert [i.summary for i in results[subgroups[0].id]] == ["Parks need more trees"]
+        assert results[subgroups[1].id] == []
+        assert results[subgroups[2].id][0].subgroup_id == subgroups[2].id
+
+    async def test_batch_size_splits_calls(self, db, mock_llm, monkeypatch):
+        monkeypatch.setattr("app.config.settings.TAXONOMY_BATCH_SIZE", 2)
+        session, subgroups = await self._setup_subgroups(db, 3)
+        mock_llm["generate_json"].return_value = {"groups": []}
+
+        await update_taxonomy_for_subgroups(db, session.id, [sg.id for sg in subgroups])
+        # One batch of two (missing groups fall back) + one single
+        prompts = [c[0][0] for c in mock_llm["generate_json"].await_args_list]
+        assert sum("=== Group 2 ===" in p for p in prompts) == 1
+
+    async def test_unparseable_batch_falls_back_per_subgroup(self, db, mock_llm, monkeypatch):
+        monkeypatch.setattr("app.config.settings.TAXONOMY_BATCH_SIZE", 8)
+        session, subgroups = await self._setup_subgroups(db, 2)
+        responses = iter([
+            [],  # batched call: not the expected object
+            [{"summary": "Idea one", "sentiment": 0.1}],
+            [{"summary": "Completely different two", "sentiment": 0.2}],
+        ])
+        mock_llm["generate_json"].side_effect = lambda *a, **k: next(responses)
+
+        results = await update_taxonomy_for_subgroups(db, session.id, [sg.id for sg in subgroups])
+        assert mock_llm["generate_json"].await_count == 3
+        assert len(results[subgroups[0].id]) == 1
+        assert len(results[subgroups[1].id]) == 1
+
+    async def test_failed_extraction_keeps_watermark(self, db, mock_llm):
+        session, subgroups = await self._setup_subgroups(db, 1)
+        mock_llm["generate_json"].side_effect = RuntimeError("provider down")
+
+        results = await update_taxonomy_for_subgroups(db, session.id, [subgroups[0].id])
+        assert results == {}
+        assert subgroups[0].taxonomy_watermark_at is None
+
+
 class TestGetIdeasNotInSubgroup:
 
     async def test_excludes_own_subgroup(self, db):
@@ -1,12 +1,14 @@
 """Tests for app.websocket.manager — ConnectionManager unit tests."""
 
+import asyncio
 import uuid
 import json
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from app.websocket.manager import ConnectionManager
+from app.services.wire import encode_event
+from app.websocket.manager import ChatContext, ConnectionManager
 
 
 @pytest.fixture
@@ -29,7 +31,7 @@ class TestConnectToSubgroup:
         sg_id = uuid.uuid4()
         await mgr.connect_to_subgroup(ws, user_id, sg_id)
         assert (user_id, ws) in mgr.subgroup_connections[sg_id]
-        assert mgr.user_connections[user_id] is ws
+        assert mgr.user_connections[user_id] == {ws}
 
     async def test_accepts_websocket(self, mgr):
         ws = _mock_ws()
@@ -45,7 +47,7 @@ class TestDisconnect:
         sg_id = uuid.uuid4()
         await mgr.connect_to_subgroup(ws, user_id, sg_id)
         mgr.disconnect(user_id, subgroup_id=sg_id)
-        assert (user_id, ws) not in mgr.subgroup_connections[sg_id]
+        assert (user_id, ws) not in mgr.subgroup_connections.get(sg_id, set())
         assert user_id not in mgr.user_connections
 
     async def test_removes_from_session(self, mgr):
@@ -54,7 +56,60 @@ class TestDisconnect:
         sess_id = uuid.uuid4()
         await mgr.connect_to_session(ws, user_id, sess_id)
         mgr.disconnect(user_id, session_id=sess_id)
-        assert (user_id, ws) not in mgr.session_connections[sess_id]
+        assert (user_id, ws) not in mgr.session_connections.get(sess_id, set())
+
+
+class TestMultipleSockets:
+    """A user may hold several sockets; each is tracked and removed on its own."""
+
+    async def test_chat_and_session_sockets_coexist(self, mgr):
+        user_id = uuid.uuid4()
+        chat_ws, session_ws = _mock_ws(), _mock_ws()
+        await mgr.connect_to_subgroup(chat_ws, user_id, uuid.uuid4())
+        await mgr.connect_to_session(session_ws, user_id, uuid.uuid4())
+
+        assert mgr.user_connections[user_id] == {chat_ws, session_ws}
+
+        await mgr.send_to_user(user_id, "session:started", {})
+        await mgr.flush()
+        chat_ws.send_text.assert_awaited_once()
+        session_ws.send_text.assert_awaited_once()
+
+    async def test_disconnecting_one_socket_keeps_the_other(self, mgr):
+        user_id = uuid.uuid4()
+        sg_id = uuid.uuid4()
+        tab1, tab2 = _mock_ws(), _mock_ws()
+        await mgr.connect_to_subgroup(tab1, user_id, sg_id)
+        await mgr.connect_to_subgroup(tab2, user_id, sg_id)
+
+        mgr.disconnect(user_id, subgroup_id=sg_id, websocket=tab1)
+
+        assert mgr.subgroup_connections[sg_id] == {(user_id, tab2)}
+        assert mgr.user_connections[user_id] == {tab2}
+        assert mgr.get_subgroup_user_count(sg_id) == 1
+
+    async def test_empty_buckets_removed(self, mgr):
+        user_id = uuid.uuid4()
+        sg_id, sess_id = uuid.uuid4(), uuid.uuid4()
+        chat_ws, session_ws = _mock_ws(), _mock_ws()
+        await mgr.connect_to_subgroup(chat_ws, user_id, sg_id)
+        await mgr.connect_to_session(session_ws, user_id, sess_id)
+
+        mgr.disconnect(user_id, subgroup_id=sg_id, websocket=chat_ws)
+        mgr.disconnect(user_id, session_id=sess_id, websocket=session_ws)
+
+        assert mgr.subgroup_connections == {}
+        assert mgr.session_connections == {}
+        assert mgr.user_connections == {}
+        assert mgr.connections == {}
+
+    async def test_disconnect_is_idempotent(self, mgr):
+        user_id = uuid.uuid4()
+        ws = _mock_ws()
+        await mgr.connect_to_subgroup(ws, user_id, uuid.uuid4())
+        mgr.disconnect(user_id, websocket=ws)
+        mgr.disconnect(user_id, websocket=ws)
+        assert mgr.stats()["connections"] == 0
 
 
 class TestBroadcastToSubgroup:
@@ -67,6 +122,7 @@ class TestBroadcastToSubgroup:
         await mgr.connect_to_subgroup(ws2, uuid.uuid4(), sg_id)
 
         await mgr.broadcast_to_subgroup(sg_id, "test:event", {"key": "val"})
+        await mgr.flush()
         ws1.send_text.assert_awaited_once()
         ws2.send_text.assert_awaited_once()
 
@@ -85,8 +141,10 @@ class TestBroadcastToSubgroup:
         await mgr.connect_to_subgroup(dead_ws, dead_uid, sg_id)
 
         await mgr.broadcast_to_subgroup(sg_id, "test", {})
+        await mgr.flush()
         # Dead connection should be removed
         assert (dead_uid, dead_ws) not in mgr.subgroup_connections[sg_id]
+        assert dead_uid not in mgr.user_connections
 
     async def test_no_connections_is_noop(self, mgr):
         await mgr.broadcast_to_subgroup(uuid.uuid4(), "test", {})
@@ -103,3 +161,231 @@ class TestGetSubgroupUserCount:
 
     def test_unknown_subgroup_returns_zero(self, mgr):
         assert mgr.get_subgroup_user_count(uuid.uuid4()) == 0
+
+
+class TestChannelSubscriptions:
+    """The manager keeps the Redis subscriber in step with local sockets."""
+
+    @pytest.fixture
+    def subscriber(self, mgr):
+        sub = MagicMock()
+        sub.add = AsyncMock()
+        sub.discard = MagicMock()
+        mgr.subscriber = sub
+        return sub
+
+    async def test_first_socket_subscribes(self, mgr, subscriber):
+        sg_id = uuid.uuid4()
+        await mgr.connect_to_subgroup(_mock_ws(), uuid.uuid4(), sg_id)
+        subscriber.add.assert_awaited_once_with(f"subgroup:{sg_id}")
+
+    async def test_last_socket_leaving_unsubscribes(self, mgr, subscriber):
+        sg_id = uuid.uuid4()
+        alice, bob = uuid.uuid4(), uuid.uuid4()
+        await mgr.connect_to_subgroup(_mock_ws(), alice, sg_id)
+        await mgr.connect_to_subgroup(_mock_ws(), bob, sg_id)
+
+        mgr.disconnect(alice, subgroup_id=sg_id)
+        subscriber.discard.assert_not_called()
+
+        mgr.disconnect(bob, subgroup_id=sg_id)
+        subscriber.discard.assert_called_once_with(f"subgroup:{sg_id}")
+        assert sg_id not in mgr.subgroup_connections
+
+    async def test_session_channel(self, mgr, subscriber):
+        sess_id = uuid.uuid4()
+        user_id = uuid.uuid4()
+        await mgr.connect_to_session(_mock_ws(), user_id, sess_id)
+        mgr.disconnect(user_id, session_id=sess_id)
+        subscriber.add.assert_awaited_once_with(f"session:{sess_id}")
+        subscriber.discard.assert_called_once_with(f"session:{sess_id}")
+
+    async def test_dead_sockets_release_channel(self, mgr, subscriber):
+        sg_id = uuid.uuid4()
+        ws = _mock_ws()
+        ws.send_text.side_effect = Exception("closed")
+        await mgr.connect_to_subgroup(ws, uuid.uuid4(), sg_id)
+
+        await mgr.broadcast_to_subgroup(sg_id, "chat:new_message", {})
+        await mgr.flush()
+
+        subscriber.discard.assert_called_once_with(f"subgroup:{sg_id}")
+
+    async def test_chat_context_subscribes_to_user_channel(self, mgr, subscriber):
+        sg_id, user_id = uuid.uuid4(), uuid.uuid4()
+        context = ChatContext(user_id, uuid.uuid4(), sg_id, "Ada")
+        await mgr.connect_to_subgroup(_mock_ws(), user_id, sg_id, context=context)
+        await mgr.connect_to_session(_mock_ws(), user_id, uuid.uuid4())
+        subscriber.add.assert_any_await(f"user:{user_id}")
+
+        mgr.disconnect(user_id, subgroup_id=sg_id)
+        subscriber.discard.assert_any_call(f"user:{user_id}")
+
+    async def test_failed_subscribe_leaves_nothing_behind(self, mgr, subscriber):
+        sg_id, user_id = uuid.uuid4(), uuid.uuid4()
+        context = ChatContext(user_id, uuid.uuid4(), sg_id, "Ada")
+        subscriber.add.side_effect = [None, ConnectionError("redis down")]
+
+        with pytest.raises(ConnectionError):
+            await mgr.connect_to_subgroup(_mock_ws(), user_id, sg_id, context=context)
+
+        assert mgr.connections == {}
+        assert sg_id not in mgr.subgroup_connections
+        assert user_id not in mgr.user_connections
+        subscriber.discard.assert_any_call(f"subgroup:{sg_id}")
+
+    async def test_failed_presence_join_unregisters_session_socket(self, mgr, subscriber):
+        sess_id, user_id = uuid.uuid4(), uuid.uuid4()
+        mgr.presence = MagicMock()
+        mgr.presence.join = AsyncMock(side_effect=RuntimeError("boom"))
+
+        with pytest.raises(RuntimeError):
+            await mgr.connect_to_session(_mock_ws(), user_id, sess_id)
+
+        assert mgr.connections == {}
+        assert sess_id not in mgr.session_connections
+
+
+class TestUserUpdates:
+    """Renames and reassignments reach the chat contexts on this worker."""
+
+    async def _chat(self, mgr, user_id, sg_id):
+        ws = _mock_ws()
+        context = ChatContext(user_id, uuid.uuid4(), sg_id, "Ada")
+        await mgr.connect_to_subgroup(ws, user_id, sg_id, context=context)
+        return ws
+
+    async def test_rename_updates_context(self, mgr):
+        user_id, sg_id = uuid.uuid4(), uuid.uuid4()
+        ws = await self._chat(mgr, user_id, sg_id)
+
+        await mgr.apply_user_update(
+            user_id, encode_event("user:updated", {"display_name": "Grace", "subgroup_id": str(sg_id)})
+        )
+
+        assert mgr.chat_context(ws).display_name == "Grace"
+
+    async def test_reassignment_closes_old_subgroup_socket(self, mgr):
+        user_id, sg_id = uuid.uuid4(), uuid.uuid4()
+        ws = await self._chat(mgr, user_id, sg_id)
+
+        mgr.update_user(user_id, "Ada", uuid.uuid4())
+        await asyncio.sleep(0)
+
+        assert mgr.chat_context(ws) is None
+        assert sg_id not in mgr.subgroup_connections
+        ws.close.assert_awaited_once_with(code=1008)
+
+    async def test_session_sockets_untouched(self, mgr):
+        user_id, sess_id = uuid.uuid4(), uuid.uuid4()
+        ws = _mock_ws()
+        await mgr.connect_to_session(ws, user_id, sess_id)
+
+        mgr.update_user(user_id, "Grace", uuid.uuid4())
+
+        assert sess_id in mgr.session_connections
+        ws.close.assert_not_awaited()
+
+
+def _blocked_until(event: asyncio.Event):
+    async def send(_message):
+        await event.wait()
+    return send
+
+
+class TestSendQueues:
+    """Broadcasts enqueue per connection; slow clients don't block others."""
+
+    async def test_slow_client_does_not_delay_others(self, mgr):
+        sg_id = uuid.uuid4()
+        stuck = asyncio.Event()
+        slow_ws = _mock_ws()
+        slow_ws.send_text.side_effect = _blocked_until(stuck)
+        fast_ws = _mock_ws()
+        await mgr.connect_to_subgroup(slow_ws, uuid.uuid4(), sg_id)
+        await mgr.connect_to_subgroup(fast_ws, uuid.uuid4(), sg_id)
+
+        await mgr.broadcast_to_subgroup(sg_id, "a", {})
+        await mgr.broadcast_to_subgroup(sg_id, "b", {})
+        await asyncio.sleep(0.01)
+
+        assert [json.loads(c[0][0])["event"] for c in fast_ws.send_text.call_args_list] == ["a", "b"]
+        stuck.set()
+        await mgr.flush()
+        assert slow_ws.send_text.await_count == 2
+
+    async def test_overflow_resync_replaces_backlog(self, mgr, monkeypatch):
+        monkeypatch.setattr("app.config.settings.WS_SEND_QUEUE_SIZE", 2)
+        sg_id = uuid.uuid4()
+        stuck = asyncio.Event()
+        ws = _mock_ws()
+        ws.send_text.side_effect = _blocked_until(stuck)
+        await mgr.connect_to_subgroup(ws, uuid.uuid4(), sg_id)
+
+        for n in range(5):
+            await mgr.broadcast_to_subgroup(sg_id, f"e{n}", {})
+            await asyncio.sleep(0)
+        stuck.set()
+        await mgr.flush()
+
+        events = [json.loads(c[0][0])["event"] for c in ws.send_text.call_args_list]
+        assert "sync:resync" in events
+        assert mgr.stats()["resyncs"] >= 1
+        assert (mgr.stats()["connections"], mgr.stats()["dropped"]) == (1, 0)
+
+    async def test_overflow_drop_disconnects_client(self, mgr, monkeypatch):
+        monkeypatch.setattr("app.config.settings.WS_SEND_QUEUE_SIZE", 1)
+        monkeypatch.setattr("app.config.settings.WS_OVERFLOW_POLICY", "drop")
+        sg_id = uuid.uuid4()
+        user_id = uuid.uuid4()
+        stuck = asyncio.Event()
+        ws = _mock_ws()
+        ws.send_text.side_effect = _blocked_until(stuck)
+        await mgr.connect_to_subgroup(ws, user_id, sg_id)
+
+        for n in range(3):
+            await mgr.broadcast_to_subgroup(sg_id, f"e{n}", {})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        assert mgr.stats()["dropped"] == 1
+        assert mgr.get_subgroup_user_count(sg_id) == 0
+        assert user_id not in mgr.user_connections
+        ws.close.assert_awaited_once_with(code=1013)
+
+    async def test_disconnect_stops_writer(self, mgr):
+        ws = _mock_ws()
+        user_id = uuid.uuid4()
+        sg_id = uuid.uuid4()
+        await mgr.connect_to_subgroup(ws, user_id, sg_id)
+        writer = mgr.connections[ws].writer
+
+        mgr.disconnect(user_id, subgroup_id=sg_id)
+        await asyncio.sleep(0)
+
+        assert ws not in mgr.connections
+        assert writer.cancelled()
+
+
+class TestRawForwarding:
+
+    async def test_raw_payload_forwarded_untouched(self, mgr):
+        sg_id = uuid.uuid4()
+        ws = _mock_ws()
+        await mgr.connect_to_subgroup(ws, uuid.uuid4(), sg_id)
+        payload = '{"event":"chat:new_message","data":{"content":"hi"}}'
+
+        await mgr.send_raw_to_subgroup(sg_id, payload)
+        await mgr.flush()
+
+        ws.send_text.assert_awaited_once_with(payload)
+
+    async def test_raw_session_payload(self, mgr):
+        sess_id = uuid.uuid4()
+        ws = _mock_ws()
+        await mgr.connect_to_session(ws, uuid.uuid4(), sess_id)
+
+        await mgr.send_raw_to_session(sess_id, '{"event":"x","data":{}}')
+        await mgr.flush()
+
+        ws.send_text.assert_awaited_once_with('{"event":"x","data":{}}')
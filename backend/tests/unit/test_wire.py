@@ -0,0 +1,39 @@
+"""Tests for app.services.wire — event encoding with and without orjson."""
+
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import app.services.wire as wire
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(wire, "orjson", None)
+    elif wire.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+class TestEncodeEvent:
+
+    def test_envelope_is_plain_json(self, backend):
+        message = wire.encode_event("chat:new_message", {"content": "hi", "n": 1})
+        assert json.loads(message) == {"event": "chat:new_message", "data": {"content": "hi", "n": 1}}
+
+    def test_uuids_become_strings(self, backend):
+        sid = uuid.uuid4()
+        message = wire.encode_event("e", {"id": sid, "ids": [sid]})
+        assert json.loads(message)["data"] == {"id": str(sid), "ids": [str(sid)]}
+
+    def test_datetimes_are_serialized(self, backend):
+        when = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        data = json.loads(wire.encode_event("e", {"at": when}))["data"]
+        assert datetime.fromisoformat(data["at"]) == when
+
+    def test_round_trip(self, backend):
+        message = wire.encode_event("session:convergence", {"convergence": 0.5})
+        assert wire.decode_event(message) == ("session:convergence", {"convergence": 0.5})
@@ -0,0 +1,245 @@
+"""Tests for chat message persistence — strict mode and the write-behind writer."""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+
+import app.websocket.handlers as handlers
+from app.models.message import Message, MessageType
+from app.models.session import Session, SessionStatus
+from app.models.subgroup import Subgroup
+from app.models.user import User
+from app.websocket.handlers import handle_chat_message, resolve_chat_context
+from app.websocket.write_behind import MessageWriter
+from tests.conftest import TestSessionLocal
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    writer = MessageWriter()
+    monkeypatch.setattr("app.websocket.write_behind.async_session", TestSessionLocal)
+    monkeypatch.setattr(handlers, "async_session", TestSessionLocal)
+    monkeypatch.setattr(handlers, "message_writer", writer)
+    return writer
+
+
+async def _member(db):
+    session = Session(title="Chat", status=SessionStatus.active)
+    db.add(session)
+    await db.flush()
+    sg = Subgroup(session_id=session.id, label="ThinkTank 1")
+    db.add(sg)
+    await db.flush()
+    user = User(display_name="Ada", session_id=session.id, subgroup_id=sg.id)
+    db.add(user)
+    await db.commit()
+    return user, sg
+
+
+async def _context(user, sg):
+    return await resolve_chat_context(user.id, sg.id)
+
+
+def _row(subgroup_id, content="hi"):
+    return {
+        "id": uuid.uuid4(),
+        "subgroup_id": subgroup_id,
+        "user_id": None,
+        "content": content,
+        "msg_type": MessageType.human,
+        "source_subgroup_id": None,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+class _DownSession:
+    """Stands in for async_session() while the database is unreachable."""
+
+    async def __aenter__(self):
+        raise ConnectionError("db down")
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def _stored(db) -> list[str]:
+    db.expire_all()
+    result = await db.execute(select(Message.content).order_by(Message.created_at))
+    return list(result.scalars().all())
+
+
+class TestHandleChatMessage:
+
+    async def test_strict_mode_commits_before_publishing(self, db, writer, mock_redis):
+        user, sg = await _member(db)
+        session_id, sg_id = user.session_id, sg.id
+
+        await handle_chat_message(await _context(user, sg), {"content": " hello "})
+
+        assert await _stored(db) == ["hello"]
+        assert not writer.pending
+        event, payload = mock_redis["publish_to_subgroup"].await_args[0][1:]
+        assert event == "chat:new_message"
+        assert payload["display_name"] == "Ada"
+        mock_redis["mark_subgroup_dirty"].assert_awaited_once_with(session_id, sg_id)
+
+    async def test_fast_mode_publishes_then_writes_behind(self, db, writer, mock_redis, monkeypatch):
+        monkeypatch.setattr(handlers.settings, "CHAT_PERSISTENCE", "fast")
+        user, sg = await _member(db)
+        user_id = user.id
+
+        await handle_chat_message(await _context(user, sg), {"content": "quick"})
+
+        payload = mock_redis["publish_to_subgroup"].await_args[0][2]
+        assert payload["content"] == "quick"
+        assert payload["created_at"]
+        assert await _stored(db) == []
+
+        await writer.flush()
+
+        stored = (await db.execute(select(Message))).scalar_one()
+        assert str(stored.id) == payload["id"]
+        assert stored.user_id == user_id
+
+    async def test_blank_message_ignored(self, db, writer, mock_redis):
+        user, sg = await _member(db)
+        await handle_chat_message(await _context(user, sg), {"content": "   "})
+        mock_redis["publish_to_subgroup"].assert_not_awaited()
+
+    async def test_renamed_context_is_used_for_display_name(self, db, writer, mock_redis):
+        user, sg = await _member(db)
+        context = await _context(user, sg)
+        context.display_name = "Grace"
+
+        await handle_chat_message(context, {"content": "hi"})
+
+        assert mock_redis["publish_to_subgroup"].await_args[0][2]["display_name"] == "Grace"
+
+
+class TestResolveChatContext:
+
+    async def test_member_gets_context(self, db, writer):
+        user, sg = await _member(db)
+        context = await resolve_chat_context(user.id, sg.id)
+        assert (context.user_id, context.subgroup_id) == (user.id, sg.id)
+        assert context.session_id == user.session_id
+        assert context.display_name == "Ada"
+
+    async def test_other_subgroup_rejected(self, db, writer):
+        user, _ = await _member(db)
+        assert await resolve_chat_context(user.id, uuid.uuid4()) is None
+
+    async def test_unknown_user_rejected(self, db, writer):
+        _, sg = await _member(db)
+        assert await resolve_chat_context(uuid.uuid4(), sg.id) is None
+
+
+class TestMessageWriter:
+
+    async def test_flush_inserts_in_batches(self, db, writer, monkeypatch):
+        monkeypatch.setattr("app.websocket.write_behind.settings.CHAT_WRITE_BATCH_SIZE", 2)
+        _, sg = await _member(db)
+        for i in range(3):
+            await writer.enqueue(_row(sg.id, f"m{i}"))
+
+        await writer.flush()
+        assert len(writer.pending) == 1
+        await writer.flush()
+
+        assert await _stored(db) == ["m0", "m1", "m2"]
+        assert writer.stats()["batches"] == 2
+
+    async def test_failed_batch_is_kept_in_order_for_retry(self, db, writer, monkeypatch):
+        _, sg = await _member(db)
+        for i in range(2):
+            await writer.enqueue(_row(sg.id, f"m{i}"))
+
+        monkeypatch.setattr("app.websocket.write_behind.async_session", _DownSession)
+        assert await writer.flush() is False
+        assert [r["content"] for r in writer.pending] == ["m0", "m1"]
+
+        monkeypatch.setattr("app.websocket.write_behind.async_session", TestSessionLocal)
+        assert await writer.flush() is True
+        assert await _stored(db) == ["m0", "m1"]
+        assert writer.retries == 1
+
+    async def test_already_stored_rows_are_skipped(self, db, writer):
+        _, sg = await _member(db)
+        row = _row(sg.id, "committed")
+        await writer.enqueue(row)
+        await writer.flush()
+
+        # A commit that went through although the flush was cancelled
+        await writer.enqueue(row)
+        await writer.enqueue(_row(sg.id, "next"))
+        assert await writer.flush() is True
+
+        assert await _stored(db) == ["committed", "next"]
+        assert not writer.pending
+
+    async def test_rejected_row_dropped_without_blocking_the_queue(self, db, writer):
+        _, sg = await _member(db)
+        await writer.enqueue(_row(sg.id, "m0"))
+        await writer.enqueue({**_row(sg.id), "content": None})
+        await writer.enqueue(_row(sg.id, "m2"))
+
+        for _ in range(4):
+            assert await writer.flush() is True
+
+        assert await _stored(db) == ["m0", "m2"]
+        assert not writer.pending
+        assert writer.lost == 1
+
+    async def test_background_flusher_writes_within_window(self, db, writer, monkeypatch):
+        monkeypatch.setattr("app.websocket.write_behind.settings.CHAT_WRITE_BEHIND_MS", 5)
+        _, sg = await _member(db)
+        task = asyncio.create_task(writer.run())
+        try:
+            await writer.enqueue(_row(sg.id))
+            for _ in range(100):
+                if writer.written:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        assert writer.written == 1
+
+    async def test_enqueue_waits_when_too_much_is_pending(self, db, writer, monkeypatch):
+        monkeypatch.setattr("app.websocket.write_behind.settings.CHAT_WRITE_MAX_PENDING", 1)
+        _, sg = await _member(db)
+        await writer.enqueue(_row(sg.id, "first"))
+
+        blocked = asyncio.create_task(writer.enqueue(_row(sg.id, "second")))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+
+        await writer.flush()
+        await asyncio.wait_for(blocked, 1)
+        assert [r["content"] for r in writer.pending] == ["second"]
+
+    async def test_drain_flushes_everything(self, db, writer, monkeypatch):
+        monkeypatch.setattr("app.websocket.write_behind.settings.CHAT_WRITE_BATCH_SIZE", 2)
+        _, sg = await _member(db)
+        for i in range(5):
+            await writer.enqueue(_row(sg.id, f"m{i}"))
+
+        await writer.drain()
+
+        assert len(await _stored(db)) == 5
+        assert writer.lost == 0
+
+    async def test_drain_gives_up_after_retries(self, writer, monkeypatch):
+        monkeypatch.setattr("app.websocket.write_behind.asyncio.sleep", AsyncMock())
+        monkeypatch.setattr("app.websocket.write_behind.async_session", _DownSession)
+        await writer.enqueue(_row(uuid.uuid4()))
+
+        await writer.drain()
+
+        assert writer.lost == 1
+        assert not writer.pending
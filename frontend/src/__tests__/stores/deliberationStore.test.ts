@@ -149,6 +149,106 @@ describe('deliberationStore', () => {
     });
   });
 
+  describe('streamed agent messages', () => {
+    const delta = {
+      id: 'a1', subgroup_id: 'sg1', display_name: 'Surrogate Agent',
+      msg_type: 'surrogate' as const, delta: 'Hello',
+    };
+
+    it('creates a draft message from the first delta and appends later ones', () => {
+      useDeliberationStore.setState({ surrogateTyping: true });
+
+      useDeliberationStore.getState().appendMessageDelta(delta);
+      useDeliberationStore.getState().appendMessageDelta({ ...delta, delta: ' world' });
+
+      const { messages, surrogateTyping } = useDeliberationStore.getState();
+      expect(messages).toHaveLength(1);
+      expect(messages[0].content).toBe('Hello world');
+      expect(surrogateTyping).toBe(false);
+    });
+
+    it('replaces the draft with the final message', () => {
+      useDeliberationStore.getState().appendMessageDelta(delta);
+      const final = {
+        id: 'a1', subgroup_id: 'sg1', user_id: null, display_name: 'Surrogate Agent',
+        content: 'Hello world.', msg_type: 'surrogate' as const, source_subgroup_id: null,
+        created_at: '2025-01-01',
+      };
+
+      useDeliberationStore.getState().finalizeMessage(final);
+
+      expect(useDeliberationStore.getState().messages).toEqual([final]);
+    });
+
+    it('removes a discarded draft', () => {
+      useDeliberationStore.getState().appendMessageDelta(delta);
+
+      useDeliberationStore.getState().discardMessage('a1');
+
+      expect(useDeliberationStore.getState().messages).toEqual([]);
+    });
+  });
+
+  describe('fetchMessages', () => {
+    const stored = {
+      id: 'm1', subgroup_id: 'sg1', user_id: 'u1', display_name: 'A', content: 'hi',
+      msg_type: 'human' as const, source_subgroup_id: null, created_at: '2025-01-01',
+    };
+    const newer = { ...stored, id: 'm2', content: 'again' };
+
+    beforeEach(() => {
+      useDeliberationStore.setState({
+        currentUser: { id: 'u1', display_name: 'A', session_id: 's1', subgroup_id: 'sg1', is_admin: false, created_at: '' },
+      });
+    });
+
+    it('loads the full history by default', async () => {
+      mockFetch.mockResolvedValueOnce({ ok: true, json: async () => [stored, newer] });
+
+      await useDeliberationStore.getState().fetchMessages();
+
+      expect(mockFetch.mock.calls[0][0]).toMatch(/\/api\/users\/u1\/messages$/);
+      expect(useDeliberationStore.getState().messages).toEqual([stored, newer]);
+    });
+
+    it('incrementally fetches messages since the last stored one', async () => {
+      useDeliberationStore.setState({ messages: [stored] });
+      useDeliberationStore.getState().appendMessageDelta({
+        id: 'd1', subgroup_id: 'sg1', display_name: 'Surrogate Agent', msg_type: 'surrogate', delta: '...',
+      });
+      mockFetch.mockResolvedValueOnce({ ok: true, json: async () => [newer] });
+
+      await useDeliberationStore.getState().fetchMessages(true);
+
+      expect(mockFetch.mock.calls[0][0]).toMatch(/messages\?since=m1$/);
+      expect(useDeliberationStore.getState().messages.map(m => m.id)).toEqual(['m1', 'm2', 'd1']);
+    });
+
+    it('merges with WebSocket-delivered messages in (created_at, id) order', async () => {
+      const early = { ...stored, id: 'm0', created_at: '2024-12-31' };
+      const late = { ...stored, id: 'm3', created_at: '2025-01-02' };
+      useDeliberationStore.setState({ messages: [stored, late] });
+      mockFetch.mockResolvedValueOnce({ ok: true, json: async () => [early, newer, late] });
+
+      await useDeliberationStore.getState().fetchMessages(true);
+
+      expect(mockFetch.mock.calls[0][0]).toMatch(/messages\?since=m3$/);
+      expect(useDeliberationStore.getState().messages.map(m => m.id)).toEqual(['m0', 'm1', 'm2', 'm3']);
+    });
+
+    it('falls back to a full reload when the cursor is unknown', async () => {
+      useDeliberationStore.setState({ messages: [stored] });
+      mockFetch
+        .mockResolvedValueOnce({ ok: false, status: 400, json: async () => ({}) })
+        .mockResolvedValueOnce({ ok: true, json: async () => [newer] });
+
+      await useDeliberationStore.getState().fetchMessages(true);
+
+      expect(mockFetch).toHaveBeenCalledTimes(2);
+      expect(useDeliberationStore.getState().messages).toEqual([newer]);
+    });
+  });
+
   describe('reset', () => {
     it('returns to initial state', () => {
       useDeliberationStore.setState({
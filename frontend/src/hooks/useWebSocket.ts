@@ -1,5 +1,5 @@
 import { useEffect, useRef, useCallback } from 'react';
-import type { Message, Subgroup } from '../types';
+import type { Message, MessageDelta, Subgroup } from '../types';
 import { useDeliberationStore } from '../stores/deliberationStore';
 
 const WS_BASE = import.meta.env.VITE_WS_URL || `ws://${window.location.host}`;
@@ -11,6 +11,9 @@ export function useWebSocket() {
     currentUser,
     currentSession,
     addMessage,
+    appendMessageDelta,
+    finalizeMessage,
+    discardMessage,
     setSurrogateTyping,
     setSubgroups,
     setView,
@@ -28,6 +31,8 @@ export function useWebSocket() {
 
     ws.onopen = () => {
       console.log('Chat WS connected');
+      // Pick up anything sent while we were disconnected
+      fetchMessages(true);
     };
 
     ws.onmessage = (event) => {
@@ -37,6 +42,18 @@ export function useWebSocket() {
         // Don't add duplicate messages from our own sends
         const msg = data as Message;
         addMessage(msg);
+      } else if (evt === 'chat:message_delta') {
+        // Agent message streaming in; the bubble grows chunk by chunk
+        appendMessageDelta(data as MessageDelta);
+      } else if (evt === 'chat:message_done') {
+        if (data.discarded) {
+          discardMessage(data.id);
+        } else {
+          finalizeMessage(data as Message);
+        }
+      } else if (evt === 'sync:resync') {
+        // We fell behind and the server dropped our backlog; catch up from the API
+        fetchMessages(true);
       } else if (evt === 'chat:surrogate_typing') {
         setSurrogateTyping(true);
         setTimeout(() => setSurrogateTyping(false), 5000);
@@ -100,6 +117,8 @@ export function useWebSocket() {
             setView('results');
           });
         }
+      } else if (evt === 'sync:resync') {
+        fetchSubgroups();
       } else if (evt === 'session:convergence') {
         const convergence = data.convergence as number;
         useDeliberationStore.setState(s => ({
@@ -1,10 +1,17 @@
 import { create } from 'zustand';
 import { persist } from 'zustand/middleware';
 import { useToastStore } from './toastStore';
-import type { Session, SessionResults, User, Subgroup, Message, Idea } from '../types';
+import type { Session, SessionResults, User, Subgroup, Message, MessageDelta, Idea } from '../types';
 
 const API_BASE = import.meta.env.VITE_API_URL || '';
 
+// Same (created_at, id) keyset order the server pages messages in
+function byKeyset(a: Message, b: Message): number {
+  const t = Date.parse(a.created_at) - Date.parse(b.created_at);
+  if (t !== 0) return t;
+  return a.id < b.id ? -1 : a.id > b.id ? 1 : 0;
+}
+
 type View = 'home' | 'new-session' | 'join-session' | 'settings'
   | 'waiting' | 'chat' | 'visualizer' | 'participants' | 'results';
 
@@ -31,11 +38,14 @@ interface DeliberationState {
   startSession: () => Promise<void>;
   stopSession: () => Promise<void>;
   fetchSession: () => Promise<void>;
-  fetchMessages: () => Promise<void>;
+  fetchMessages: (incremental?: boolean) => Promise<void>;
   fetchSubgroups: () => Promise<void>;
   fetchIdeas: () => Promise<void>;
   fetchResults: (sessionId: string) => Promise<void>;
   addMessage: (message: Message) => void;
+  appendMessageDelta: (delta: MessageDelta) => void;
+  finalizeMessage: (message: Message) => void;
+  discardMessage: (id: string) => void;
   setSurrogateTyping: (typing: boolean) => void;
   setSubgroups: (subgroups: Subgroup[]) => void;
   setCurrentSubgroup: (subgroup: Subgroup) => void;
@@ -174,16 +184,32 @@ export const useDeliberationStore = create<DeliberationState>()(persist((set, ge
     }
   },
 
-  fetchMessages: async () => {
-    const { currentUser } = get();
+  fetchMessages: async (incremental = false) => {
+    const { currentUser, messages } = get();
     if (!currentUser) return;
+    // Catch up from the last stored message we have instead of reloading everything
+    const last = incremental ? [...messages].reverse().find(m => !m.streaming) : undefined;
+    const query = last ? `?since=${last.id}` : '';
     try {
-      const res = await fetch(`${API_BASE}/api/users/${currentUser.id}/messages`, {
+      const res = await fetch(`${API_BASE}/api/users/${currentUser.id}/messages${query}`, {
         credentials: 'include',
       });
       if (res.ok) {
-        const messages: Message[] = await res.json();
-        set({ messages });
+        const fetched: Message[] = await res.json();
+        if (last) {
+          // Merge by id with what the WebSocket already delivered; drafts still streaming stay last
+          set((state) => {
+            const merged = new Map(state.messages.filter(m => !m.streaming).map(m => [m.id, m]));
+            fetched.forEach(m => merged.set(m.id, m));
+            const drafts = state.messages.filter(m => m.streaming && !merged.has(m.id));
+            return { messages: [...[...merged.values()].sort(byKeyset), ...drafts] };
+          });
+        } else {
+          set({ messages: fetched });
+        }
+      } else if (last && res.status === 400) {
+        // Our cursor is unknown to the server; fall back to a full reload
+        await get().fetchMessages();
       }
     } catch {
       // silent
@@ -243,6 +269,37 @@ export const useDeliberationStore = create<DeliberationState>()(persist((set, ge
     }));
   },
 
+  appendMessageDelta: ({ id, subgroup_id, display_name, msg_type, delta }) => {
+    set((state) => {
+      const existing = state.messages.find(m => m.id === id);
+      if (existing) {
+        return {
+          messages: state.messages.map(m =>
+            m.id === id ? { ...m, content: m.content + delta } : m
+          ),
+        };
+      }
+      const draft: Message = {
+        id, subgroup_id, user_id: null, display_name, content: delta, msg_type,
+        source_subgroup_id: null, created_at: new Date().toISOString(), streaming: true,
+      };
+      return { messages: [...state.messages, draft], surrogateTyping: false };
+    });
+  },
+
+  finalizeMessage: (message) => {
+    set((state) => ({
+      messages: state.messages.some(m => m.id === message.id)
+        ? state.messages.map(m => (m.id === message.id ? message : m))
+        : [...state.messages, message],
+      surrogateTyping: false,
+    }));
+  },
+
+  discardMessage: (id) => {
+    set((state) => ({ messages: state.messages.filter(m => m.id !== id) }));
+  },
+
   setSurrogateTyping: (typing) => set({ surrogateTyping: typing }),
   setSubgroups: (subgroups) => set({ subgroups }),
   setCurrentSubgroup: (subgroup) => set({ currentSubgroup: subgroup }),
@@ -50,6 +50,17 @@ export interface Message {
   msg_type: 'human' | 'surrogate' | 'contributor';
   source_subgroup_id: string | null;
   created_at: string;
+  /** Set on agent messages still being streamed (not yet stored server-side). */
+  streaming?: boolean;
+}
+
+/** Incremental chunk of an agent message that is still being generated. */
+export interface MessageDelta {
+  id: string;
+  subgroup_id: string;
+  display_name: string;
+  msg_type: 'surrogate' | 'contributor';
+  delta: string;
 }
 
 export interface Idea {